@@ -8,6 +8,9 @@ Usage:
 
 Example:
     python 102303235.py "Sharry Maan" 20 20 102303235-output.mp3
+
+The output file's extension picks the encoder profile (.mp3, .opus, .aac);
+OUTPUT_PROFILE selects among the profiles for that extension.
 """
 
 import sys
@@ -16,14 +19,34 @@ import time
 import random
 import shutil
 import logging
+import subprocess
 from typing import List, Dict, Any, Optional
-from pydub import AudioSegment
-import yt_dlp
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables before the modules below read their settings
 load_dotenv()
 
+# yt_dlp and pydub are imported on first use (see ydl_pool.load_yt_dlp and
+# cut_and_merge), so argument errors are reported without loading them
+from download_pool import (
+    DOWNLOAD_HEDGE, cancel_hook, claim_host, discard_partials, download_hedged, download_many,
+    is_cancelled, sleep_unless_cancelled, watch_children,
+)
+from partial_download import clip_seconds_for, range_options
+import ffmpeg_merge
+import mixer
+import zip_export
+from ffmpeg_merge import ENCODERS, FFMPEG_BINARY, MERGE_ENGINE
+from encoder_profiles import EXTENSIONS, profile_for
+from highlight import HIGHLIGHT_CLIPS, find_highlights
+from clip_cache import CLIP_CACHE, cache_key
+from search_cache import SEARCH_CACHE
+from strategy_scheduler import STRATEGY_SCHEDULER, AttemptLog, classify, SUCCESS, BOT, FORMAT
+from ydl_pool import SESSION_POOL
+from format_resolver import FORMAT_CACHE, HTTP_CHUNK_SIZE
+from clip_pipeline import ClipPipeline, PIPELINE_MERGE
+from metrics import METRICS, record_download
+
 # Logging configuration
 logging.basicConfig(
     level=logging.INFO,
@@ -40,6 +63,9 @@ YT_PO_TOKEN = os.getenv("YT_PO_TOKEN", "")  # YouTube Proof of Origin token
 YT_VISITOR_DATA = os.getenv("YT_VISITOR_DATA", "")  # YouTube visitor data
 YT_COOKIES_FILE = os.getenv("YT_COOKIES_FILE", "")  # Path to cookies.txt file
 
+# "native" keeps the source stream (m4a/webm/opus); "mp3" transcodes on download
+DOWNLOAD_FORMAT = os.getenv("DOWNLOAD_FORMAT", "native").lower()
+
 # User agents for requests - Updated for better YouTube compatibility
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
@@ -82,8 +108,10 @@ def validate_args(args):
     if audio_duration <= 0:
         print("Error: AudioDuration must be a positive integer.")
         sys.exit(1)
-    if not output_file.endswith(".mp3"):
-        print("Error: OutputFileName must end with .mp3")
+    try:
+        profile_for(output_file)
+    except ValueError:
+        print(f"Error: OutputFileName must end with {', '.join(EXTENSIONS)}")
         sys.exit(1)
 
     return singer_name, num_videos, audio_duration, output_file
@@ -93,6 +121,11 @@ def search_videos(singer_name, num_videos):
     """Search YouTube for singer's videos and return URLs."""
     logger.info("Searching YouTube for '%s' videos…", singer_name)
     query = f"{singer_name} songs"
+    cached = SEARCH_CACHE.get(query, num_videos)
+    if cached:
+        logger.info("Found %d cached video URL(s).", len(cached))
+        return cached
+
     ydl_opts: Dict[str, Any] = {
         "quiet": True,
         "no_warnings": True,
@@ -129,11 +162,11 @@ def search_videos(singer_name, num_videos):
     search_query = f"ytsearch{num_videos}:{query}"
 
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore
+        with SESSION_POOL.lease("search", ydl_opts) as ydl:
             result = ydl.extract_info(search_query, download=False)
     except Exception as exc:
         logger.error("Failed to search YouTube: %s", exc)
-        sys.exit(1)
+        raise MashupError(f"Failed to search YouTube: {exc}")
 
     urls = []
     if result and "entries" in result and result["entries"]:
@@ -144,38 +177,51 @@ def search_videos(singer_name, num_videos):
                 urls.append(f"https://www.youtube.com/watch?v={entry['id']}")
 
     if not urls:
-        print(f"Error: No videos found for singer '{singer_name}'.")
-        sys.exit(1)
+        raise MashupError(f"No videos found for singer '{singer_name}'.")
 
+    SEARCH_CACHE.put(query, num_videos, urls)
     logger.info("Found %d video URL(s).", len(urls))
     return urls
 
 
-def download_audio(url, index):
-    """Download audio from YouTube URL with aggressive anti-bot measures."""
-    output_template = os.path.join(TEMP_DIR, f"audio_{index}.%(ext)s")
-    
-    # Prioritize iOS and Android clients (less likely to be blocked)
-    client_strategies = [
-        {"name": "ios", "clients": ["ios"], "format": "bestaudio/best"},
-        {"name": "android", "clients": ["android"], "format": "bestaudio/best"},
-        {"name": "android_music", "clients": ["android_music"], "format": "bestaudio"},
-        {"name": "ios_music", "clients": ["ios_music"], "format": "bestaudio"},
-        {"name": "multi", "clients": ["android", "ios", "web"], "format": "worstaudio/worst"},
-    ]
+def download_audio(url, index, clip_start=0.0, clip_seconds=None, audio_format=None, temp_dir=None):
+    """Download audio from YouTube URL with aggressive anti-bot measures.
+
+    When `clip_seconds` is set, only that window (from `clip_start`) is fetched.
+    `audio_format` is "native" (keep the source container) or "mp3".
+    Files go to `temp_dir` (default TEMP_DIR).
+    """
+    audio_format = audio_format or DOWNLOAD_FORMAT
+    temp_dir = temp_dir or TEMP_DIR
+
+    # Serve repeat requests from the persistent clip cache (skips yt-dlp entirely)
+    key = cache_key(url, clip_start, clip_seconds, audio_format)
+    cached = CLIP_CACHE.fetch(key, os.path.join(temp_dir, f"audio_{index}"))
+    if cached:
+        record_download("cache", "hit", cached)
+        return cached
+    claim_host()  # Host slot and start spacing only apply once the network is needed
+
+    output_template = os.path.join(temp_dir, f"audio_{index}.%(ext)s")
+    watch_children(os.path.join(temp_dir, f"audio_{index}."))  # Cancelling this download kills its ffmpeg
     
-    # Try each strategy with exponential backoff
-    for strategy_idx, strategy in enumerate(client_strategies):
-        # Add human-like delay (increases with each retry)
-        delay = random.uniform(3, 8) * (strategy_idx + 1)
+    # Best-performing client first (see strategy_scheduler.py)
+    strategies = STRATEGY_SCHEDULER.order()
+    bot_blocks = 0
+
+    for strategy_idx, strategy in enumerate(strategies):
+        # Wait longer the more this download (and recent ones) hit bot detection
         if strategy_idx > 0:
+            delay = STRATEGY_SCHEDULER.backoff(strategy_idx, bot_blocks)
             logger.info(f"Waiting {delay:.1f}s before trying {strategy['name']} client...")
-            time.sleep(delay)
+            sleep_unless_cancelled(delay)
+            METRICS.inc("mashup_sleep_seconds_total", delay, reason="strategy_delay")
+        if is_cancelled():
+            break
         
         # Build yt-dlp options with human simulation
         ydl_opts: Dict[str, Any] = {
             "format": strategy["format"],
-            "outtmpl": output_template,
             "quiet": True,
             "no_warnings": True,
             "ignoreerrors": True,
@@ -183,6 +229,8 @@ def download_audio(url, index):
             "fragment_retries": 10,
             "retry_sleep_functions": {"http": lambda n: 3 * (2 ** n)},  # Exponential backoff
             "socket_timeout": 45,
+            "http_chunk_size": HTTP_CHUNK_SIZE,  # Resumable range requests
+            "progress_hooks": [cancel_hook],  # Aborts the transfer once a hedged quota is met
             "nocheckcertificate": True,
             "age_limit": None,
             "geo_bypass": True,
@@ -226,74 +274,151 @@ def download_audio(url, index):
         if YT_COOKIES_FILE and os.path.exists(YT_COOKIES_FILE):
             ydl_opts["cookiefile"] = YT_COOKIES_FILE
         
-        # Add audio extraction postprocessor
-        ydl_opts["postprocessors"] = [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            }
-        ]
-
+        # Add audio extraction postprocessor (native mode decodes the source once in merge)
+        if audio_format == "mp3":
+            ydl_opts["postprocessors"] = [
+                {
+                    "key": "FFmpegExtractAudio",
+                    "preferredcodec": "mp3",
+                    "preferredquality": "192",
+                }
+            ]
+
+        # Per-call options go on a pooled session; the rest is shared per strategy
+        attempt_log = AttemptLog()  # Keeps the errors ignoreerrors would hide
+        call_opts: Dict[str, Any] = {"outtmpl": output_template, "logger": attempt_log}
+        # Only fetch the clip window when a partial download is requested
+        call_opts.update(range_options(clip_start, clip_seconds))
+
+        attempt_start = time.perf_counter()
         try:
             logger.info(f"Trying {strategy['name']} client for download {index}...")
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore
-                info = ydl.extract_info(url, download=True)
+            with METRICS.timer("mashup_download_seconds", strategy=strategy["name"]):
+                with SESSION_POOL.lease((strategy["name"], audio_format), ydl_opts, **call_opts) as ydl:
+                    # Reuses formats resolved by an earlier attempt, so a retry only redoes the transfer
+                    info = FORMAT_CACHE.download(ydl, url, attempt_log)
             
             # Check if download succeeded
-            expected_path = os.path.join(TEMP_DIR, f"audio_{index}.mp3")
+            path = None
+            expected_path = os.path.join(temp_dir, f"audio_{index}.mp3")
             if os.path.exists(expected_path):
-                logger.info(f"✅ SUCCESS with {strategy['name']} client!")
-                return expected_path
-
-            # Check for any variant of the downloaded file
-            for fname in os.listdir(TEMP_DIR):
-                if fname.startswith(f"audio_{index}.") and not fname.endswith(".part"):
-                    logger.info(f"✅ SUCCESS: Downloaded {fname} with {strategy['name']}")
-                    return os.path.join(TEMP_DIR, fname)
-                    
+                path = expected_path
+            else:
+                # Check for any variant of the downloaded file
+                for fname in os.listdir(temp_dir):
+                    if fname.startswith(f"audio_{index}.") and not fname.endswith(".part"):
+                        path = os.path.join(temp_dir, fname)
+                        break
+
+            if path:
+                logger.info(f"✅ SUCCESS: Downloaded {os.path.basename(path)} with {strategy['name']}")
+                STRATEGY_SCHEDULER.record(strategy["name"], SUCCESS, time.perf_counter() - attempt_start)
+                CLIP_CACHE.store(key, path)
+                record_download(strategy["name"], SUCCESS, path)
+                return path
+
+            # yt-dlp swallows errors (ignoreerrors), so no file is the usual failure
+            outcome = attempt_log.outcome()
+                
         except Exception as exc:
-            error_msg = str(exc).lower()
             logger.debug(f"Strategy '{strategy['name']}' failed: {exc}")
-            
-            # Check if it's a bot detection error
-            if "bot" in error_msg or "sign in" in error_msg:
-                logger.warning(f"🤖 Bot detected with {strategy['name']} client, will try next...")
-            elif "format" in error_msg:
-                logger.debug(f"Format issue with {strategy['name']}, trying next...")
-            
-            # Don't wait after last strategy
-            if strategy_idx < len(client_strategies) - 1:
-                time.sleep(random.uniform(2, 4))  # Brief pause before next strategy
+            outcome = classify(str(exc))
+
+        if is_cancelled():
+            break  # The download quota was met elsewhere; not this strategy's failure
+        STRATEGY_SCHEDULER.record(strategy["name"], outcome, time.perf_counter() - attempt_start)
+        record_download(strategy["name"], outcome)
+        if outcome == BOT:
+            bot_blocks += 1
+            logger.warning(f"🤖 Bot detected with {strategy['name']} client, will try next...")
+        elif outcome == FORMAT:
+            logger.debug(f"Format issue with {strategy['name']}, trying next...")
     
+    if is_cancelled():
+        discard_partials(temp_dir, f"audio_{index}.")
+        logger.info(f"Download {index} cancelled, quota already met")
+        return None
+
     # All strategies failed
     logger.warning(f"Could not download {url} with any method")
     return None
 
 
-def cut_and_merge(audio_paths, duration_sec, output_file):
-    """Create mashup by combining audio clips."""
+def cut_and_merge(audio_paths, duration_sec, output_file, engine=None):
+    """Create mashup by combining audio clips.
+
+    `engine` is "ffmpeg" (single-pass trim/concat/encode), "numpy"
+    (loudness-matched, crossfaded and limited, see mixer.py) or "pydub".
+    Each clip starts at the track's highlight when HIGHLIGHT_CLIPS is on.
+    The output profile follows from `output_file`'s extension.
+    """
+    starts = find_highlights(audio_paths, duration_sec) if HIGHLIGHT_CLIPS else {}
+    engine = engine or MERGE_ENGINE
+    fmt = profile_for(output_file).name
+    if engine == "numpy":
+        try:
+            used, pcm = mixer.mix(audio_paths, duration_sec, starts)
+            mixer.encode(pcm, output_file, fmt)
+            logger.info("Mashup saved to %s (%d clips)", output_file, len(used))
+            return
+        except Exception as exc:
+            logger.warning("numpy merge engine failed (%s), falling back to pydub", exc)
+    if engine == "ffmpeg":
+        try:
+            used, _ = ffmpeg_merge.merge(audio_paths, duration_sec, output_file, fmt=fmt, starts=starts)
+            logger.info("Mashup saved to %s (%d clips)", output_file, len(used))
+            return
+        except Exception as exc:
+            logger.warning("ffmpeg merge engine failed (%s), falling back to pydub", exc)
+
+    from pydub import AudioSegment
+
     duration_ms = duration_sec * 1000
     combined = AudioSegment.empty()
+    joins = []
 
     for path in audio_paths:
         try:
-            audio = AudioSegment.from_file(path)
-            clip = audio[:duration_ms]
+            with METRICS.timer("mashup_ffmpeg_seconds", op="decode", engine="pydub"):
+                audio = AudioSegment.from_file(path)
+            start_ms = int(starts.get(path, 0.0) * 1000)
+            clip = audio[start_ms:start_ms + duration_ms]
             combined += clip
+            joins.append(int(combined.frame_count()))
             logger.info("Added %d ms from %s", len(clip), os.path.basename(path))
         except Exception as exc:
             logger.warning("Skipping %s: %s", path, exc)
 
     if len(combined) == 0:
-        print("Error: No audio clips could be processed.")
-        sys.exit(1)
+        raise MashupError("No audio clips could be processed.")
 
-    combined.export(output_file, format="mp3")
+    zip_export.save(combined, output_file, fmt, joins[:-1])
     logger.info("Mashup saved to %s (%d ms total)", output_file, len(combined))
 
 
+def save_fallback(default_path, output_file):
+    """Copy default.mp3 to `output_file`, re-encoding it for other output formats."""
+    profile = profile_for(output_file)
+    if profile.extension == ".mp3":
+        shutil.copy(default_path, output_file)
+        return
+    cmd = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin", "-y", "-i", default_path, "-vn"]
+    result = subprocess.run(cmd + ENCODERS[profile.name] + [output_file], capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors="replace").strip() or "fallback encode failed")
+
+
+def finish_pipeline(pipeline, audio_paths, duration_sec, output_file):
+    """Finish a pipelined merge, redoing it with `cut_and_merge` if it failed."""
+    try:
+        used = pipeline.close()
+        logger.info("Mashup saved to %s (%d clips)", output_file, len(used))
+    except RuntimeError as exc:
+        logger.warning("%s, merging again after the downloads", exc)
+        cut_and_merge(audio_paths, duration_sec, output_file)
+
+
 def cleanup():
     """Clean up temporary files."""
     if os.path.exists(TEMP_DIR):
@@ -303,29 +428,58 @@ def cleanup():
 
 # Main", "oldString": "# ===================================================================\n# Main\n# ===================================================================
 
-def main():
-    singer_name, num_videos, audio_duration, output_file = validate_args(sys.argv)
+class MashupError(Exception):
+    """A mashup could not be made (reported to the user without a traceback)."""
+
+
+class DownloadsFailed(MashupError):
+    """Every download failed and there was no default.mp3 to fall back to."""
 
-    # Prepare temp directory
-    os.makedirs(TEMP_DIR, exist_ok=True)
 
+def make_mashup(singer_name, num_videos, audio_duration, output_file, temp_dir=TEMP_DIR, limiter=None, entry="cli"):
+    """Search, download and merge one mashup into `output_file`.
+
+    Downloads go to `temp_dir` (which must exist) through `limiter`, the
+    HostLimiter shared by concurrent mashups. Returns a summary dict whose
+    "status" is "ok", or "fallback" when default.mp3 was used. Raises
+    MashupError when no mashup could be made.
+    """
+    pipeline = None
     try:
         # Step 1 – Search
-        urls = search_videos(singer_name, num_videos)
+        with METRICS.timer("mashup_stage_seconds", entry=entry, stage="search"):
+            urls = search_videos(singer_name, num_videos)
 
         # Step 2 – Download
         logger.info("Downloading %d audio tracks…", len(urls))
         audio_paths = []
         
-        for i, url in enumerate(urls, start=1):
-            logger.info("Downloading %d/%d … (got %d so far)", i, len(urls), len(audio_paths))
-            path = download_audio(url, i)
+        clip_seconds = clip_seconds_for(audio_duration)
+
+        def fetch(u, idx):
+            return download_audio(u, idx, clip_seconds=clip_seconds, temp_dir=temp_dir)
+
+        if PIPELINE_MERGE and MERGE_ENGINE == "ffmpeg":
+            # Decode and encode finished clips while later downloads are still running
+            pipeline = ClipPipeline(audio_duration, output_file, profile_for(output_file).name)
+            fetch = pipeline.decoding(fetch)
+        quota = 5  # Clips that make a full mashup
+        download_start = time.perf_counter()
+        if DOWNLOAD_HEDGE:
+            # Stops (cancelling the rest) as soon as the quota is met
+            downloads = download_hedged(fetch, urls, quota, limiter=limiter)
+        else:
+            downloads = download_many(fetch, urls, limiter=limiter)
+        for i, url, path in downloads:
+            logger.info("Finished %d/%d … (got %d so far)", i, len(urls), len(audio_paths))
             if path:
                 audio_paths.append(path)
+                if pipeline:
+                    pipeline.append(i, path)
                 logger.info("✅ Success! Downloaded: %s", os.path.basename(path))
                 
                 # Early exit if we have enough
-                if len(audio_paths) >= 5:
+                if len(audio_paths) >= quota:
                     logger.info("Got %d downloads, that's sufficient!", len(audio_paths))
                     break
             else:
@@ -335,38 +489,67 @@ def main():
             if i >= 10 and len(audio_paths) >= 3:
                 logger.info("Tried %d, got %d successes. Stopping.", i, len(audio_paths))
                 break
+        downloads.close()  # Cancel downloads that are no longer needed
+        METRICS.observe("mashup_stage_seconds", time.perf_counter() - download_start, entry=entry, stage="download")
 
         if not audio_paths:
+            if pipeline:
+                pipeline.abort()
             # Try using default.mp3 as fallback
             default_path = os.path.join(os.path.dirname(__file__), "default.mp3")
             if os.path.exists(default_path):
                 print("\n⚠️ YouTube blocked downloads. Using default mashup file.")
                 logger.info("Copying default.mp3 to output file")
+                METRICS.inc("mashup_fallback_total", entry=entry, reason="downloads_failed")
+                METRICS.event("fallback", entry=entry, reason="downloads_failed")
                 try:
-                    shutil.copy(default_path, output_file)
+                    save_fallback(default_path, output_file)
                     print(f"✅ Default mashup saved to: {output_file}")
                     print("💡 This is a fallback file due to YouTube's bot detection.")
-                    return  # Exit successfully
+                    return {"status": "fallback", "candidates": len(urls), "clips": 0}
                 except Exception as e:
                     logger.error("Failed to copy default.mp3: %s", e)
-            
-            # If no default.mp3, show error
-            print("\n❌ Failed to download any audio.")
-            print("This usually happens when YouTube blocks downloads.")
-            print("\n💡 Try:")
-            print("  • Different singer (try 'Kishore Kumar' or 'Lata Mangeshkar')")
-            print("  • Fewer videos (5-8 instead of 10+)")
-            print("  • Wait 10-15 minutes and try again")
-            print("  • Add a 'default.mp3' file in the project directory as fallback")
-            sys.exit(1)
+            raise DownloadsFailed("Failed to download any audio.")
 
         logger.info("Successfully downloaded %d/%d audio files.", len(audio_paths), len(urls))
 
         # Step 3 – Cut & merge
-        cut_and_merge(audio_paths, audio_duration, output_file)
+        with METRICS.timer("mashup_stage_seconds", entry=entry, stage="merge"):
+            if pipeline:
+                finish_pipeline(pipeline, audio_paths, audio_duration, output_file)
+            else:
+                cut_and_merge(audio_paths, audio_duration, output_file)
+        METRICS.inc("mashup_outputs_total", entry=entry)
+        METRICS.inc("mashup_output_bytes_total", os.path.getsize(output_file), entry=entry)
+        return {"status": "ok", "candidates": len(urls), "clips": len(audio_paths)}
+    finally:
+        if pipeline:
+            pipeline.abort()  # No-op once the mashup is written
 
-        print(f"\n✅ Mashup created successfully: {output_file}")
 
+def main():
+    singer_name, num_videos, audio_duration, output_file = validate_args(sys.argv)
+
+    # Prepare temp directory
+    os.makedirs(TEMP_DIR, exist_ok=True)
+
+    try:
+        result = make_mashup(singer_name, num_videos, audio_duration, output_file)
+        if result["status"] == "ok":
+            print(f"\n✅ Mashup created successfully: {output_file}")
+
+    except DownloadsFailed:
+        print("\n❌ Failed to download any audio.")
+        print("This usually happens when YouTube blocks downloads.")
+        print("\n💡 Try:")
+        print("  • Different singer (try 'Kishore Kumar' or 'Lata Mangeshkar')")
+        print("  • Fewer videos (5-8 instead of 10+)")
+        print("  • Wait 10-15 minutes and try again")
+        print("  • Add a 'default.mp3' file in the project directory as fallback")
+        sys.exit(1)
+    except MashupError as exc:
+        print(f"Error: {exc}")
+        sys.exit(1)
     except KeyboardInterrupt:
         print("\nAborted by user.")
         sys.exit(1)
@@ -375,6 +558,7 @@ def main():
         sys.exit(1)
     finally:
         cleanup()
+        METRICS.flush()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,178 @@
+"""
+Admission control for web app jobs.
+A job holds its clips' PCM in memory, several copies at once while merging
+and zipping, so a few concurrent long mashups can push the container out of
+memory. Each request's memory and CPU cost is estimated from its clip count
+and duration when it is submitted. A job starts once a worker is free and
+its estimate fits in MEMORY_BUDGET_MB next to the running jobs'
+reservations. If it only fits with its audio spilled to disk (merged
+straight into an encoded file instead of held as PCM), it starts in that
+mode rather than waiting. Jobs start in submission order. Requests that
+could never fit, or that would queue behind more than ADMISSION_MAX_WAIT
+seconds of estimated work, are rejected.
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from ffmpeg_merge import CHANNELS, MERGE_ENGINE, SAMPLE_RATE
+from clip_pipeline import PIPELINE_MERGE
+from highlight import HIGHLIGHT_CLIPS, HIGHLIGHT_SCAN_SECONDS
+from encoder_profiles import PROFILES
+
+logger = logging.getLogger(__name__)
+
+# Memory all running jobs together may reserve (worker processes' own baseline not included)
+MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "1024"))
+# Requests that would wait longer than this (seconds of estimated CPU work per worker) are rejected
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "600"))
+
+MB = 1024 * 1024
+PCM_BYTES_PER_SECOND = SAMPLE_RATE * CHANNELS * 2  # s16le in the merge layout
+JOB_OVERHEAD_MB = 16  # Per-job memory not proportional to the audio
+
+# Peak copies of the mashup's PCM a job holds per merge engine, in memory and spilled to
+# disk (measured with benchmarks/bench_admission.py, rounded up; pydub is an estimate).
+# Spilled pipelines still hold clips decoded ahead of the encoder; spilled pydub jobs try
+# the ffmpeg engine first; the numpy engine mixes in memory either way.
+PCM_COPIES = {"pipeline": 2.2, "ffmpeg": 3.0, "numpy": 6.0, "pydub": 3.0}
+SPILLED_PCM_COPIES = {"pipeline": 1.2, "ffmpeg": 0.2, "numpy": 5.5, "pydub": 0.2}
+
+DECODE_SPEED = 200.0  # Multiples of real time a downloaded clip decodes at, one core
+
+RUN, SPILL = "run", "spill"
+
+
+class AdmissionRejected(Exception):
+    """A request was turned away (the message says why, for the user)."""
+
+
+class Cost:
+    """Estimated resources of one job: peak memory in bytes (in memory and spilled) and CPU seconds."""
+
+    def __init__(self, memory: int, spilled_memory: int, cpu_seconds: float):
+        self.memory = memory
+        self.spilled_memory = spilled_memory
+        self.cpu_seconds = cpu_seconds
+
+    def __repr__(self) -> str:
+        return (
+            f"Cost(memory={self.memory // MB}MB, spilled_memory={self.spilled_memory // MB}MB, "
+            f"cpu_seconds={self.cpu_seconds:.1f})"
+        )
+
+
+def merge_mode(engine: str = MERGE_ENGINE, pipelined: bool = True) -> str:
+    """Key into PCM_COPIES for a merge engine (pipelined ffmpeg merges are their own case)."""
+    if engine == "ffmpeg" and pipelined:
+        return "pipeline"
+    return engine if engine in PCM_COPIES else "pydub"
+
+
+def estimate(clips: int, duration_sec: float, fmt: str = "mp3", mode: Optional[str] = None) -> Cost:
+    """Estimate a job that merges `clips` clips of `duration_sec` into the `fmt` profile."""
+    mode = mode or merge_mode(MERGE_ENGINE, PIPELINE_MERGE)
+    audio_seconds = clips * duration_sec
+    pcm = audio_seconds * PCM_BYTES_PER_SECOND
+    overhead = JOB_OVERHEAD_MB * MB
+    decoded = audio_seconds + (clips * HIGHLIGHT_SCAN_SECONDS if HIGHLIGHT_CLIPS else 0.0)
+    profile = PROFILES.get(fmt) or PROFILES["mp3"]
+    return Cost(
+        memory=int(overhead + pcm * PCM_COPIES[mode]),
+        spilled_memory=int(overhead + pcm * SPILLED_PCM_COPIES[mode]),
+        cpu_seconds=decoded / DECODE_SPEED + audio_seconds / profile.speed,
+    )
+
+
+class AdmissionController:
+    """Reserves estimated job memory against a budget and starts jobs in order.
+
+    Thread-safe; lives in the process that submits jobs. `admit()` registers
+    a job and `release()` frees a finished one; both return the jobs that may
+    start now as (job_id, RUN or SPILL) pairs.
+    """
+
+    def __init__(self, workers: int, memory_budget: int = MEMORY_BUDGET_MB * MB, max_wait: float = ADMISSION_MAX_WAIT):
+        self.workers = max(1, workers)
+        self.memory_budget = memory_budget
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._running: Dict[str, Tuple[Cost, str]] = {}
+        self._queued: "OrderedDict[str, Cost]" = OrderedDict()
+
+    def _reserved(self) -> int:
+        return sum(cost.spilled_memory if mode == SPILL else cost.memory for cost, mode in self._running.values())
+
+    def _wait(self) -> float:
+        work = sum(cost.cpu_seconds for cost, _ in self._running.values())
+        work += sum(cost.cpu_seconds for cost in self._queued.values())
+        return work / self.workers
+
+    def _mode(self, cost: Cost) -> Optional[str]:
+        if len(self._running) >= self.workers:
+            return None
+        reserved = self._reserved()
+        if reserved + cost.memory <= self.memory_budget:
+            return RUN
+        if reserved + cost.spilled_memory <= self.memory_budget:
+            return SPILL
+        return None
+
+    def _start_ready(self) -> List[Tuple[str, str]]:
+        ready = []
+        while self._queued:
+            job_id, cost = next(iter(self._queued.items()))
+            mode = self._mode(cost)
+            if mode is None:
+                break  # Later jobs wait behind the head of the queue
+            del self._queued[job_id]
+            self._running[job_id] = (cost, mode)
+            ready.append((job_id, mode))
+            logger.info("Starting job %s (%s, %s)", job_id, mode, cost)
+        return ready
+
+    def admit(self, job_id: str, cost: Cost) -> List[Tuple[str, str]]:
+        """Queue `job_id`; raises AdmissionRejected if it cannot be accepted."""
+        with self._lock:
+            if cost.spilled_memory > self.memory_budget:
+                raise AdmissionRejected(
+                    f"This mashup needs about {cost.spilled_memory // MB} MB, more than the server's "
+                    f"{self.memory_budget // MB} MB. Try fewer videos or shorter clips."
+                )
+            if (self._queued or self._mode(cost) is None) and self._wait() > self.max_wait:
+                raise AdmissionRejected(
+                    f"The server is busy (about {self._wait() / 60:.0f} minutes of work queued). Try again later."
+                )
+            self._queued[job_id] = cost
+            return self._start_ready()
+
+    def release(self, job_id: str) -> List[Tuple[str, str]]:
+        """Free a finished (or abandoned) job's reservation."""
+        with self._lock:
+            self._running.pop(job_id, None)
+            self._queued.pop(job_id, None)
+            return self._start_ready()
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based place of a job in the queue (None once it has started)."""
+        with self._lock:
+            for i, queued_id in enumerate(self._queued, start=1):
+                if queued_id == job_id:
+                    return i
+        return None
+
+    def usage(self) -> Dict[str, Any]:
+        """Current reservations, for display."""
+        with self._lock:
+            return {
+                "memory_budget": self.memory_budget,
+                "memory_reserved": self._reserved(),
+                "running": len(self._running),
+                "spilled": sum(1 for _, mode in self._running.values() if mode == SPILL),
+                "queued": len(self._queued),
+                "workers": self.workers,
+                "wait_seconds": self._wait(),
+            }
@@ -12,13 +12,13 @@ import io
 import re
 import sys
 import time
+import functools
 import random
 import shutil
 import smtplib
 import tempfile
-import zipfile
 import logging
-from typing import List, Optional, Union, Dict, Any
+from typing import IO, TYPE_CHECKING, List, Optional, Union, Dict, Any
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
@@ -37,22 +37,57 @@ if not _audioop_patched:
         sys.modules['audioop'] = audioop_compat
         _audioop_patched = True
 
-from pydub import AudioSegment
-import yt_dlp
 from dotenv import load_dotenv
 
-# Configuration
+# Configuration is read from the environment as the modules below are imported
 load_dotenv()
 
+# yt_dlp and pydub load on first use, so the page renders without waiting for them
+if TYPE_CHECKING:
+    from pydub import AudioSegment
+
+from download_pool import (
+    DOWNLOAD_HEDGE, cancel_hook, claim_host, discard_partials, download_hedged, download_many,
+    is_cancelled, sleep_unless_cancelled, watch_children,
+)
+from partial_download import clip_seconds_for, range_options
+import ffmpeg_merge
+import mixer
+from ffmpeg_merge import MERGE_ENGINE
+from highlight import HIGHLIGHT_CLIPS, find_highlights
+from clip_cache import CLIP_CACHE, cache_key
+from search_cache import SEARCH_CACHE
+from strategy_scheduler import STRATEGY_SCHEDULER, AttemptLog, classify, SUCCESS, BOT, FORMAT
+from ydl_pool import SESSION_POOL
+from format_resolver import FORMAT_CACHE, HTTP_CHUNK_SIZE
+from clip_pipeline import ClipPipeline, PIPELINE_MERGE
+from metrics import METRICS, METRICS_PORT, record_download
+from jobs import JOB_MANAGER, JobContext, QUEUED, FAILED, DONE, FINISHED
+from zip_export import save, write_zip, write_zip_file
+from admission import MB, AdmissionRejected, Cost, estimate
+from encoder_profiles import OUTPUT_PROFILE, PROFILES, get_profile
+from outbox import get_outbox, SMTP_HOST, SMTP_PORT, SMTP_SSL, QUEUED as EMAIL_QUEUED, SENT as EMAIL_SENT, FAILED as EMAIL_FAILED
+
+# Configuration
 EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS", "")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")
 FALLBACK_MODE = os.getenv("FALLBACK_MODE", "false").lower() == "true"
+JOB_POLL_INTERVAL = 1.0  # Seconds between job status refreshes in the UI
+MAX_DOWNLOADS = 8  # Tracks a job tries to download at most
+MASHUP_CLIPS = 3  # Clips that make a full mashup (downloads stop once this many succeed)
+
+# Outgoing mail is queued on disk and sent over one reused SMTP connection
+# (one outbox and sender thread per process, shared by every script rerun)
+OUTBOX = get_outbox(EMAIL_ADDRESS, EMAIL_PASSWORD)
 
 # YouTube bot bypass configuration (optional)
 YT_PO_TOKEN = os.getenv("YT_PO_TOKEN", "")  # YouTube Proof of Origin token
 YT_VISITOR_DATA = os.getenv("YT_VISITOR_DATA", "")  # YouTube visitor data
 YT_COOKIES_FILE = os.getenv("YT_COOKIES_FILE", "")  # Path to cookies.txt file
 
+# "native" keeps the source stream (m4a/webm/opus); "mp3" transcodes on download
+DOWNLOAD_FORMAT = os.getenv("DOWNLOAD_FORMAT", "native").lower()
+
 # Suppress yt-dlp deprecation warnings
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logging.getLogger('yt_dlp').setLevel(logging.ERROR)
@@ -69,10 +104,11 @@ USER_AGENTS = [
 
 # Core Functions
 
-def create_working_demo() -> AudioSegment:
+def create_working_demo() -> "AudioSegment":
     """Load the default.mp3 file to use as fallback."""
     logger.info("Loading default mashup file...")
-    
+    from pydub import AudioSegment
+
     try:
         # Try to load the default.mp3 file from the project root
         default_path = os.path.join(os.path.dirname(__file__), "default.mp3")
@@ -92,6 +128,10 @@ def create_working_demo() -> AudioSegment:
 
 def search_youtube(singer_name: str, num_videos: int) -> List[str]:
     """Search YouTube and return video URLs for the singer."""
+    cached = SEARCH_CACHE.get(f"{singer_name} songs", num_videos)
+    if cached:
+        return cached
+
     query = f"ytsearch{num_videos}:{singer_name} songs"
     ydl_opts: Dict[str, Any] = {
         "quiet": True,
@@ -127,7 +167,7 @@ def search_youtube(singer_name: str, num_videos: int) -> List[str]:
         logger.info(f"Using cookies from: {YT_COOKIES_FILE}")
     
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore
+        with SESSION_POOL.lease("search", ydl_opts) as ydl:
             result = ydl.extract_info(query, download=False)
     except Exception as exc:
         logger.warning("Search failed: %s", exc)
@@ -140,34 +180,54 @@ def search_youtube(singer_name: str, num_videos: int) -> List[str]:
                 urls.append(entry["url"])
             elif entry and entry.get("id"):
                 urls.append(f"https://www.youtube.com/watch?v={entry['id']}")
-    return urls[:num_videos]  # Ensure we don't get more than requested
-
+    urls = urls[:num_videos]  # Ensure we don't get more than requested
+    SEARCH_CACHE.put(f"{singer_name} songs", num_videos, urls)
+    return urls
+
+
+def download_audio(
+    url: str,
+    index: int,
+    temp_dir: str,
+    clip_start: float = 0.0,
+    clip_seconds: Optional[float] = None,
+    audio_format: Optional[str] = None,
+) -> Optional[str]:
+    """Download audio from YouTube URL with aggressive anti-bot measures.
+
+    When `clip_seconds` is set, only that window (from `clip_start`) is fetched.
+    `audio_format` is "native" (keep the source container) or "mp3".
+    """
+    audio_format = audio_format or DOWNLOAD_FORMAT
+
+    # Serve repeat requests from the persistent clip cache (skips yt-dlp entirely)
+    key = cache_key(url, clip_start, clip_seconds, audio_format)
+    cached = CLIP_CACHE.fetch(key, os.path.join(temp_dir, f"audio_{index}"))
+    if cached:
+        record_download("cache", "hit", cached)
+        return cached
+    claim_host()  # Host slot and start spacing only apply once the network is needed
 
-def download_audio(url: str, index: int, temp_dir: str) -> Optional[str]:
-    """Download audio from YouTube URL with aggressive anti-bot measures."""
     out_template = os.path.join(temp_dir, f"audio_{index}.%(ext)s")
+    watch_children(os.path.join(temp_dir, f"audio_{index}."))  # Cancelling this download kills its ffmpeg
     
-    # Prioritize iOS and Android clients (less likely to be blocked)
-    client_strategies = [
-        {"name": "ios", "clients": ["ios"], "format": "bestaudio/best"},
-        {"name": "android", "clients": ["android"], "format": "bestaudio/best"},
-        {"name": "android_music", "clients": ["android_music"], "format": "bestaudio"},
-        {"name": "ios_music", "clients": ["ios_music"], "format": "bestaudio"},
-        {"name": "multi", "clients": ["android", "ios", "web"], "format": "worstaudio/worst"},
-    ]
-    
-    # Try each strategy with exponential backoff
-    for strategy_idx, strategy in enumerate(client_strategies):
-        # Add human-like delay (increases with each retry)
-        delay = random.uniform(3, 8) * (strategy_idx + 1)
+    # Best-performing client first (see strategy_scheduler.py)
+    strategies = STRATEGY_SCHEDULER.order()
+    bot_blocks = 0
+
+    for strategy_idx, strategy in enumerate(strategies):
+        # Wait longer the more this download (and recent ones) hit bot detection
         if strategy_idx > 0:
+            delay = STRATEGY_SCHEDULER.backoff(strategy_idx, bot_blocks)
             logger.info(f"Waiting {delay:.1f}s before trying {strategy['name']} client...")
-            time.sleep(delay)
+            sleep_unless_cancelled(delay)
+            METRICS.inc("mashup_sleep_seconds_total", delay, reason="strategy_delay")
+        if is_cancelled():
+            break
         
         # Build yt-dlp options with human simulation
         ydl_opts: Dict[str, Any] = {
             "format": strategy["format"],
-            "outtmpl": out_template,
             "quiet": True,
             "no_warnings": True,
             "ignoreerrors": True,
@@ -175,6 +235,8 @@ def download_audio(url: str, index: int, temp_dir: str) -> Optional[str]:
             "fragment_retries": 10,
             "retry_sleep_functions": {"http": lambda n: 3 * (2 ** n)},  # Exponential backoff
             "socket_timeout": 45,
+            "http_chunk_size": HTTP_CHUNK_SIZE,  # Resumable range requests
+            "progress_hooks": [cancel_hook],  # Aborts the transfer once a hedged quota is met
             "nocheckcertificate": True,
             "age_limit": None,
             "geo_bypass": True,
@@ -218,84 +280,184 @@ def download_audio(url: str, index: int, temp_dir: str) -> Optional[str]:
         if YT_COOKIES_FILE and os.path.exists(YT_COOKIES_FILE):
             ydl_opts["cookiefile"] = YT_COOKIES_FILE
         
-        # Add audio extraction postprocessor
-        ydl_opts["postprocessors"] = [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            }
-        ]
+        # Add audio extraction postprocessor (native mode decodes the source once in merge)
+        if audio_format == "mp3":
+            ydl_opts["postprocessors"] = [
+                {
+                    "key": "FFmpegExtractAudio",
+                    "preferredcodec": "mp3",
+                    "preferredquality": "192",
+                }
+            ]
         
+        # Per-call options go on a pooled session; the rest is shared per strategy
+        attempt_log = AttemptLog()  # Keeps the errors ignoreerrors would hide
+        call_opts: Dict[str, Any] = {"outtmpl": out_template, "logger": attempt_log}
+        # Only fetch the clip window when a partial download is requested
+        call_opts.update(range_options(clip_start, clip_seconds))
+
+        attempt_start = time.perf_counter()
         try:
             logger.info(f"Trying {strategy['name']} client for download {index}...")
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore
-                # Extract info first (helps with some blocks)
-                info = ydl.extract_info(url, download=True)
+            with METRICS.timer("mashup_download_seconds", strategy=strategy["name"]):
+                with SESSION_POOL.lease((strategy["name"], audio_format), ydl_opts, **call_opts) as ydl:
+                    # Reuses formats resolved by an earlier attempt, so a retry only redoes the transfer
+                    info = FORMAT_CACHE.download(ydl, url, attempt_log)
             
             # Check for downloaded file
+            path = None
             expected = os.path.join(temp_dir, f"audio_{index}.mp3")
             if os.path.exists(expected):
-                logger.info(f"✅ SUCCESS with {strategy['name']} client!")
-                return expected
-
-            # Check for any variant
-            try:
-                for fname in os.listdir(temp_dir):
-                    if fname.startswith(f"audio_{index}.") and not fname.endswith(".part"):
-                        logger.info(f"✅ SUCCESS: Downloaded {fname} with {strategy['name']}")
-                        return os.path.join(temp_dir, fname)
-            except OSError:
-                pass
+                path = expected
+            else:
+                # Check for any variant
+                try:
+                    for fname in os.listdir(temp_dir):
+                        if fname.startswith(f"audio_{index}.") and not fname.endswith(".part"):
+                            path = os.path.join(temp_dir, fname)
+                            break
+                except OSError:
+                    pass
+
+            if path:
+                logger.info(f"✅ SUCCESS: Downloaded {os.path.basename(path)} with {strategy['name']}")
+                STRATEGY_SCHEDULER.record(strategy["name"], SUCCESS, time.perf_counter() - attempt_start)
+                CLIP_CACHE.store(key, path)
+                record_download(strategy["name"], SUCCESS, path)
+                return path
+
+            # yt-dlp swallows errors (ignoreerrors), so no file is the usual failure
+            outcome = attempt_log.outcome()
                 
         except Exception as exc:
-            error_msg = str(exc).lower()
             logger.debug(f"Strategy '{strategy['name']}' failed: {exc}")
-            
-            # Check if it's a bot detection error
-            if "bot" in error_msg or "sign in" in error_msg:
-                logger.warning(f"🤖 Bot detected with {strategy['name']} client, will try next...")
-            elif "format" in error_msg:
-                logger.debug(f"Format issue with {strategy['name']}, trying next...")
-            
-            # Don't wait after last strategy
-            if strategy_idx < len(client_strategies) - 1:
-                time.sleep(random.uniform(2, 4))  # Brief pause before next strategy
+            outcome = classify(str(exc))
+
+        if is_cancelled():
+            break  # The download quota was met elsewhere; not this strategy's failure
+        STRATEGY_SCHEDULER.record(strategy["name"], outcome, time.perf_counter() - attempt_start)
+        record_download(strategy["name"], outcome)
+        if outcome == BOT:
+            bot_blocks += 1
+            logger.warning(f"🤖 Bot detected with {strategy['name']} client, will try next...")
+        elif outcome == FORMAT:
+            logger.debug(f"Format issue with {strategy['name']}, trying next...")
     
+    if is_cancelled():
+        discard_partials(temp_dir, f"audio_{index}.")
+        logger.info(f"Download {index} cancelled, quota already met")
+        return None
+
     # All methods failed
     logger.warning(f"All download methods failed for {url}")
     return None
 
 
-def cut_and_merge(audio_paths: List[str], duration_sec: int) -> AudioSegment:
-    """Cut first `duration_sec` from each file and merge into one AudioSegment."""
+def cut_and_merge(audio_paths: List[str], duration_sec: int, engine: Optional[str] = None) -> "AudioSegment":
+    """Cut `duration_sec` from each file and merge into one AudioSegment.
+
+    `engine` is "ffmpeg" (single-pass trim/concat to WAV), "numpy"
+    (loudness-matched, crossfaded and limited, see mixer.py) or "pydub".
+    Each clip starts at the track's highlight when HIGHLIGHT_CLIPS is on.
+    """
+    from pydub import AudioSegment
+
+    starts = find_highlights(audio_paths, duration_sec) if HIGHLIGHT_CLIPS else {}
+    engine = engine or MERGE_ENGINE
+    if engine == "numpy":
+        try:
+            _, pcm = mixer.mix(audio_paths, duration_sec, starts)
+            return AudioSegment(
+                data=pcm, sample_width=2, frame_rate=ffmpeg_merge.SAMPLE_RATE, channels=ffmpeg_merge.CHANNELS
+            )
+        except Exception as exc:
+            logger.warning("numpy merge engine failed (%s), falling back to pydub", exc)
+    if engine == "ffmpeg":
+        try:
+            _, wav_data = ffmpeg_merge.merge(audio_paths, duration_sec, fmt="wav", starts=starts)
+            with METRICS.timer("mashup_ffmpeg_seconds", op="decode", engine="wav"):
+                return AudioSegment.from_wav(io.BytesIO(wav_data))  # type: ignore
+        except Exception as exc:
+            logger.warning("ffmpeg merge engine failed (%s), falling back to pydub", exc)
+
     duration_ms = duration_sec * 1000
     combined = AudioSegment.empty()
     for path in audio_paths:
         try:
-            audio = AudioSegment.from_file(path)
-            combined += audio[:duration_ms]
+            with METRICS.timer("mashup_ffmpeg_seconds", op="decode", engine="pydub"):
+                audio = AudioSegment.from_file(path)
+            start_ms = int(starts.get(path, 0.0) * 1000)
+            combined += audio[start_ms:start_ms + duration_ms]
         except Exception as exc:
             logger.warning("Skipping %s: %s", path, exc)
     return combined
 
 
-def create_zip(audio_segment: AudioSegment, filename: str = "mashup.mp3") -> bytes:
-    """Export audio to mp3 inside a ZIP and return ZIP bytes."""
-    mp3_buf = io.BytesIO()
-    audio_segment.export(mp3_buf, format="mp3")
-    mp3_buf.seek(0)
+def finish_pipeline(pipeline: ClipPipeline, audio_paths: List[str], duration_sec: int) -> "AudioSegment":
+    """Collect a pipelined merge, redoing it with `cut_and_merge` if it failed."""
+    try:
+        pipeline.close()
+        return pipeline.segment()
+    except RuntimeError as exc:
+        logger.warning("%s, merging again after the downloads", exc)
+        return cut_and_merge(audio_paths, duration_sec)
+
+
+def job_cost(num_videos: int, duration_sec: int, output_profile: str, mode: Optional[str] = None) -> Cost:
+    """Admission estimate for a `run_pipeline` job: it merges (and holds) at most MASHUP_CLIPS clips."""
+    return estimate(min(num_videos, MAX_DOWNLOADS, MASHUP_CLIPS), duration_sec, output_profile, mode)
+
+
+def merge_to_file(
+    pipeline: Optional[ClipPipeline], audio_paths: List[str], duration_sec: int, output_file: str, fmt: str
+) -> bool:
+    """Merge the clips straight into the encoded `output_file` (spilled jobs); returns False if nothing merged.
+
+    The mashup's PCM is never held whole: the pipeline and the ffmpeg
+    engine encode as they go, and only the numpy engine mixes in memory.
+    """
+    if pipeline:
+        try:
+            pipeline.close()
+            return True
+        except RuntimeError as exc:
+            logger.warning("%s, merging again after the downloads", exc)
+    starts = find_highlights(audio_paths, duration_sec) if HIGHLIGHT_CLIPS else {}
+    if MERGE_ENGINE == "numpy":
+        try:
+            _, pcm = mixer.mix(audio_paths, duration_sec, starts)
+            mixer.encode(pcm, output_file, fmt)
+            return True
+        except Exception as exc:
+            logger.warning("numpy merge engine failed (%s), falling back to ffmpeg", exc)
+    try:
+        ffmpeg_merge.merge(audio_paths, duration_sec, output_file, fmt=fmt, starts=starts)
+        return True
+    except Exception as exc:
+        logger.warning("ffmpeg merge engine failed (%s), falling back to pydub", exc)
+    combined = cut_and_merge(audio_paths, duration_sec, engine="pydub")
+    if len(combined) == 0:
+        return False
+    save(combined, output_file, fmt)
+    return True
+
+
+def create_zip(
+    audio_segment: "AudioSegment", filename: str = "mashup.mp3", dest: Optional[str] = None, fmt: str = "mp3"
+) -> IO[bytes]:
+    """Export audio with the `fmt` output profile inside a ZIP and return a readable handle to the ZIP.
 
-    zip_buf = io.BytesIO()
-    with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr(filename, mp3_buf.read())
-    zip_buf.seek(0)
-    return zip_buf.read()
+    The encoder output is streamed into a STORED entry (compressed audio does
+    not deflate); the archive is written to `dest` if given, otherwise spooled
+    in memory and moved to a temp file once it gets large. The caller closes
+    the handle.
+    """
+    return write_zip(audio_segment, filename, dest=dest, fmt=fmt)
 
 
-def send_email(to_address: str, zip_data: bytes, filename: str = "mashup.zip"):
-    """Send an email with the ZIP file attached."""
+def build_email(to_address: str, zip_data: Union[bytes, IO[bytes]], filename: str = "mashup.zip") -> MIMEMultipart:
+    """Build the mashup email with the ZIP (bytes or a file handle) attached."""
     if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
         raise RuntimeError(
             "Email credentials not configured. "
@@ -316,26 +478,208 @@ def send_email(to_address: str, zip_data: bytes, filename: str = "mashup.zip"):
     )
     msg.attach(MIMEText(body, "plain"))
 
+    if not isinstance(zip_data, bytes):
+        zip_data.seek(0)
+        zip_data = zip_data.read()
     part = MIMEBase("application", "zip")
     part.set_payload(zip_data)
     encoders.encode_base64(part)
     part.add_header("Content-Disposition", f"attachment; filename={filename}")
     msg.attach(part)
+    return msg
+
 
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
+def send_email(to_address: str, zip_data: Union[bytes, IO[bytes]], filename: str = "mashup.zip"):
+    """Send an email with the ZIP file attached (blocking, one connection per call)."""
+    msg = build_email(to_address, zip_data, filename)
+    smtp_class = smtplib.SMTP_SSL if SMTP_SSL else smtplib.SMTP
+    with smtp_class(SMTP_HOST, SMTP_PORT) as server:
         server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
         server.sendmail(EMAIL_ADDRESS, to_address, msg.as_string())
 
 
+def queue_email(to_address: str, zip_data: Union[bytes, IO[bytes]], filename: str = "mashup.zip") -> str:
+    """Queue the mashup email in the outbox and return its message ID."""
+    return OUTBOX.enqueue(build_email(to_address, zip_data, filename))
+
+
 def is_valid_email(email: str) -> bool:
     """Validate email format."""
     return bool(re.match(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$", email))
 
 
+# Background pipeline
+
+def _record_fallback(reason: str):
+    """Count a run that falls back to the default mashup."""
+    METRICS.inc("mashup_fallback_total", entry="app", reason=reason)
+    METRICS.event("fallback", entry="app", reason=reason)
+
+
+def run_pipeline(
+    job: JobContext, singer_name: str, num_videos: int, duration: int, email_id: str,
+    output_profile: str = OUTPUT_PROFILE, spill: bool = False,
+):
+    """Search, download, merge, zip and email one mashup inside a job worker.
+
+    With `spill` (set by admission control when memory is short) the clips
+    are merged into an encoded file on disk instead of an AudioSegment.
+    """
+    profile = get_profile(output_profile)
+    temp_dir = tempfile.mkdtemp(prefix="mashup_")
+    combined = None  # Initialize combined variable
+    pipeline = None
+    merged_file = os.path.join(temp_dir, f"mashup{profile.extension}") if spill else None
+    if spill:
+        job.note("info", "🗄️ The server is busy, so this mashup is assembled on disk to save memory.")
+
+    try:
+        # Step 1 – Search
+        job.progress(5, "🔍 Searching YouTube…")
+        with METRICS.timer("mashup_stage_seconds", entry="app", stage="search"):
+            urls = search_youtube(singer_name, num_videos)
+        if not urls:
+            if FALLBACK_MODE:
+                _record_fallback("search_failed")
+                job.note("warning", f"Search failed for '{singer_name}', using default mashup file")
+                combined = create_working_demo()
+                job.progress(85, "Using default mashup file...")
+            else:
+                job.fail(f"No videos found for '{singer_name}'. Try a different artist name.")
+                return
+        else:
+            job.progress(15, f"Found {len(urls)} videos")
+
+            # Step 2 – Download
+            audio_paths: List[str] = []
+            downloaded_count = 0
+            consecutive_failures = 0
+            max_downloads = min(len(urls), MAX_DOWNLOADS)  # Limit attempts
+            
+            job.status(f"⬇️ Downloading {max_downloads} tracks in parallel…")
+            clip_seconds = clip_seconds_for(duration)
+
+            def fetch(u, idx):
+                return download_audio(u, idx, temp_dir, clip_seconds=clip_seconds)
+
+            if PIPELINE_MERGE and MERGE_ENGINE == "ffmpeg":
+                # Decode finished clips while later downloads are still running
+                pipeline = ClipPipeline(duration, merged_file, profile.name)
+                fetch = pipeline.decoding(fetch)
+            quota = MASHUP_CLIPS
+            download_start = time.perf_counter()
+            if DOWNLOAD_HEDGE:
+                # Stops (cancelling the rest) as soon as the quota is met
+                downloads = download_hedged(fetch, urls[:max_downloads], quota)
+            else:
+                downloads = download_many(fetch, urls[:max_downloads])
+            for i, url, path in downloads:
+                pct = 15 + int(50 * i / max_downloads)
+                job.progress(pct, f"⬇️ Finished track {i}/{max_downloads}... ({downloaded_count} successful)")
+                
+                if path:
+                    audio_paths.append(path)
+                    if pipeline:
+                        pipeline.append(i, path)
+                    downloaded_count += 1
+                    consecutive_failures = 0  # Reset failure counter
+                    logger.info(f"✅ Downloaded {downloaded_count}: {os.path.basename(path)}")
+                    
+                    # Early success exit
+                    if downloaded_count >= quota:
+                        logger.info(f"Got {downloaded_count} downloads, sufficient!")
+                        break
+                else:
+                    consecutive_failures += 1
+                    logger.warning(f"❌ Failed to download video {i}")
+                    
+                    # Early fallback if YouTube is blocking aggressively
+                    if FALLBACK_MODE and consecutive_failures >= 3:
+                        logger.warning("🚫 YouTube requires authentication (bot detection), switching to default file")
+                        _record_fallback("bot_detected")
+                        job.note("warning", "🤖 YouTube detected automated access. Using default mashup file instead.")
+                        combined = create_working_demo()
+                        job.progress(80, "Using default mashup file...")
+                        break
+            downloads.close()  # Cancel downloads that are no longer needed
+            METRICS.observe("mashup_stage_seconds", time.perf_counter() - download_start, entry="app", stage="download")
+
+            # Check results (skip if demo already created due to blocking)
+            if combined is None:
+                if not audio_paths:
+                    if FALLBACK_MODE:
+                        _record_fallback("downloads_failed")
+                        job.note("warning", "❌ Downloads failed, using default mashup file instead")
+                        combined = create_working_demo()
+                        job.progress(80, "Using default mashup file...")
+                    else:
+                        job.fail("❌ **Unable to download any audio files.** "
+                                 "Add `FALLBACK_MODE=true` to .env for working demo")
+                        return
+                else:
+                    if len(audio_paths) < max_downloads:
+                        job.note("warning", f"⚠️ Downloaded {len(audio_paths)}/{max_downloads} videos. Proceeding.")
+                        
+                    job.progress(70, f"Downloaded {len(audio_paths)} tracks")
+
+                    # Step 3 – Cut & merge
+                    job.progress(75, "✂️ Cutting & merging clips…")
+                    with METRICS.timer("mashup_stage_seconds", entry="app", stage="merge"):
+                        if merged_file:
+                            merged = merge_to_file(pipeline, audio_paths, duration, merged_file, profile.name)
+                        else:
+                            if pipeline:
+                                combined = finish_pipeline(pipeline, audio_paths, duration)
+                            else:
+                                combined = cut_and_merge(audio_paths, duration)
+                            merged = len(combined) > 0
+                    if not merged:
+                        merged_file = None
+                        if FALLBACK_MODE:
+                            _record_fallback("merge_failed")
+                            combined = create_working_demo()
+                        else:
+                            job.fail("No audio could be processed.")
+                            return
+        
+        # Step 4 – ZIP
+        job.progress(85, "Creating ZIP…")
+        filename = f"102303235-mashup{profile.extension}"
+        with METRICS.timer("mashup_stage_seconds", entry="app", stage="zip"):
+            if combined is None and merged_file:
+                zip_file = write_zip_file(merged_file, filename, dest=job.result_path)
+            else:
+                zip_file = create_zip(combined, filename=filename, dest=job.result_path, fmt=profile.name)
+        METRICS.inc("mashup_outputs_total", entry="app")
+        METRICS.inc("mashup_output_bytes_total", os.path.getsize(job.result_path), entry="app")
+        with zip_file:
+            # Step 5 – Email (delivered in the background by the outbox sender)
+            job.progress(90, "📧 Queueing email…")
+            try:
+                with METRICS.timer("mashup_stage_seconds", entry="app", stage="email"):
+                    message_id = queue_email(email_id, zip_file)
+                job.record(email_message_id=message_id)
+            except Exception as mail_exc:
+                logger.error("Email failed: %s", mail_exc)
+                job.note("warning", f"⚠️ Could not send email: {mail_exc}")
+                job.note("info", "You can still download the file below.")
+        job.progress(100, "Done!")
+
+    finally:
+        if pipeline:
+            pipeline.abort()  # No-op once the clips are merged
+        # Cleanup
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        METRICS.flush()  # Job workers are separate processes
+
+
 # Streamlit UI
 
 def main():
     st.set_page_config(page_title="YouTube Mashup Generator", page_icon="🎵", layout="centered")
+    OUTBOX.start()  # Background email delivery for finished jobs
+    METRICS.serve(METRICS_PORT)  # Prometheus snapshot at /metrics (when enabled)
     st.title("🎵 YouTube Mashup Generator")
     st.markdown("Create a mashup of your favourite singer's songs and get it emailed to you!")
     
@@ -345,6 +689,7 @@ def main():
     elif FALLBACK_MODE:
         st.info("🔧 **Fallback Mode Active** - Will use default.mp3 if YouTube blocks downloads")
         st.markdown("💡 **Tip**: Add YT_PO_TOKEN to secrets for higher success rate! [See Guide](YOUTUBE_BYPASS_GUIDE.md)")
+    render_usage()
     
     # Add helpful info
     with st.expander("ℹ️ How it works"):
@@ -354,7 +699,7 @@ def main():
         2. 🤖 Uses advanced anti-bot techniques (iOS/Android clients, human simulation)
         3. ⬇️ Downloads audio with multiple retry strategies
         4. ✂️ Cuts and merges clips into a mashup
-        5. 📧 Emails you the final MP3 in a ZIP file
+        5. 📧 Emails you the final mashup (MP3, Opus or AAC) in a ZIP file
         
         **Success Rate:**
         - With po_token configured: 85-95% ✅
@@ -368,6 +713,11 @@ def main():
         num_videos = st.number_input("Number of Videos", min_value=5, max_value=20, value=8)
         duration = st.number_input("Duration per clip (seconds)", min_value=20, max_value=60, value=20)
         email_id = st.text_input("Your Email Address", placeholder="you@example.com")
+        output_profile = st.selectbox(
+            "Output format", list(PROFILES),
+            index=list(PROFILES).index(OUTPUT_PROFILE) if OUTPUT_PROFILE in PROFILES else 0,
+            format_func=lambda name: PROFILES[name].describe(),
+        )
             
         submitted = st.form_submit_button("🎬 Create Mashup")
 
@@ -384,124 +734,88 @@ def main():
                 st.error(e)
             return
 
-        # Processing
-        temp_dir = tempfile.mkdtemp(prefix="mashup_")
-        progress = st.progress(0, text="Starting…")
-        status = st.empty()
-        combined = None  # Initialize combined variable
-
+        # Hand the pipeline to a background worker; the job outlives this script run
+        cost = job_cost(int(num_videos), int(duration), output_profile)
         try:
-            # Step 1 – Search
-            status.info("🔍 Searching YouTube…")
-            progress.progress(5, text="Searching YouTube…")
-            urls = search_youtube(singer_name.strip(), int(num_videos))
-            if not urls:
-                if FALLBACK_MODE:
-                    st.warning(f"Search failed for '{singer_name}', using default mashup file")
-                    combined = create_working_demo()
-                    progress.progress(85, text="Using default mashup file...")
-                else:
-                    st.error(f"No videos found for '{singer_name}'. Try a different artist name.")
-                    return
-            else:
-                progress.progress(15, text=f"Found {len(urls)} videos")
-
-                # Step 2 – Download
-                status.info("⬇️ Downloading audio…")
-                audio_paths: List[str] = []
-                downloaded_count = 0
-                consecutive_failures = 0
-                max_downloads = min(len(urls), 8)  # Limit attempts
-                
-                for i, url in enumerate(urls[:max_downloads], 1):
-                    pct = 15 + int(50 * i / max_downloads)
-                    progress.progress(pct, text=f"Downloading {i}/{max_downloads}…")
-                    
-                    status.info(f"⬇️ Downloading track {i}/{max_downloads}... ({downloaded_count} successful)")
-                    
-                    path = download_audio(url, i, temp_dir)
-                    if path:
-                        audio_paths.append(path)
-                        downloaded_count += 1
-                        consecutive_failures = 0  # Reset failure counter
-                        logger.info(f"✅ Downloaded {downloaded_count}: {os.path.basename(path)}")
-                        
-                        # Early success exit
-                        if downloaded_count >= 3:
-                            logger.info(f"Got {downloaded_count} downloads, sufficient!")
-                            break
-                    else:
-                        consecutive_failures += 1
-                        logger.warning(f"❌ Failed to download video {i}")
-                        
-                        # Early fallback if YouTube is blocking aggressively
-                        if FALLBACK_MODE and consecutive_failures >= 3:
-                            logger.warning("🚫 YouTube requires authentication (bot detection), switching to default file")
-                            st.warning("🤖 YouTube detected automated access. Using default mashup file instead.")
-                            combined = create_working_demo()
-                            progress.progress(80, text="Using default mashup file...")
-                            break
+            job_id = JOB_MANAGER.submit("app:run_pipeline", {
+                "singer_name": singer_name.strip(),
+                "num_videos": int(num_videos),
+                "duration": int(duration),
+                "email_id": email_id.strip(),
+                "output_profile": output_profile,
+            }, cost=cost)
+        except AdmissionRejected as exc:
+            st.error(f"🚦 {exc}")
+            return
+        st.session_state["job_id"] = job_id
+        st.query_params["job"] = job_id
 
-                # Check results (skip if demo already created due to blocking)
-                if combined is None:
-                    if not audio_paths:
-                        if FALLBACK_MODE:
-                            st.warning("❌ Downloads failed, using default mashup file instead")
-                            combined = create_working_demo()
-                            progress.progress(80, text="Using default mashup file...")
-                        else:
-                            st.error("❌ **Unable to download any audio files.**")
-                            st.error("Add `FALLBACK_MODE=true` to .env for working demo")
-                            return
-                    else:
-                        if len(audio_paths) < max_downloads:
-                            st.warning(f"⚠️ Downloaded {len(audio_paths)}/{max_downloads} videos. Proceeding.")
-                            
-                        progress.progress(70, text=f"Downloaded {len(audio_paths)} tracks")
-
-                        # Step 3 – Cut & merge
-                        status.info("✂️ Cutting & merging clips…")
-                        progress.progress(75, text="Merging audio clips…")
-                        combined = cut_and_merge(audio_paths, int(duration))
-                        if len(combined) == 0:
-                            if FALLBACK_MODE:
-                                combined = create_working_demo()
-                            else:
-                                st.error("No audio could be processed.")
-                                return
-            
-            progress.progress(85, text="Creating ZIP…")
+    job_id = st.session_state.get("job_id") or st.query_params.get("job")
+    if job_id:
+        render_job(job_id)
 
-            # Step 4 – ZIP
-            zip_data = create_zip(combined, filename="102303235-mashup.mp3")
-            progress.progress(90, text="Sending email…")
 
-            # Step 5 – Email
-            status.info("📧 Sending email…")
-            try:
-                send_email(email_id.strip(), zip_data)
-                progress.progress(100, text="Done!")
-                st.success(f"✅ Mashup sent to **{email_id.strip()}**! Check your inbox.")
-            except Exception as mail_exc:
-                logger.error("Email failed: %s", mail_exc)
-                st.warning(f"⚠️ Could not send email: {mail_exc}")
-                st.info("You can still download the file below.")
-
-            # Fallback download button
-            st.download_button(
-                label="⬇️ Download Mashup ZIP",
-                data=zip_data,
-                file_name="102303235-mashup.zip",
-                mime="application/zip",
-            )
+def render_usage():
+    """Show how much of the server's job memory budget is reserved, and the queue."""
+    usage = JOB_MANAGER.admission.usage()
+    reserved, budget = usage["memory_reserved"], usage["memory_budget"]
+    text = (
+        f"🖥️ Server load: {reserved // MB} / {budget // MB} MB reserved · "
+        f"{usage['running']}/{usage['workers']} running"
+    )
+    if usage["spilled"]:
+        text += f" ({usage['spilled']} on disk)"
+    if usage["queued"]:
+        text += f" · {usage['queued']} queued (~{usage['wait_seconds'] / 60:.0f} min of work)"
+    st.progress(min(1.0, reserved / budget) if budget else 0.0, text=text)
+
+
+def read_file(path: str) -> bytes:
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+def render_job(job_id: str):
+    """Show a job's progress, polling until it finishes."""
+    job = JOB_MANAGER.get(job_id)
+    if job is None:
+        st.warning("This mashup job is no longer available.")
+        return
+
+    if job["status"] == QUEUED:
+        position = JOB_MANAGER.admission.position(job_id)
+        ahead = f"#{position} in line" if position else "starting"
+        st.info(f"⏳ Queued ({ahead}, {len(JOB_MANAGER.active())} job(s) in progress)…")
+    st.progress(job["progress"], text=job["message"])
+    for note in job["notes"]:
+        getattr(st, note["level"])(note["message"])
+
+    delivery = OUTBOX.status(job["email_message_id"]) if job.get("email_message_id") else None
+    if delivery:
+        email_id = job["params"]["email_id"]
+        if delivery["status"] == EMAIL_SENT:
+            st.success(f"✅ Mashup sent to **{email_id}**! Check your inbox.")
+        elif delivery["status"] == EMAIL_FAILED:
+            st.warning(f"⚠️ Could not send email: {delivery['error']}")
+            st.info("You can still download the file below.")
+        else:
+            st.info(f"📧 Sending your mashup to **{email_id}**…")
+
+    if job["status"] == FAILED:
+        st.error(job["error"])
+    elif job["status"] == DONE and os.path.exists(JOB_MANAGER.store.result_path(job_id)):
+        # Fallback download button; the ZIP is only read when it is clicked, not on every poll
+        st.download_button(
+            label="⬇️ Download Mashup ZIP",
+            data=functools.partial(read_file, JOB_MANAGER.store.result_path(job_id)),
+            file_name="102303235-mashup.zip",
+            mime="application/zip",
+        )
 
-        except Exception as exc:
-            logger.error("Mashup failed: %s", exc)
-            st.error(f"An unexpected error occurred: {exc}")
-        finally:
-            # Cleanup
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir, ignore_errors=True)
+    # Keep polling while the job runs or its email is still queued
+    if job["status"] not in FINISHED or (delivery and delivery["status"] == EMAIL_QUEUED):
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,406 @@
+"""
+NumPy implementation of the audioop functions pydub needs.
+Used by audioop_compat when neither the stdlib `audioop` nor `audioop-lts`
+is available. Results are bit-exact with CPython's C implementation:
+samples are signed native-endian integers of 1, 2, 3 or 4 bytes, and
+out-of-range results are clipped the same way.
+"""
+
+import sys
+import math
+from typing import Tuple
+
+import numpy as np
+
+
+class error(Exception):
+    """Raised for invalid fragments or parameters (mirrors audioop.error)."""
+
+
+_DTYPES = {1: np.int8, 2: np.int16, 4: np.int32}
+_MAXVALS = {1: 0x7F, 2: 0x7FFF, 3: 0x7FFFFF, 4: 0x7FFFFFFF}
+_MINVALS = {1: -0x80, 2: -0x8000, 3: -0x800000, 4: -0x80000000}
+
+
+def _check_size(width: int):
+    if width not in (1, 2, 3, 4):
+        raise error("Size should be 1, 2, 3 or 4")
+
+
+def _check_parameters(fragment, width: int):
+    _check_size(width)
+    if len(memoryview(fragment).cast("B")) % width != 0:
+        raise error("not a whole number of frames")
+
+
+def _decode(fragment, width: int, dtype=np.int64) -> np.ndarray:
+    """Return the samples of `fragment` as an array of `dtype`."""
+    if width != 3:
+        return np.frombuffer(fragment, dtype=_DTYPES[width]).astype(dtype)
+    b = np.frombuffer(fragment, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+    if sys.byteorder == "big":
+        b = b[:, ::-1]
+    value = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+    return ((value ^ 0x800000) - 0x800000).astype(dtype)
+
+
+def _encode(values: np.ndarray, width: int) -> bytes:
+    """Pack in-range integer-valued samples into a `width`-byte fragment."""
+    if width != 3:
+        return values.astype(_DTYPES[width]).tobytes()
+    value = values.astype(np.int32)
+    b = np.empty((len(value), 3), dtype=np.uint8)
+    b[:, 0] = value & 0xFF
+    b[:, 1] = (value >> 8) & 0xFF
+    b[:, 2] = (value >> 16) & 0xFF
+    if sys.byteorder == "big":
+        b = b[:, ::-1]
+    return b.tobytes()
+
+
+def _fbound(values: np.ndarray, width: int) -> np.ndarray:
+    """Clip float results and round towards minus infinity, like audioop's fbound().
+
+    Works in place on `values`, which must be a float64 array.
+    """
+    np.clip(values, _MINVALS[width], _MAXVALS[width], out=values)
+    return np.floor(values, out=values)
+
+
+def _to32(values: np.ndarray, width: int) -> np.ndarray:
+    """Scale samples to 32-bit range (audioop's GETSAMPLE32)."""
+    return values << (32 - 8 * width)
+
+
+def _from32(values: np.ndarray, width: int) -> np.ndarray:
+    """Scale 32-bit samples down to `width` bytes (audioop's SETSAMPLE32)."""
+    return values >> (32 - 8 * width)
+
+
+def add(fragment1, fragment2, width):
+    """Add two fragments sample by sample, clipping on overflow."""
+    _check_parameters(fragment1, width)
+    if len(memoryview(fragment1).cast("B")) != len(memoryview(fragment2).cast("B")):
+        raise error("Lengths should be the same")
+    dtype = np.int64 if width == 4 else np.int32
+    total = _decode(fragment1, width, dtype)
+    total += _decode(fragment2, width, dtype)
+    return _encode(np.clip(total, _MINVALS[width], _MAXVALS[width], out=total), width)
+
+
+def mul(fragment, width, factor):
+    """Multiply every sample by `factor`, clipping on overflow."""
+    _check_parameters(fragment, width)
+    samples = _decode(fragment, width, np.float64)
+    samples *= float(factor)
+    return _encode(_fbound(samples, width), width)
+
+
+def reverse(fragment, width):
+    """Reverse the order of the samples."""
+    _check_parameters(fragment, width)
+    if width != 3:
+        return np.frombuffer(fragment, dtype=_DTYPES[width])[::-1].tobytes()
+    frames = np.frombuffer(fragment, dtype=np.uint8).reshape(-1, width)
+    return frames[::-1].tobytes()
+
+
+def tomono(fragment, width, lfactor, rfactor):
+    """Mix a stereo fragment down to mono as `left * lfactor + right * rfactor`."""
+    _check_parameters(fragment, width)
+    samples = _decode(fragment, width, np.float64)
+    if len(samples) % 2:
+        raise error("not a whole number of frames")
+    mixed = samples[0::2] * float(lfactor)
+    mixed += samples[1::2] * float(rfactor)
+    return _encode(_fbound(mixed, width), width)
+
+
+def tostereo(fragment, width, lfactor, rfactor):
+    """Turn a mono fragment into stereo with per-channel gains."""
+    _check_parameters(fragment, width)
+    samples = _decode(fragment, width, np.float64)
+    stereo = np.empty(len(samples) * 2, dtype=np.float64)
+    np.multiply(samples, float(lfactor), out=stereo[0::2])
+    np.multiply(samples, float(rfactor), out=stereo[1::2])
+    return _encode(_fbound(stereo, width), width)
+
+
+def lin2lin(fragment, width, newwidth):
+    """Convert samples between 1, 2, 3 and 4 byte widths."""
+    _check_parameters(fragment, width)
+    _check_size(newwidth)
+    if width == newwidth:
+        return bytes(fragment)
+    return _encode(_from32(_to32(_decode(fragment, width, np.int32), width), newwidth), newwidth)
+
+
+def ratecv(fragment, width, nchannels, inrate, outrate, state, weightA=1, weightB=0):
+    """Convert the frame rate of a fragment (linear interpolation).
+
+    Returns `(newfragment, newstate)`; pass `newstate` to the next call to
+    convert a stream in pieces.
+    """
+    _check_size(width)
+    if nchannels < 1:
+        raise error("# of channels should be >= 1")
+    bytes_per_frame = width * nchannels
+    if len(memoryview(fragment).cast("B")) % bytes_per_frame != 0:
+        raise error("not a whole number of frames")
+    if inrate <= 0 or outrate <= 0:
+        raise error("sampling rate not > 0")
+    if weightA < 1 or weightB < 0:
+        raise error("weightA should be >= 1, weightB should be >= 0")
+
+    d = math.gcd(inrate, outrate)
+    inrate, outrate = inrate // d, outrate // d
+    d = math.gcd(weightA, weightB)
+    weightA, weightB = weightA // d, weightB // d
+
+    prev, cur = _parse_state(state, nchannels)
+    d0 = -outrate if state is None else state[0]
+
+    frames = _to32(_decode(fragment, width), width).reshape(-1, nchannels)
+    nframes = len(frames)
+    if weightB:
+        frames = _filter(frames, cur, weightA, weightB)
+
+    # Output m is emitted once n_m input frames have been consumed
+    total = nframes * outrate + d0
+    count = total // inrate + 1 if total >= 0 else 0
+    m = np.arange(count, dtype=np.int64)
+    consumed = np.maximum(0, -((d0 - m * inrate) // outrate))
+    phase = (d0 + consumed * outrate - m * inrate).astype(np.float64)[:, None]
+
+    # Frame history: the two samples carried in the state, then the input
+    history = np.concatenate([np.array([prev, cur], dtype=np.int64), frames])
+    before = history[consumed].astype(np.float64)
+    after = history[consumed + 1].astype(np.float64)
+    out = np.trunc((before * phase + after * (outrate - phase)) / outrate).astype(np.int64)
+
+    new_d = int(d0 + nframes * outrate - count * inrate)
+    new_samps = tuple((int(history[nframes][c]), int(history[nframes + 1][c])) for c in range(nchannels))
+    return _encode(_from32(out.reshape(-1), width), width), (new_d, new_samps)
+
+
+def _parse_state(state, nchannels: int) -> Tuple[list, list]:
+    if state is None:
+        return [0] * nchannels, [0] * nchannels
+    if not isinstance(state, tuple):
+        raise TypeError("state must be a tuple or None")
+    try:
+        _, samps = state
+        if len(samps) != nchannels:
+            raise error("illegal state argument")
+        prev = [int(s[0]) for s in samps]
+        cur = [int(s[1]) for s in samps]
+    except (TypeError, ValueError, IndexError):
+        raise TypeError("ratecv(): illegal state argument")
+    return prev, cur
+
+
+def _filter(frames: np.ndarray, cur: list, weightA: int, weightB: int) -> np.ndarray:
+    """Apply ratecv's one-pole input filter (recursive, so done per sample)."""
+    out = np.empty_like(frames)
+    last = list(cur)
+    total = float(weightA + weightB)
+    for i, frame in enumerate(frames.tolist()):
+        for c, value in enumerate(frame):
+            last[c] = int((weightA * float(value) + weightB * float(last[c])) / total)
+        out[i] = last
+    return out
+
+
+
+# Analysis functions (used by pydub for dBFS, normalize, silence detection)
+
+def _exact_sum(values: np.ndarray, bound: float) -> float:
+    """Sum like audioop's sequential double loop.
+
+    When every partial sum stays below 2**53 (`bound` is the largest
+    possible term) any summation order is exact, so the fast sum is used;
+    otherwise a sequential cumulative sum reproduces the C rounding.
+    """
+    if len(values) == 0:
+        return 0.0
+    if len(values) * bound < 2.0 ** 53:
+        return float(np.sum(values, dtype=np.float64))
+    return float(np.cumsum(values, dtype=np.float64)[-1])
+
+
+def getsample(fragment, width, index):
+    """Return the value of sample `index` from the fragment."""
+    _check_parameters(fragment, width)
+    data = memoryview(fragment).cast("B")
+    if index < 0 or index >= len(data) // width:
+        raise error("Index out of range")
+    return int(_decode(data[index * width:(index + 1) * width], width)[0])
+
+
+def max(fragment, width):  # noqa: A001 - mirrors the audioop API
+    """Return the maximum absolute sample value."""
+    _check_parameters(fragment, width)
+    samples = _decode(fragment, width, np.int32 if width < 4 else np.int64)
+    if not len(samples):
+        return 0
+    lowest, highest = -int(samples.min()), int(samples.max())
+    return lowest if lowest > highest else highest
+
+
+def minmax(fragment, width):
+    """Return `(min, max)` of the sample values."""
+    _check_parameters(fragment, width)
+    samples = _decode(fragment, width)
+    if not len(samples):
+        return 0x7FFFFFFF, -0x80000000
+    return int(samples.min()), int(samples.max())
+
+
+def avg(fragment, width):
+    """Return the average of the sample values, rounded down."""
+    _check_parameters(fragment, width)
+    samples = _decode(fragment, width, np.float64)
+    if not len(samples):
+        return 0
+    total = _exact_sum(samples, float(-_MINVALS[width]))
+    return int(np.floor(total / float(len(samples))))
+
+
+def rms(fragment, width):
+    """Return the root-mean-square of the fragment."""
+    _check_parameters(fragment, width)
+    samples = _decode(fragment, width, np.float64)
+    if not len(samples):
+        return 0
+    if len(samples) * float(_MINVALS[width]) ** 2 < 2.0 ** 53:
+        total = float(np.dot(samples, samples))  # Exact in any order
+    else:
+        samples *= samples
+        total = _exact_sum(samples, float(_MINVALS[width]) ** 2)
+    return int(np.sqrt(total / float(len(samples))))
+
+
+def _extremes(fragment, width) -> np.ndarray:
+    """Return the local extremes audioop's avgpp/maxpp walk over."""
+    samples = _decode(fragment, width)
+    # Collapse runs of equal samples; audioop skips repeated values
+    keep = np.concatenate([[True], samples[1:] != samples[:-1]])
+    u = samples[keep]
+    if len(u) < 2:
+        return u[:0]
+    falling = u[1:] < u[:-1]
+    # The first comparison uses the raw first difference, as in the C code
+    first_prev = int(samples[1] - samples[0])
+    prev = np.concatenate([[first_prev], falling[:-1].astype(np.int64)])
+    turns = prev == (~falling).astype(np.int64)
+    return u[:-1][turns]
+
+
+def avgpp(fragment, width):
+    """Return the average peak-to-peak value of the fragment."""
+    _check_parameters(fragment, width)
+    if len(memoryview(fragment).cast("B")) <= width:
+        return 0
+    extremes = _extremes(fragment, width)
+    if len(extremes) < 2:
+        return 0
+    swings = np.abs(np.diff(extremes)).astype(np.float64)
+    total = _exact_sum(swings, 2.0 * 2 ** (8 * width - 1))
+    return int(total / float(len(swings)))
+
+
+def maxpp(fragment, width):
+    """Return the maximum peak-to-peak value of the fragment."""
+    _check_parameters(fragment, width)
+    if len(memoryview(fragment).cast("B")) <= width:
+        return 0
+    extremes = _extremes(fragment, width)
+    if len(extremes) < 2:
+        return 0
+    return int(np.abs(np.diff(extremes)).max())
+
+
+def cross(fragment, width):
+    """Return the number of zero crossings in the fragment."""
+    _check_parameters(fragment, width)
+    negative = _decode(fragment, width) < 0
+    if not len(negative):
+        return -1
+    return int(np.count_nonzero(negative[1:] != negative[:-1]))
+
+
+def bias(fragment, width, bias):
+    """Add `bias` to every sample, wrapping around on overflow."""
+    _check_parameters(fragment, width)
+    mask = (1 << (8 * width)) - 1
+    if width != 3:
+        # Unsigned NumPy arithmetic wraps around exactly like the C code
+        unsigned = np.dtype("u%d" % width)
+        return (np.frombuffer(fragment, dtype=unsigned) + unsigned.type(int(bias) & mask)).tobytes()
+    values = (_decode(fragment, width) + (int(bias) & mask)) & mask
+    return _encode((values ^ 0x800000) - 0x800000, width)
+
+
+def byteswap(fragment, width):
+    """Swap the byte order of every sample."""
+    _check_parameters(fragment, width)
+    frames = np.frombuffer(fragment, dtype=np.uint8).reshape(-1, width)
+    return frames[:, ::-1].tobytes()
+
+
+# 16-bit correlation helpers (findfit, findfactor, findmax)
+
+def _samples16(fragment) -> np.ndarray:
+    if len(memoryview(fragment).cast("B")) & 1:
+        raise error("Strings should be even-sized")
+    return np.frombuffer(fragment, dtype=np.int16).astype(np.int64)
+
+
+def _window_energy(samples: np.ndarray, length: int) -> np.ndarray:
+    """Sum of squares of every `length`-sample window."""
+    energy = np.concatenate([[0], np.cumsum(samples * samples)])
+    return (energy[length:] - energy[:-length] if length else np.zeros(len(samples) + 1, np.int64)).astype(np.float64)
+
+
+def findfactor(fragment, reference):
+    """Return the factor F minimising the difference between fragment and reference * F."""
+    a = _samples16(fragment)
+    r = _samples16(reference)
+    if len(a) != len(r):
+        raise error("Samples should be same size")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return float(np.float64(_exact_sum(a * r, 2.0 ** 30)) / np.float64(_exact_sum(r * r, 2.0 ** 30)))
+
+
+def findfit(fragment, reference):
+    """Return `(offset, factor)` of the best match of reference inside fragment."""
+    a = _samples16(fragment)
+    r = _samples16(reference)
+    if len(a) < len(r):
+        raise error("First sample should be longer")
+    sum_ri_2 = float(np.dot(r, r))
+    sum_aij_2 = _window_energy(a, len(r))
+    sum_aij_ri = np.correlate(a, r, mode="valid").astype(np.float64) if len(r) else np.zeros(len(a) + 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = (sum_ri_2 * sum_aij_2 - sum_aij_ri * sum_aij_ri) / sum_aij_2
+    if np.isnan(result[0]):
+        best = 0  # NaN never compares smaller, so the C loop keeps offset 0
+    else:
+        best = int(np.argmin(np.where(np.isnan(result), np.inf, result)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = float(np.float64(sum_aij_ri[best]) / np.float64(sum_ri_2))
+    return best, factor
+
+
+def findmax(fragment, length):
+    """Return the offset of the `length`-sample window with the most energy."""
+    a = _samples16(fragment)
+    if length < 0 or len(a) < length:
+        raise error("Input sample should be longer")
+    return int(np.argmax(_window_energy(a, length)))
+
+__all__ = [
+    "error", "add", "mul", "reverse", "tomono", "tostereo", "lin2lin", "ratecv",
+    "getsample", "max", "minmax", "avg", "rms", "avgpp", "maxpp", "cross",
+    "bias", "byteswap", "findfactor", "findfit", "findmax",
+]
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Batch mode: many mashups in one process.
+Reads a manifest of singer, count, duration and output (CSV with a header
+row, or JSONL) and builds every mashup with the CLI pipeline in a single
+process, so the imports, yt-dlp sessions, search cache, clip cache and
+download host limits are shared. Items for the same singer run one after
+another so later ones reuse the earlier search and clips; different
+singers run in parallel up to --jobs. One JSON result line per item is
+written to the report as items finish.
+
+Usage:
+    python batch.py <Manifest.csv|.jsonl> [--jobs N] [--downloads N] [--report PATH]
+
+Manifest (CSV):
+    singer,count,duration,output
+    Sharry Maan,20,20,out/sharry-maan.mp3
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from download_pool import DOWNLOAD_CONCURRENCY, HostLimiter
+from encoder_profiles import profile_for
+from metrics import METRICS
+
+cli = importlib.import_module("102303235")
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "2"))  # Singers processed at once
+
+FIELDS = ("singer", "count", "duration", "output")
+
+
+def read_manifest(path: str) -> List[Dict[str, Any]]:
+    """Parse a CSV or JSONL manifest; invalid rows carry an "error" instead of failing the batch."""
+    with open(path, newline="") as fh:
+        if path.endswith((".jsonl", ".json")):
+            rows = []
+            for line in fh:
+                if line.strip():
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError as exc:
+                        rows.append({"error": f"Invalid JSON: {exc}"})
+        else:
+            rows = list(csv.DictReader(fh))
+
+    items = []
+    for line, row in enumerate(rows, start=1):
+        item: Dict[str, Any] = {"line": line, **{field: row.get(field) for field in FIELDS}}
+        try:
+            if row.get("error"):
+                raise ValueError(row["error"])
+            item["singer"] = str(item["singer"] or "").strip()
+            item["count"] = int(item["count"])
+            item["duration"] = int(item["duration"])
+            item["output"] = str(item["output"] or "")
+            if not item["singer"]:
+                raise ValueError("singer is required")
+            if item["count"] <= 0 or item["duration"] <= 0:
+                raise ValueError("count and duration must be positive integers")
+            profile_for(item["output"])  # Raises for extensions no output profile writes
+        except (TypeError, ValueError) as exc:
+            item["error"] = str(exc)
+        items.append(item)
+    return items
+
+
+def run_item(item: Dict[str, Any], limiter: HostLimiter) -> Dict[str, Any]:
+    """Build one mashup and return its report record."""
+    record = dict(item, status="failed", clips=0, bytes=0, error=None)
+    start = time.perf_counter()
+    temp_dir = tempfile.mkdtemp(prefix="mashup_batch_")
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(item["output"])), exist_ok=True)
+        result = cli.make_mashup(
+            item["singer"], item["count"], item["duration"], item["output"],
+            temp_dir=temp_dir, limiter=limiter, entry="batch",
+        )
+        record.update(result)
+        record["bytes"] = os.path.getsize(item["output"])
+    except cli.MashupError as exc:
+        record["error"] = str(exc)
+    except Exception as exc:
+        logger.exception("Batch item %d (%s) failed", item["line"], item["singer"])
+        record["error"] = f"Unexpected error: {exc}"
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def run_batch(items: List[Dict[str, Any]], report_path: str, jobs: int = BATCH_CONCURRENCY,
+              downloads: int = DOWNLOAD_CONCURRENCY) -> List[Dict[str, Any]]:
+    """Run every valid item and append one JSON line per item to `report_path`."""
+    limiter = HostLimiter(per_host=downloads)  # One download budget for the whole batch
+    report_lock = threading.Lock()
+    records: List[Dict[str, Any]] = []
+
+    def report(record: Dict[str, Any]):
+        with report_lock:
+            records.append(record)
+            with open(report_path, "a") as fh:
+                fh.write(json.dumps(record) + "\n")
+        logger.info("Item %d (%s): %s", record["line"], record["singer"], record["status"])
+
+    # Same singer (any case) in one queue: the largest search first answers the smaller ones
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for item in items:
+        if item.get("error"):
+            report(dict(item, status="invalid"))
+            continue
+        groups.setdefault(" ".join(item["singer"].lower().split()), []).append(item)
+
+    def run_group(group: List[Dict[str, Any]]):
+        for item in sorted(group, key=lambda i: -i["count"]):
+            report(run_item(item, limiter))
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="batch") as executor:
+        for future in [executor.submit(run_group, group) for group in groups.values()]:
+            future.result()
+    return sorted(records, key=lambda r: r["line"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build many mashups from a manifest in one process.")
+    parser.add_argument("manifest", help="CSV (singer,count,duration,output) or JSONL manifest")
+    parser.add_argument("--jobs", type=int, default=BATCH_CONCURRENCY, help="Singers processed at once")
+    parser.add_argument("--downloads", type=int, default=DOWNLOAD_CONCURRENCY,
+                        help="Downloads in flight per host across the whole batch")
+    parser.add_argument("--report", help="Result report (JSONL); default: <manifest>.report.jsonl")
+    args = parser.parse_args()
+
+    report_path = args.report or os.path.splitext(args.manifest)[0] + ".report.jsonl"
+    try:
+        items = read_manifest(args.manifest)
+    except OSError as exc:
+        print(f"Error: cannot read manifest: {exc}")
+        sys.exit(1)
+    open(report_path, "w").close()
+
+    try:
+        records = run_batch(items, report_path, jobs=args.jobs, downloads=args.downloads)
+    finally:
+        METRICS.flush()
+
+    counts: Dict[str, int] = {}
+    for record in records:
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+    summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+    print(f"\n{len(records)} item(s): {summary}. Report: {report_path}")
+    sys.exit(0 if all(r["status"] in ("ok", "fallback") for r in records) else 1)
+
+
+if __name__ == "__main__":
+    main()
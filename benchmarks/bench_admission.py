@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark: admission control estimates vs measured job memory and CPU.
+
+Synthesises the downloaded tracks a web app job for <Videos> videos merges
+(`app.job_cost` and `run_pipeline` share MASHUP_CLIPS) and, for each merge
+mode, runs the app's merge and ZIP steps on them in a fresh worker process,
+in memory and spilled to disk, as `run_pipeline` does. Reports the peak RSS the
+steps added (over a warmed-up baseline) and the CPU time they used
+(ffmpeg children included), next to `admission.estimate`, plus the PCM
+copies the peak corresponds to, which is what PCM_COPIES and
+SPILLED_PCM_COPIES declare. Exits with status 1 if a measured peak exceeds
+the estimate admission control reserves for the job.
+
+Usage:
+    python benchmarks/bench_admission.py [--videos N] [--duration SEC]
+        [--modes pipeline,ffmpeg,numpy,pydub] [--output results.json]
+"""
+
+import os
+import sys
+import json
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from common import ROOT, write_results
+
+
+def make_tracks(directory, count, seconds):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"audio_{i}.m4a")
+        source = (
+            f"sine=frequency={220 + 55 * i}:sample_rate=44100:duration={seconds},"
+            f"volume='0.3+0.2*sin(2*PI*t*{1 + i % 3})':eval=frame"
+        )
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi", "-i", source,
+             "-ac", "2", "-c:a", "aac", "-b:a", "128k", path],
+            check=True,
+        )
+        paths.append(path)
+    return paths
+
+
+def cpu_seconds():
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def import_app():
+    sys.path.insert(0, ROOT)
+    try:
+        import audioop  # noqa: F401
+    except ImportError:
+        import audioop_compat
+        sys.modules["audioop"] = audioop_compat
+    import app
+
+    return app
+
+
+def child(spec):
+    """Run one job's merge + ZIP steps and print peak RSS / CPU measurements as JSON."""
+    app = import_app()
+
+    paths, duration, spill, workdir = spec["paths"], spec["duration"], spec["spill"], spec["workdir"]
+
+    def run(paths, duration, tag):
+        pipelined = app.PIPELINE_MERGE and app.MERGE_ENGINE == "ffmpeg"
+        merged_file = os.path.join(workdir, f"{tag}.mp3") if spill else None
+        dest = os.path.join(workdir, f"{tag}.zip")
+        pipeline = app.ClipPipeline(duration, merged_file, "mp3") if pipelined else None
+        if pipeline:
+            for i, path in enumerate(paths):
+                pipeline.decoding(lambda url, index: url)(path, i)
+                pipeline.append(i, path)
+        if merged_file:
+            app.merge_to_file(pipeline, paths, duration, merged_file, "mp3")
+            zip_file = app.write_zip_file(merged_file, "mashup.mp3", dest=dest)
+        else:
+            combined = app.finish_pipeline(pipeline, paths, duration) if pipeline else app.cut_and_merge(paths, duration)
+            if len(combined) == 0:
+                raise RuntimeError("nothing merged")
+            zip_file = app.create_zip(combined, "mashup.mp3", dest=dest)
+            del combined
+        zip_file.close()
+
+    run(paths[:1], 1, "warmup")
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    start = cpu_seconds()
+    run(paths, duration, "job")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps({"added_bytes": max(0, peak - baseline), "cpu_seconds": cpu_seconds() - start}))
+
+
+def measure(mode, paths, duration, spill, workdir):
+    env = dict(os.environ, MERGE_ENGINE="ffmpeg" if mode == "pipeline" else mode)
+    env["PIPELINE_MERGE"] = "true" if mode == "pipeline" else "false"
+    spec = json.dumps({"paths": paths, "duration": duration, "spill": spill, "workdir": workdir})
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", spec], env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=8, help="Videos requested in the app form")
+    parser.add_argument("--duration", type=int, default=60)
+    parser.add_argument("--modes", default="pipeline,ffmpeg,numpy,pydub")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    if args.child:
+        child(json.loads(args.child))
+        return
+
+    app = import_app()
+    import admission
+    from highlight import HIGHLIGHT_SCAN_SECONDS
+
+    clips = min(args.videos, app.MAX_DOWNLOADS, app.MASHUP_CLIPS)  # What the job holds and merges
+    pcm = clips * args.duration * admission.PCM_BYTES_PER_SECOND
+    results = []
+    over = False
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = make_tracks(workdir, clips, args.duration + HIGHLIGHT_SCAN_SECONDS + 5)
+        for mode in args.modes.split(","):
+            cost = app.job_cost(args.videos, args.duration, "mp3", mode)
+            for spill in (False, True):
+                measured = measure(mode, paths, args.duration, spill, workdir)
+                record = {"mode": mode, "spill": spill, **measured}
+                estimated = cost.spilled_memory if spill else cost.memory
+                if "error" not in measured:
+                    added = record.pop("added_bytes")
+                    record.update(
+                        added_mb=round(added / admission.MB, 1),
+                        pcm_copies=round(added / pcm, 2),
+                        cpu_seconds=round(measured["cpu_seconds"], 2),
+                        within_estimate=added <= estimated,
+                    )
+                    over = over or added > estimated
+                record.update(
+                    estimated_mb=round(estimated / admission.MB, 1),
+                    estimated_cpu_seconds=round(cost.cpu_seconds, 2),
+                )
+                results.append(record)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "child")}
+    config.update(clips=clips, pcm_mb=round(pcm / admission.MB, 1))
+    write_results({"config": config, "results": results}, args.output)
+    if over:
+        sys.exit("A job's measured memory exceeded its admission estimate")
+
+
+if __name__ == "__main__":
+    main()
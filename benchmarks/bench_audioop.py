@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: NumPy audioop backend vs the C implementation.
+
+Times each function of `audioop_numpy` against `audioop` (stdlib on
+Python < 3.13, audioop-lts otherwise) on a multi-minute buffer and checks
+that both produce identical bytes.
+
+Usage:
+    python benchmarks/bench_audioop.py [<Minutes>] [<SampleWidth>]
+"""
+
+import os
+import sys
+import time
+
+from common import write_results
+
+import audioop  # type: ignore  # C implementation (stdlib or audioop-lts)
+import audioop_numpy
+
+RATE = 44100
+REPEATS = 3
+
+
+def best_time(func, *args):
+    best = float("inf")
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    frames = int(minutes * 60 * RATE)
+    stereo = os.urandom(frames * 2 * width)
+    other = os.urandom(frames * 2 * width)
+    mono = stereo[: frames * width]
+
+    cases = {
+        "add": (stereo, other, width),
+        "mul": (stereo, width, 0.7),
+        "reverse": (stereo, width),
+        "tomono": (stereo, width, 0.5, 0.5),
+        "tostereo": (mono, width, 1.0, 1.0),
+        "lin2lin": (stereo, width, 4 if width != 4 else 2),
+        "ratecv": (stereo, width, 2, RATE, 48000, None),
+        "rms": (stereo, width),
+        "max": (stereo, width),
+        "minmax": (stereo, width),
+        "avg": (stereo, width),
+        "avgpp": (stereo, width),
+        "maxpp": (stereo, width),
+        "cross": (stereo, width),
+        "bias": (stereo, width, 1000),
+        "byteswap": (stereo, width),
+        "getsample": (stereo, width, frames),
+    }
+    if width == 2:
+        cases["findmax"] = (mono, RATE)
+
+    results = {}
+    for name, args in cases.items():
+        c_time, c_out = best_time(getattr(audioop, name), *args)
+        np_time, np_out = best_time(getattr(audioop_numpy, name), *args)
+        results[name] = {
+            "c_seconds": round(c_time, 4),
+            "numpy_seconds": round(np_time, 4),
+            "numpy_vs_c": round(np_time / c_time, 2) if c_time else None,
+            "bit_exact": c_out == np_out,
+        }
+
+    write_results({
+        "minutes": minutes,
+        "sample_width": width,
+        "buffer_bytes": len(stereo),
+        "functions": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
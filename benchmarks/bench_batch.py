@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: batch mode against a fake YouTube backend.
+
+Builds a manifest of <Singers> singers with <Repeat> items each (different
+video counts, as a nightly manifest has) and runs it through
+`batch.run_batch` at each --jobs level, with fresh caches per level. Also
+times a cold interpreter importing `102303235.py`, the startup every
+per-singer `python 102303235.py` invocation pays, and projects it over the
+manifest. Needs ffmpeg; no network access.
+
+Usage:
+    python benchmarks/bench_batch.py [--media DIR] [--singers N] [--repeat N]
+        [--duration SEC] [--jobs 1,4] [--latency SEC] [--output results.json]
+"""
+
+import os
+import sys
+import csv
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from common import ROOT, write_results
+from fake_youtube import FakeYouTube, find_media, make_media
+from clip_cache import ClipCache
+from search_cache import SearchCache
+from strategy_scheduler import StrategyScheduler
+from format_resolver import FormatCache
+import ydl_pool
+import batch
+
+
+def write_manifest(path, out_dir, singers, repeat, duration):
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(batch.FIELDS)
+        for s in range(singers):
+            for r in range(repeat):
+                writer.writerow([f"Fake Singer {s}", 6 + 2 * r, duration, os.path.join(out_dir, f"{s}_{r}.mp3")])
+
+
+def startup_seconds(samples=3):
+    """Median wall time of a fresh interpreter importing the CLI module."""
+    code = f"import sys; sys.path.insert(0, {ROOT!r}); import importlib; importlib.import_module('102303235')"
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--media", help="Directory of audio files to serve (default: synthetic tracks)")
+    parser.add_argument("--singers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=2, help="Manifest items per singer")
+    parser.add_argument("--duration", type=int, default=20)
+    parser.add_argument("--jobs", default="1,4", help="Comma-separated --jobs levels to compare")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--search-latency", type=float, default=1.0)
+    parser.add_argument("--bandwidth-kbps", type=float, default=4000.0)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_batch_")
+    media = find_media(args.media) if args.media else make_media(os.path.join(scratch, "media"))
+    backend = FakeYouTube(media, latency=args.latency, search_latency=args.search_latency,
+                          bandwidth_kbps=args.bandwidth_kbps, seed=1)
+    for path in media:
+        backend.duration(path)
+    backend.install(ydl_pool)
+
+    cli = batch.cli
+    levels = {}
+    try:
+        for jobs in [int(j) for j in args.jobs.split(",")]:
+            level_dir = os.path.join(scratch, f"jobs_{jobs}")
+            os.makedirs(os.path.join(level_dir, "out"))
+            cli.CLIP_CACHE = ClipCache(os.path.join(level_dir, "clips"))
+            cli.SEARCH_CACHE = SearchCache(directory="")
+            cli.FORMAT_CACHE = FormatCache()
+            cli.STRATEGY_SCHEDULER = StrategyScheduler(os.path.join(level_dir, "strategies.json"))
+            manifest = os.path.join(level_dir, "manifest.csv")
+            write_manifest(manifest, os.path.join(level_dir, "out"), args.singers, args.repeat, args.duration)
+
+            before = dict(backend.stats)
+            start = time.perf_counter()
+            records = batch.run_batch(batch.read_manifest(manifest), os.path.join(level_dir, "report.jsonl"), jobs=jobs)
+            wall = time.perf_counter() - start
+            levels[jobs] = {
+                "wall_seconds": round(wall, 3),
+                "ok": sum(1 for r in records if r["status"] == "ok"),
+                "items": len(records),
+                "item_seconds_max": max(r["seconds"] for r in records),
+                "backend": {k: backend.stats[k] - before[k] for k in backend.stats},
+            }
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    startup = startup_seconds()
+    items = args.singers * args.repeat
+    write_results({
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "levels": levels,
+        "cli_startup_seconds": round(startup, 3),
+        "per_item_startup_total_seconds": round(startup * items, 3),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
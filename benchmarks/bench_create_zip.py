@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory and time of ZIP packaging.
+
+Compares the original `create_zip` (MP3 export into BytesIO, DEFLATE into a
+second BytesIO, bytes copies of both) with the streaming STORED path in
+`zip_export.write_zip`, on a synthetic mashup of the given length.
+Peak memory is Python-heap allocations measured with tracemalloc.
+Requires ffmpeg.
+
+Usage:
+    python benchmarks/bench_create_zip.py [<Seconds>]
+"""
+
+import io
+import sys
+import time
+import zipfile
+import tracemalloc
+
+from common import write_results
+from pydub.generators import Sine, WhiteNoise
+
+from zip_export import ZIP_SPOOL_THRESHOLD, write_zip
+
+
+def legacy_create_zip(audio_segment, filename="mashup.mp3"):
+    """The pre-streaming implementation, kept here as the baseline."""
+    mp3_buf = io.BytesIO()
+    audio_segment.export(mp3_buf, format="mp3", bitrate="192k")  # Same bitrate as ENCODERS["mp3"]
+    mp3_buf.seek(0)
+
+    zip_buf = io.BytesIO()
+    with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(filename, mp3_buf.read())
+    zip_buf.seek(0)
+    return zip_buf.read()
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"seconds": round(elapsed, 3), "peak_bytes": peak}
+
+
+def main():
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    # Tone plus noise so the MP3 is about as incompressible as real music
+    tone = Sine(440).to_audio_segment(duration=seconds * 1000)
+    audio = tone.overlay(WhiteNoise().to_audio_segment(duration=seconds * 1000, volume=-30)).set_channels(2)
+
+    data, legacy = measure(lambda: legacy_create_zip(audio))
+    legacy["zip_bytes"] = len(data)
+    del data
+
+    def streaming(threshold):
+        handle = write_zip(audio, spool_threshold=threshold)
+        size = handle.seek(0, 2)
+        handle.close()
+        return size
+
+    size, stream = measure(lambda: streaming(ZIP_SPOOL_THRESHOLD))
+    stream["zip_bytes"] = size
+    size, spooled = measure(lambda: streaming(1))  # Roll over to disk immediately
+    spooled["zip_bytes"] = size
+
+    write_results({
+        "audio_seconds": seconds,
+        "pcm_bytes": len(audio.raw_data),
+        "legacy_create_zip": legacy,
+        "streaming_write_zip": stream,
+        "streaming_write_zip_on_disk": spooled,
+    })
+
+
+if __name__ == "__main__":
+    main()
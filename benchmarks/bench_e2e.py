@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Benchmark: end-to-end pipeline against a fake YouTube backend.
+
+Runs `102303235.py::main` and the `app.py` job pipeline with yt-dlp replaced
+by `fake_youtube.FakeYouTube` (local media, simulated latency, bandwidth and
+failures) and email going to a local SMTP server, and reports per-stage
+timings as JSON. Needs ffmpeg and `pip install aiosmtpd`; no network access.
+Each run uses fresh clip/search caches unless --warm is given; strategy
+stats start empty and carry over between runs.
+
+Usage:
+    python benchmarks/bench_e2e.py [--media DIR] [--runs N] [--videos N]
+        [--duration SEC] [--latency SEC] [--bandwidth-kbps KBPS]
+        [--failure-rate P] [--bot-rate P] [--transfer-failure-rate P]
+        [--stall-rate P] [--stall-seconds SEC] [--blocked-clients ios,...]
+        [--fixed-strategies] [--single-phase] [--no-hedge] [--target cli|app|both] [--warm]
+        [--output results.json]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import contextlib
+import tempfile
+import threading
+from collections import defaultdict
+
+from common import load_cli, write_results
+
+SMTP_PORT = 8026
+EMAIL_FROM = "bench@localhost"
+EMAIL_TO = "listener@localhost"
+
+# Local SMTP settings must be in place before app/outbox read them at import
+os.environ.update({
+    "SMTP_HOST": "127.0.0.1",
+    "SMTP_PORT": str(SMTP_PORT),
+    "SMTP_SSL": "false",
+    "EMAIL_ADDRESS": EMAIL_FROM,
+    "EMAIL_PASSWORD": "bench",
+})
+
+from fake_youtube import FakeYouTube, find_media, make_media  # noqa: E402
+from clip_cache import ClipCache  # noqa: E402
+from search_cache import SearchCache  # noqa: E402
+from outbox import Outbox  # noqa: E402
+from strategy_scheduler import StrategyScheduler  # noqa: E402
+from format_resolver import FormatCache  # noqa: E402
+import ydl_pool  # noqa: E402
+
+from aiosmtpd.controller import Controller  # type: ignore  # noqa: E402
+from aiosmtpd.smtp import AuthResult  # type: ignore  # noqa: E402
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+        self.bytes = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        self.bytes += len(envelope.content)
+        return "250 OK"
+
+
+def accept_any(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+class StageTimer:
+    """Wraps module functions and records when each call starts and ends."""
+
+    def __init__(self):
+        self.calls = defaultdict(list)
+        self._lock = threading.Lock()
+        self._originals = []
+
+    def wrap(self, module, name, stage):
+        original = getattr(module, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.calls[stage].append((start, time.perf_counter()))
+
+        self._originals.append((module, name, original))
+        setattr(module, name, timed)
+
+    def restore(self):
+        for module, name, original in reversed(self._originals):
+            setattr(module, name, original)
+        self._originals.clear()
+
+    def measure(self, stage):
+        """Context manager that times a block as one call of `stage`."""
+        timer = self
+
+        class _Block:
+            def __enter__(self):
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc):
+                with timer._lock:
+                    timer.calls[stage].append((self.start, time.perf_counter()))
+
+        return _Block()
+
+    def summary(self):
+        stages = {}
+        for stage, calls in self.calls.items():
+            busy = [end - start for start, end in calls]
+            stages[stage] = {
+                "calls": len(calls),
+                "wall_seconds": round(max(end for _, end in calls) - min(start for start, _ in calls), 3),
+                "busy_seconds": round(sum(busy), 3),
+                "max_seconds": round(max(busy), 3),
+            }
+        return stages
+
+
+def fresh_caches(module, cache_dir, two_phase=True):
+    module.CLIP_CACHE = ClipCache(os.path.join(cache_dir, "clips"))
+    module.SEARCH_CACHE = SearchCache(directory="")
+    module.FORMAT_CACHE = FormatCache(enabled=two_phase)
+
+
+def run_cli(cli, backend, args, workdir):
+    timer = StageTimer()
+    timer.wrap(cli, "search_videos", "search")
+    timer.wrap(cli, "download_audio", "download_audio")
+    timer.wrap(cli, "cut_and_merge", "cut_and_merge")  # Includes the MP3 export
+    timer.wrap(cli, "finish_pipeline", "finish_pipeline")  # Tail of a pipelined merge (PIPELINE_MERGE)
+    output_file = os.path.join(workdir, "mashup.mp3")
+    argv, cwd = sys.argv, os.getcwd()
+    sys.argv = ["102303235.py", "Fake Singer", str(args.videos), str(args.duration), output_file]
+    os.chdir(workdir)  # TEMP_DIR is relative to the working directory
+    exit_code = 0
+    try:
+        # The CLI prints progress to stdout, which carries the JSON results here
+        with timer.measure("total"), contextlib.redirect_stdout(sys.stderr):
+            cli.main()
+    except SystemExit as exc:
+        exit_code = exc.code if isinstance(exc.code, int) else 1
+    finally:
+        sys.argv = argv
+        os.chdir(cwd)
+        timer.restore()
+    return {
+        "ok": exit_code == 0 and os.path.exists(output_file),
+        "exit_code": exit_code,
+        "output_bytes": os.path.getsize(output_file) if os.path.exists(output_file) else 0,
+        "stages": timer.summary(),
+    }
+
+
+def run_app(app, backend, args, workdir):
+    from jobs import JobStore, JobContext
+
+    timer = StageTimer()
+    timer.wrap(app, "search_youtube", "search")
+    timer.wrap(app, "download_audio", "download_audio")
+    timer.wrap(app, "cut_and_merge", "cut_and_merge")
+    timer.wrap(app, "finish_pipeline", "finish_pipeline")
+    timer.wrap(app, "create_zip", "create_zip")  # Includes the MP3 export
+    timer.wrap(app, "queue_email", "queue_email")
+    store = JobStore(os.path.join(workdir, "jobs"))
+    job_id = store.create({})
+    job = JobContext(store, job_id)
+    try:
+        with timer.measure("total"):
+            app.run_pipeline(job, "Fake Singer", args.videos, args.duration, EMAIL_TO)
+        with timer.measure("email_delivery"):
+            delivered = app.OUTBOX.flush(timeout=120)
+        result = job.result_path
+        if os.path.exists(result):
+            with timer.measure("send_email"):
+                with open(result, "rb") as fh:
+                    app.send_email(EMAIL_TO, fh)
+    finally:
+        timer.restore()
+    state = store.read(job_id) or {}
+    return {
+        "ok": state.get("status") != "failed" and os.path.exists(job.result_path),
+        "error": state.get("error"),
+        "email_delivered": delivered,
+        "zip_bytes": os.path.getsize(job.result_path) if os.path.exists(job.result_path) else 0,
+        "stages": timer.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--media", help="Directory of audio files to serve (default: synthetic tracks)")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--videos", type=int, default=8)
+    parser.add_argument("--duration", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per video extraction")
+    parser.add_argument("--search-latency", type=float, default=1.0)
+    parser.add_argument("--bandwidth-kbps", type=float, default=4000.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--bot-rate", type=float, default=0.0)
+    parser.add_argument("--transfer-failure-rate", type=float, default=0.0, help="Transfers cut off part-way")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Transfers that hang for --stall-seconds")
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+    parser.add_argument("--blocked-clients", default="", help="Comma-separated player clients that always get bot-blocked")
+    parser.add_argument("--fixed-strategies", action="store_true", help="Use the fixed strategy order and sleeps")
+    parser.add_argument("--single-phase", action="store_true", help="Re-extract formats on every download attempt")
+    parser.add_argument("--no-hedge", action="store_true", help="Download candidates in order without a quota")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--target", choices=["cli", "app", "both"], default="both")
+    parser.add_argument("--warm", action="store_true", help="Keep clip/search caches between runs")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_e2e_")
+    media = find_media(args.media) if args.media else make_media(os.path.join(scratch, "media"))
+    backend = FakeYouTube(
+        media,
+        latency=args.latency,
+        search_latency=args.search_latency,
+        bandwidth_kbps=args.bandwidth_kbps,
+        failure_rate=args.failure_rate,
+        bot_rate=args.bot_rate,
+        transfer_failure_rate=args.transfer_failure_rate,
+        stall_rate=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+        blocked_clients=[c for c in args.blocked_clients.split(",") if c],
+        seed=args.seed,
+    )
+    for path in media:
+        backend.duration(path)  # Probe outside the timed runs
+
+    handler = CountingHandler()
+    controller = Controller(
+        handler, hostname="127.0.0.1", port=SMTP_PORT,
+        authenticator=accept_any, auth_require_tls=False,
+    )
+    controller.start()
+
+    modules = {}
+    if args.target in ("cli", "both"):
+        modules["cli"] = load_cli()
+    if args.target in ("app", "both"):
+        import app
+        app.OUTBOX = Outbox(directory=os.path.join(scratch, "outbox"), use_ssl=False,
+                            username=EMAIL_FROM, password="bench")
+        app.OUTBOX.start()
+        modules["app"] = app
+
+    backend.install(ydl_pool)  # Every YoutubeDL session comes from the pool module
+    runs = defaultdict(list)
+    try:
+        for name, module in modules.items():
+            cache_dir = os.path.join(scratch, f"cache_{name}")
+            # Strategy stats carry over between runs, as they do in production
+            module.DOWNLOAD_HEDGE = not args.no_hedge
+            module.STRATEGY_SCHEDULER = StrategyScheduler(
+                os.path.join(cache_dir, "strategies.json"), adaptive=not args.fixed_strategies
+            )
+            for run in range(args.runs):
+                if run == 0 or not args.warm:
+                    fresh_caches(module, os.path.join(cache_dir, str(run)), two_phase=not args.single_phase)
+                workdir = tempfile.mkdtemp(prefix=f"{name}_", dir=scratch)
+                runner = run_cli if name == "cli" else run_app
+                runs[name].append(runner(module, backend, args, workdir))
+        if "app" in modules:
+            modules["app"].OUTBOX.stop()
+    finally:
+        controller.stop()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    config["media_files"] = len(media)
+    write_results({
+        "config": config,
+        "backend": backend.stats,
+        "smtp": {"received": handler.received, "bytes": handler.bytes},
+        "runs": runs,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
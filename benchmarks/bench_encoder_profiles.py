@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: encode time and file size per output profile.
+
+Encodes one reference mashup with every profile in
+`encoder_profiles.PROFILES` (a single ffmpeg process each, as the
+exporters run them) and reports the best of <Repeats> encode times, speed
+in multiples of real time, output size and the resulting average bitrate,
+next to the bitrate and speed each profile declares. The reference is
+<Seconds> of synthetic clips (see bench_parallel_encode.py) unless
+--input names a real mashup, which is decoded to the merge layout first.
+
+Usage:
+    python benchmarks/bench_encoder_profiles.py [--input mashup.mp3]
+        [--seconds SEC] [--repeats N] [--profiles mp3,opus-96]
+        [--output results.json]
+"""
+
+import time
+import argparse
+import subprocess
+
+from common import write_results
+from bench_parallel_encode import make_pcm
+from encoder_profiles import PROFILES
+from ffmpeg_merge import CHANNELS, ENCODERS, FFMPEG_BINARY, SAMPLE_RATE
+
+
+def load_pcm(path):
+    cmd = [
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", path, "-vn",
+        "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "pipe:1",
+    ]
+    return subprocess.run(cmd, capture_output=True, check=True).stdout
+
+
+def encode(pcm, name):
+    cmd = [
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin", "-threads", "1",
+        "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "-i", "pipe:0",
+    ] + ENCODERS[name] + ["pipe:1"]
+    start = time.perf_counter()
+    result = subprocess.run(cmd, input=pcm, capture_output=True, check=True)
+    return time.perf_counter() - start, len(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", help="Reference mashup (any format ffmpeg reads)")
+    parser.add_argument("--seconds", type=int, default=100, help="Length of the synthetic reference")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="Comma-separated profile names")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    if args.input:
+        pcm = load_pcm(args.input)
+    else:
+        pcm = make_pcm(args.seconds, 5)[0].tobytes()
+    duration = len(pcm) / (SAMPLE_RATE * CHANNELS * 2)
+
+    results = []
+    for name in args.profiles.split(","):
+        profile = PROFILES[name]
+        runs = [encode(pcm, name) for _ in range(args.repeats)]
+        seconds = min(run[0] for run in runs)
+        size = runs[0][1]
+        results.append({
+            "profile": name,
+            "extension": profile.extension,
+            "encode_seconds": round(seconds, 3),
+            "speed": round(duration / seconds, 1),
+            "declared_speed": profile.speed,
+            "bytes": size,
+            "kbps": round(size * 8 / duration / 1000, 1),
+            "declared_kbps": profile.bitrate_kbps,
+        })
+
+    config = {k: v for k, v in vars(args).items() if k != "output"}
+    config["reference_seconds"] = round(duration, 2)
+    write_results({"config": config, "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark: highlight selection cost against full-quality decoding.
+
+For each track, times the 8 kHz mono preview decode and the NumPy
+energy/onset scoring `highlight.find_highlight` runs, against decoding the
+same scan range at full quality (what picking a window from a full-rate
+decode would cost) and against the full-quality decode of just the chosen
+window. The synthetic tracks have a quiet intro of <Intro> seconds before
+the loud, beat-heavy part, so the chosen start should land past it. Needs
+ffmpeg and NumPy.
+
+Usage:
+    python benchmarks/bench_highlight.py [--media DIR] [--tracks N] [--intro SEC]
+        [--duration SEC] [--scan SEC] [--repeat N] [--output results.json]
+"""
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from common import write_results
+from fake_youtube import find_media
+from ffmpeg_merge import CHANNELS, FFMPEG_BINARY, SAMPLE_RATE
+from clip_pipeline import decode_clip
+import highlight
+
+
+def make_tracks(directory, count, intro, seconds=180):
+    """Generate AAC tracks: `intro` seconds of quiet noise, then a loud pulsing tone."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"intro_{i + 1}.m4a")
+        beat = f"0.6*sin(2*PI*{220 * (i + 1)}*t)*(0.4+0.6*lt(mod(t\\,0.5)\\,0.15))"
+        subprocess.run([
+            FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "lavfi", "-i", f"anoisesrc=color=brown:amplitude=0.02:sample_rate=44100:duration={intro}",
+            "-f", "lavfi", "-i", f"aevalsrc={beat}:s=44100:d={seconds - intro}",
+            "-filter_complex", "[0:a][1:a]concat=n=2:v=0:a=1,aformat=channel_layouts=stereo",
+            "-c:a", "aac", "-b:a", "128k", path,
+        ], check=True)
+        paths.append(path)
+    return paths
+
+
+def full_rate_decode(path, seconds):
+    """Decode `seconds` of `path` at the merge layout (44.1 kHz stereo)."""
+    cmd = [
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin", "-t", f"{seconds:.3f}", "-i", path,
+        "-vn", "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "pipe:1",
+    ]
+    return subprocess.run(cmd, capture_output=True, check=True).stdout
+
+
+def timed(fn, repeat):
+    """Median milliseconds of `fn()` over `repeat` runs, and its last result."""
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--media", help="Directory of audio files (default: synthetic tracks with an intro)")
+    parser.add_argument("--tracks", type=int, default=4)
+    parser.add_argument("--intro", type=int, default=25, help="Quiet intro length of the synthetic tracks")
+    parser.add_argument("--duration", type=int, default=20, help="Clip seconds to select")
+    parser.add_argument("--scan", type=int, help="Seconds scanned per track (default: duration + HIGHLIGHT_SCAN_SECONDS)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    args.scan = args.scan or int(highlight.scan_seconds_for(args.duration))
+    scratch = tempfile.mkdtemp(prefix="bench_highlight_")
+    try:
+        media = find_media(args.media) if args.media else make_tracks(scratch, args.tracks, args.intro)
+        tracks = []
+        for path in media:
+            preview_ms, pcm = timed(lambda: highlight.decode_preview(path, args.scan), args.repeat)
+            analysis_ms, start = timed(
+                lambda: highlight.best_window(highlight.frame_scores(pcm), args.duration), args.repeat
+            )
+            full_ms, _ = timed(lambda: full_rate_decode(path, args.scan), args.repeat)
+            window_ms, _ = timed(lambda: decode_clip(path, args.duration, start), args.repeat)
+            tracks.append({
+                "track": os.path.basename(path),
+                "start_seconds": start,
+                "preview_decode_ms": round(preview_ms, 1),
+                "analysis_ms": round(analysis_ms, 2),
+                "full_rate_scan_decode_ms": round(full_ms, 1),
+                "window_decode_ms": round(window_ms, 1),
+            })
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    def median(field):
+        return round(statistics.median(t[field] for t in tracks), 2)
+
+    select_ms = median("preview_decode_ms") + median("analysis_ms")
+    write_results({
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "tracks": tracks,
+        "median_select_ms": round(select_ms, 1),
+        "analysis_share_of_window_decode": round(median("analysis_ms") / median("window_decode_ms"), 3),
+        "select_vs_full_rate_scan": round(select_ms / median("full_rate_scan_decode_ms"), 3),
+        "past_intro": None if args.media else all(t["start_seconds"] >= args.intro - 1 for t in tracks),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: NumPy mixing engine vs pydub crossfades and gain.
+
+Builds <Clips> synthetic stereo clips of <Seconds> each at levels spread
+over ~30 dB and mixes them two ways: pydub, normalising each clip with
+`apply_gain` and joining with `append(crossfade=...)` (every join copies
+the whole mix so far), and `mixer.mix_clips` (normalisation, crossfades
+and limiter in one pass over a preallocated buffer). Decoding is left out
+of both. Reports time per clip count and the spread of clip loudness in
+the output.
+
+Usage:
+    python benchmarks/bench_mixer.py [--clips 5,10,20,40] [--seconds SEC]
+        [--crossfade-ms MS] [--output results.json]
+"""
+
+import time
+import argparse
+
+import numpy as np
+from pydub import AudioSegment
+
+from common import write_results
+import mixer
+
+
+def make_clips(count, seconds, seed=1):
+    rng = np.random.default_rng(seed)
+    frames = mixer.SAMPLE_RATE * seconds
+    levels = np.linspace(0.02, 0.6, count)
+    rng.shuffle(levels)
+    return [(rng.standard_normal((frames, mixer.CHANNELS)) * level).clip(-1, 1).astype(np.float32) for level in levels]
+
+
+def pydub_mix(clips, crossfade_ms):
+    combined = None
+    for clip in clips:
+        segment = AudioSegment(
+            data=np.round(clip * 32767).astype(np.int16).tobytes(),
+            sample_width=2, frame_rate=mixer.SAMPLE_RATE, channels=mixer.CHANNELS,
+        )
+        segment = segment.apply_gain(mixer.MIX_TARGET_DBFS - segment.dBFS)
+        combined = segment if combined is None else combined.append(segment, crossfade=crossfade_ms)
+    return combined
+
+
+def clip_levels(pcm, clip_frames, fade_frames, count):
+    """RMS dBFS of the un-faded middle of each clip in an int16 mix."""
+    samples = pcm.astype(np.float64) / 32767
+    levels = []
+    for i in range(count):
+        start = i * (clip_frames - fade_frames) + fade_frames
+        middle = samples[start:start + clip_frames - 2 * fade_frames]
+        levels.append(20 * np.log10(np.sqrt(np.mean(middle ** 2)) + 1e-12))
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clips", default="5,10,20,40", help="Comma-separated clip counts")
+    parser.add_argument("--seconds", type=int, default=20)
+    parser.add_argument("--crossfade-ms", type=int, default=mixer.MIX_CROSSFADE_MS)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    clip_frames = mixer.SAMPLE_RATE * args.seconds
+    fade_frames = mixer.SAMPLE_RATE * args.crossfade_ms // 1000
+    results = []
+    for count in [int(c) for c in args.clips.split(",")]:
+        clips = make_clips(count, args.seconds)
+
+        start = time.perf_counter()
+        mixed = mixer.mix_clips(clips, args.crossfade_ms)
+        numpy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        combined = pydub_mix(clips, args.crossfade_ms)
+        pydub_seconds = time.perf_counter() - start
+
+        reference = np.frombuffer(combined.raw_data, dtype=np.int16).reshape(-1, mixer.CHANNELS)
+        levels = clip_levels(mixed, clip_frames, fade_frames, count)
+        results.append({
+            "clips": count,
+            "output_seconds": round(len(mixed) / mixer.SAMPLE_RATE, 2),
+            "numpy_seconds": round(numpy_seconds, 3),
+            "pydub_seconds": round(pydub_seconds, 3),
+            "speedup": round(pydub_seconds / numpy_seconds, 1),
+            "numpy_ms_per_output_second": round(numpy_seconds * 1000 / (len(mixed) / mixer.SAMPLE_RATE), 3),
+            "input_level_spread_db": round(20 * np.log10(0.6 / 0.02), 2),
+            "numpy_level_spread_db": round(max(levels) - min(levels), 2),
+            "numpy_peak_dbfs": round(20 * np.log10(np.abs(mixed).max() / 32767), 2),
+            "pydub_peak_dbfs": round(20 * np.log10(np.abs(reference).max() / 32767), 2),
+        })
+
+    write_results({"config": {k: v for k, v in vars(args).items() if k != "output"}, "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
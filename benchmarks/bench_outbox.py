@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: outbox delivery vs one SMTP connection per message.
+
+Starts a local aiosmtpd server, then sends N messages (each with an
+attachment of the given size) first with a fresh connection per message,
+as `send_email` does, and then through the outbox's reused connection.
+Requires `pip install aiosmtpd`.
+
+Usage:
+    python benchmarks/bench_outbox.py [<NumMessages>] [<AttachmentKB>]
+"""
+
+import os
+import sys
+import time
+import shutil
+import smtplib
+import tempfile
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+
+from common import write_results
+from outbox import Outbox
+
+from aiosmtpd.controller import Controller  # type: ignore
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+def make_message(index, payload):
+    msg = MIMEMultipart()
+    msg["From"] = "bench@localhost"
+    msg["To"] = f"user{index}@localhost"
+    msg["Subject"] = f"Mashup {index}"
+    msg.attach(MIMEApplication(payload, Name="mashup.zip"))
+    return msg
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    size_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+    payload = os.urandom(size_kb * 1024)
+    messages = [make_message(i, payload) for i in range(count)]
+
+    handler = CountingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=8025)
+    controller.start()
+    outbox_dir = tempfile.mkdtemp(prefix="bench_outbox_")
+    try:
+        start = time.perf_counter()
+        for msg in messages:
+            with smtplib.SMTP("127.0.0.1", 8025) as server:
+                server.sendmail(msg["From"], [msg["To"]], msg.as_string())
+        per_connection = time.perf_counter() - start
+
+        outbox = Outbox(directory=outbox_dir, host="127.0.0.1", port=8025, use_ssl=False)
+        start = time.perf_counter()
+        ids = [outbox.enqueue(msg) for msg in messages]
+        enqueue_seconds = time.perf_counter() - start
+        outbox.start()
+        outbox.flush(timeout=300)
+        outbox_seconds = time.perf_counter() - start
+        outbox.stop()
+        sent = sum(1 for msg_id in ids if (outbox.status(msg_id) or {}).get("status") == "sent")
+    finally:
+        controller.stop()
+        shutil.rmtree(outbox_dir, ignore_errors=True)
+
+    write_results({
+        "messages": count,
+        "attachment_kb": size_kb,
+        "per_connection": {"seconds": round(per_connection, 3), "msgs_per_sec": round(count / per_connection, 1)},
+        "outbox": {
+            "enqueue_seconds": round(enqueue_seconds, 3),
+            "seconds": round(outbox_seconds, 3),
+            "msgs_per_sec": round(count / outbox_seconds, 1),
+            "delivered": sent,
+        },
+        "server_received": handler.received,
+    })
+
+
+if __name__ == "__main__":
+    main()
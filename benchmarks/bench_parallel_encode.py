@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark: parallel segment MP3 encoding vs a single ffmpeg encode.
+
+Synthesises <Seconds> of stereo audio made of <Clips> tonal clips and
+encodes it once in a single ffmpeg pass and once per worker count with
+`parallel_encode.encode` (cuts at the clip joins). Each output is decoded
+back with ffmpeg; reports encode time, speedup over the single pass, the
+available core count (speedup is bounded by it), whether the decoded length
+matches the source exactly, and the SNR against the source.
+
+Usage:
+    python benchmarks/bench_parallel_encode.py [--seconds SEC] [--clips N]
+        [--workers 1,2,4] [--output results.json]
+"""
+
+import io
+import os
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from common import write_results
+import parallel_encode
+from ffmpeg_merge import CHANNELS, ENCODERS, FFMPEG_BINARY, SAMPLE_RATE
+
+
+def make_pcm(seconds, clips, seed=1):
+    """Clips of chords with a beat envelope and some noise, as int16 frames x channels."""
+    rng = np.random.default_rng(seed)
+    clip_frames = SAMPLE_RATE * seconds // clips
+    t = np.arange(clip_frames) / SAMPLE_RATE
+    parts = []
+    for _ in range(clips):
+        tone = sum(np.sin(2 * np.pi * f * t + rng.uniform(0, 6)) for f in rng.uniform(110, 880, 3)) / 3
+        beat = 0.6 + 0.4 * np.abs(np.sin(np.pi * t * rng.uniform(1.5, 2.5)))
+        left = tone * beat + rng.standard_normal(clip_frames) * 0.02
+        right = np.roll(left, 40)
+        parts.append(np.stack([left, right], axis=1) * 0.5)
+    return np.round(np.concatenate(parts) * 32767).astype(np.int16), clip_frames
+
+
+def decode(path):
+    cmd = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", path, "-f", "s16le", "pipe:1"]
+    data = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(data, dtype="<i2").reshape(-1, CHANNELS)
+
+
+def snr_db(source, decoded):
+    length = min(len(source), len(decoded))
+    signal = source[:length].astype(np.float64)
+    noise = signal - decoded[:length]
+    return 10 * np.log10(np.sum(signal ** 2) / max(np.sum(noise ** 2), 1e-9))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, default=300)
+    parser.add_argument("--clips", type=int, default=10)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated encoder process counts")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    source, clip_frames = make_pcm(args.seconds, args.clips)
+    pcm = source.tobytes()
+    joins = [clip_frames * i for i in range(1, args.clips)]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        single = os.path.join(tmp, "single.mp3")
+        cmd = [
+            FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+            "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "-i", "pipe:0",
+        ] + ENCODERS["mp3"] + [single]
+        start = time.perf_counter()
+        subprocess.run(cmd, input=pcm, check=True)
+        single_seconds = time.perf_counter() - start
+        decoded = decode(single)
+        results.append({
+            "mode": "single",
+            "seconds": round(single_seconds, 3),
+            "bytes": os.path.getsize(single),
+            "exact_length": len(decoded) == len(source),
+            "snr_db": round(snr_db(source, decoded), 2),
+        })
+
+        for workers in [int(w) for w in args.workers.split(",")]:
+            path = os.path.join(tmp, f"parallel-{workers}.mp3")
+            start = time.perf_counter()
+            buffer = io.BytesIO()
+            parallel_encode.encode(pcm, buffer, boundaries=joins, workers=workers)
+            seconds = time.perf_counter() - start
+            with open(path, "wb") as fh:
+                fh.write(buffer.getvalue())
+            decoded = decode(path)
+            results.append({
+                "mode": "segments",
+                "workers": workers,
+                "segments": len(parallel_encode.plan_segments(len(source), workers, joins)),
+                "seconds": round(seconds, 3),
+                "speedup": round(single_seconds / seconds, 2),
+                "bytes": len(buffer.getvalue()),
+                "exact_length": len(decoded) == len(source),
+                "snr_db": round(snr_db(source, decoded), 2),
+            })
+
+    config = {k: v for k, v in vars(args).items() if k != "output"}
+    config["available_cores"] = parallel_encode.available_workers()
+    write_results({"config": config, "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
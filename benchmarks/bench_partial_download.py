@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark: partial-range download vs full download.
+
+Downloads each URL twice through the CLI's `download_audio` (full track,
+then only the clip window) and reports bytes fetched, file size and time.
+In the native download format the clip must be a stream copy of the
+track: the benchmark compares the two files' audio packets and codec
+parameters and exits with status 1 if the clip was re-encoded. With
+--media the URLs come from `fake_youtube.FakeYouTube` serving that
+directory (offline; bytes are the simulated transfer); otherwise it
+needs network access. Requires ffmpeg.
+
+Usage:
+    python benchmarks/bench_partial_download.py <ClipSeconds> <URL> [<URL> ...]
+        [--format native|mp3] [--output results.json]
+    python benchmarks/bench_partial_download.py <ClipSeconds> --media DIR [--tracks N]
+"""
+
+import os
+import re
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from common import load_cli, write_results
+from clip_cache import ClipCache
+from ffmpeg_merge import FFMPEG_BINARY
+import ydl_pool
+
+
+def _count_bytes():
+    """Wrap yt_dlp.YoutubeDL so every download adds its transferred bytes to the returned counter."""
+    counter = {"bytes": 0}
+    base = ydl_pool.load_yt_dlp().YoutubeDL
+
+    def hook(d):
+        if d.get("status") == "finished":
+            counter["bytes"] += d.get("downloaded_bytes") or d.get("total_bytes") or 0
+
+    class CountingYoutubeDL(base):  # type: ignore
+        def __init__(self, params=None, *args, **kwargs):
+            params = dict(params or {})
+            params["progress_hooks"] = list(params.get("progress_hooks", [])) + [hook]
+            super().__init__(params, *args, **kwargs)
+
+    ydl_pool.yt_dlp.YoutubeDL = CountingYoutubeDL
+    return counter
+
+
+def stream_info(path):
+    """Codec, sample rate, channels and bitrate of the first audio stream, from `ffmpeg -i`."""
+    proc = subprocess.run([FFMPEG_BINARY, "-hide_banner", "-i", path], capture_output=True, text=True)
+    match = re.search(r"Audio: (\w+).*?, (\d+) Hz, ([^,]+), [^,\s]+(?:, (\d+) kb/s)?", proc.stderr)
+    if not match:
+        return None
+    codec, rate, channels, kbps = match.groups()
+    return {"codec": codec, "sample_rate": int(rate), "channels": channels, "kbps": int(kbps) if kbps else None}
+
+
+def packet_hashes(path):
+    """MD5 of every audio packet in `path`, in order."""
+    cmd = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-i", path, "-map", "0:a:0", "-c", "copy",
+           "-f", "framemd5", "-"]
+    lines = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout.splitlines()
+    return [line.rsplit(",", 1)[-1].strip() for line in lines if line and not line.startswith("#")]
+
+
+def stream_copied(clip, track):
+    """Whether `clip`'s audio is `track`'s packets, unchanged, with the same codec parameters."""
+    packets, source = packet_hashes(clip), set(packet_hashes(track))
+    return bool(packets) and all(p in source for p in packets) and stream_info(clip) == stream_info(track)
+
+
+def run_once(cli, counter, url, clip_seconds, audio_format, workdir):
+    os.makedirs(workdir)
+    before = counter["bytes"]
+    start = time.perf_counter()
+    path = cli.download_audio(url, 1, clip_seconds=clip_seconds, audio_format=audio_format, temp_dir=workdir)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path) if path else 0
+    result = {"ok": bool(path), "seconds": round(elapsed, 3), "bytes_fetched": counter["bytes"] - before,
+              "file_bytes": size}
+    return result, path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("clip_seconds", type=float)
+    parser.add_argument("urls", nargs="*")
+    parser.add_argument("--media", help="Serve this directory of audio files with the fake YouTube backend")
+    parser.add_argument("--tracks", type=int, default=2, help="Fake videos to download with --media")
+    parser.add_argument("--format", default="native", choices=("native", "mp3"))
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    if not args.urls and not args.media:
+        parser.error("give URLs or --media")
+
+    cli = load_cli()
+    cli.CLIP_CACHE = ClipCache(max_bytes=0)  # Disabled: every run must reach the network
+    urls = args.urls
+    if args.media:
+        from fake_youtube import FakeYouTube, find_media
+
+        backend = FakeYouTube(find_media(args.media), latency=0.0, search_latency=0.0, bandwidth_kbps=1e6)
+        backend.install(ydl_pool)
+        urls = urls or [backend.video_url(i) for i in range(args.tracks)]
+        counter = backend.stats  # Simulated transfer bytes
+    else:
+        counter = _count_bytes()
+
+    results = []
+    failed = False
+    for url in urls:
+        workdir = tempfile.mkdtemp(prefix="bench_partial_")
+        try:
+            full, full_path = run_once(cli, counter, url, None, args.format, os.path.join(workdir, "full"))
+            partial, partial_path = run_once(cli, counter, url, args.clip_seconds, args.format,
+                                             os.path.join(workdir, "partial"))
+            record = {"url": url, "full": full, "partial": partial}
+            record["bytes_saved_ratio"] = (
+                1 - partial["bytes_fetched"] / full["bytes_fetched"] if full["bytes_fetched"] else None
+            )
+            if full_path and partial_path:
+                record["full"]["stream"] = stream_info(full_path)
+                record["partial"]["stream"] = stream_info(partial_path)
+                if args.format == "native":
+                    record["stream_copied"] = stream_copied(partial_path, full_path)
+                    failed = failed or not record["stream_copied"]
+            results.append(record)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    write_results({"clip_seconds": args.clip_seconds, "format": args.format, "tracks": results}, args.output)
+    if failed:
+        sys.exit("Native partial downloads were re-encoded instead of stream-copied")
+
+
+if __name__ == "__main__":
+    main()
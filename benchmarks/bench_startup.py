@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: entry-point startup cost against a time budget.
+
+Runs each entry point's fast path in a fresh interpreter under
+`python -X importtime`: the CLI rejecting bad arguments (it should fail
+before yt-dlp or pydub load) and the web app module being imported the
+way Streamlit does before the first paint (Streamlit itself is timed
+separately, as the server imports it once). Reports median wall time and
+import time, which heavy dependencies were loaded, and whether each path
+fits its budget; exits 1 when one does not.
+
+Usage:
+    python benchmarks/bench_startup.py [--samples N] [--cli-budget-ms MS]
+        [--app-budget-ms MS] [--output results.json]
+"""
+
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+from common import ROOT, write_results
+
+# Dependencies the fast paths must not pay for
+HEAVY_MODULES = ("yt_dlp", "pydub", "numpy", "http.server")
+
+
+def parse_importtime(stderr):
+    """Map each top-level import in -X importtime output to (cumulative µs, modules it loaded)."""
+    top, pending = {}, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # Header line
+        pending.add(name.strip())
+        if not name[1:].startswith(" "):  # Children are listed (indented) before their parent
+            top[name.strip()] = (int(cumulative), pending)
+            pending = set()
+    return top
+
+
+def run(argv, samples, skip=("site",)):
+    """Median wall ms, median import ms and modules loaded, ignoring the top-level imports in `skip`."""
+    walls, import_us, loaded = [], [], set()
+    for _ in range(samples):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime"] + argv, cwd=ROOT, capture_output=True, text=True)
+        walls.append(time.perf_counter() - start)
+        top = {name: entry for name, entry in parse_importtime(proc.stderr).items() if name not in skip}
+        import_us.append(sum(cumulative for cumulative, _ in top.values()))
+        loaded = set().union(*(modules for _, modules in top.values()))
+    return statistics.median(walls) * 1000, statistics.median(import_us) / 1000, loaded
+
+
+def summarize(wall_ms, import_ms, loaded, budget_ms, measured_ms):
+    return {
+        "wall_ms": round(wall_ms, 1),
+        "imports_ms": round(import_ms, 1),
+        "heavy_modules_loaded": [m for m in HEAVY_MODULES if m in loaded],
+        "budget_ms": budget_ms,
+        "within_budget": measured_ms <= budget_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--cli-budget-ms", type=float, default=250.0,
+                        help="Wall-time budget for the CLI to report an argument error")
+    parser.add_argument("--app-budget-ms", type=float, default=150.0,
+                        help="Import-time budget for app.py before the first paint (excluding Streamlit)")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    interpreter_ms, _, _ = run(["-c", "pass"], args.samples)
+    results = {"interpreter_ms": round(interpreter_ms, 1)}
+
+    for name, argv in (
+        ("cli_missing_args", ["102303235.py"]),
+        ("cli_bad_output", ["102303235.py", "Singer", "5", "20", "out.wav"]),
+    ):
+        wall_ms, import_ms, loaded = run(argv, args.samples)
+        results[name] = summarize(wall_ms, import_ms, loaded, args.cli_budget_ms, wall_ms)
+
+    # Streamlit (and what it pulls in, numpy included) is loaded once per server, not per page
+    _, streamlit_ms, _ = run(["-c", "import streamlit"], args.samples)
+    wall_ms, app_ms, loaded = run(["-c", "import streamlit; import app"], args.samples, skip=("site", "streamlit"))
+    results["app_first_paint"] = dict(
+        summarize(wall_ms, app_ms, loaded, args.app_budget_ms, app_ms), streamlit_ms=round(streamlit_ms, 1)
+    )
+
+    write_results(results, args.output)
+    if not all(r["within_budget"] for r in results.values() if isinstance(r, dict)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: pooled YoutubeDL sessions vs a new YoutubeDL per download.
+
+Downloads local audio files through yt-dlp's generic extractor (file://
+URLs, so no network is needed), first building a fresh YoutubeDL for every
+call as `download_audio` used to, then leasing sessions from
+`ydl_pool.SessionPool`. A generated cookies.txt with <Cookies> entries is
+passed to both, like YT_COOKIES_FILE. Reports the per-download overhead
+saved.
+
+Usage:
+    python benchmarks/bench_ydl_pool.py <MediaFile> [<Downloads>] [<Cookies>]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import statistics
+
+from common import write_results
+from ydl_pool import SessionPool
+from strategy_scheduler import AttemptLog
+
+
+def write_cookies(path, count):
+    expires = int(time.time()) + 86400 * 365
+    with open(path, "w") as fh:
+        fh.write("# Netscape HTTP Cookie File\n")
+        for i in range(count):
+            fh.write(f".youtube.com\tTRUE\t/\tTRUE\t{expires}\tCOOKIE_{i}\t{'x' * 64}\n")
+
+
+def base_options(cookie_file):
+    return {
+        "format": "bestaudio/best",
+        "quiet": True,
+        "no_warnings": True,
+        "noprogress": True,
+        "ignoreerrors": True,
+        "enable_file_urls": True,
+        "cookiefile": cookie_file,
+        "extractor_args": {"youtube": {"player_client": ["ios"]}},
+    }
+
+
+def run(pool, url, out_dir, count, cookie_file):
+    timings = []
+    for i in range(count):
+        call_opts = {"outtmpl": os.path.join(out_dir, f"audio_{i}.%(ext)s"), "logger": AttemptLog()}
+        start = time.perf_counter()
+        with pool.lease("ios", base_options(cookie_file), **call_opts) as ydl:
+            ydl.extract_info(url, download=True)
+        timings.append(time.perf_counter() - start)
+        if not any(f.startswith(f"audio_{i}.") for f in os.listdir(out_dir)):
+            raise RuntimeError(f"download {i} produced no file")
+    return timings
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    media = os.path.abspath(sys.argv[1])
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    cookies = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    url = "file://" + media
+
+    scratch = tempfile.mkdtemp(prefix="bench_ydl_pool_")
+    try:
+        cookie_file = os.path.join(scratch, "cookies.txt")
+        write_cookies(cookie_file, cookies)
+        results = {}
+        for name, pool in (("per_call", SessionPool(enabled=False)), ("pooled", SessionPool(enabled=True))):
+            out_dir = os.path.join(scratch, name)
+            os.makedirs(out_dir)
+            timings = run(pool, url, out_dir, count, cookie_file)
+            pool.close()
+            results[name] = {
+                "mean_seconds": round(statistics.mean(timings), 4),
+                "median_seconds": round(statistics.median(timings), 4),
+                "first_seconds": round(timings[0], 4),
+                "total_seconds": round(sum(timings), 3),
+                "pool_stats": pool.stats if pool.enabled else None,
+            }
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    saved = results["per_call"]["median_seconds"] - results["pooled"]["median_seconds"]
+    write_results({
+        "media": os.path.basename(media),
+        "downloads": count,
+        "cookies": cookies,
+        "results": results,
+        "overhead_saved_per_download_seconds": round(saved, 4),
+    })
+
+
+if __name__ == "__main__":
+    main()
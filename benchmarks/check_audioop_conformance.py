@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Conformance check: audioop_numpy vs the C audioop implementation.
+
+Runs every function exported by `audioop_numpy` over random, silent,
+full-scale and step-shaped fragments of all sample widths (plus invalid
+arguments) and compares results and raised errors with `audioop`
+(stdlib on Python < 3.13, audioop-lts otherwise). Exits non-zero on any
+mismatch.
+
+Usage:
+    python benchmarks/check_audioop_conformance.py
+"""
+
+import os
+import sys
+import math
+
+from common import write_results
+
+import audioop  # type: ignore  # C implementation (stdlib or audioop-lts)
+import audioop_numpy
+
+SIZES = (0, 1, 2, 3, 7, 64, 1001)
+RATES = ((44100, 48000), (48000, 44100), (8000, 44100), (44100, 8000), (3, 7), (22050, 44100), (1, 1))
+
+
+def fragments(n, width):
+    """Yield test fragments of `n` samples."""
+    yield os.urandom(n * width)
+    yield bytes(n * width)
+    yield b"\x7f" * (n * width)
+    yield b"\x80" * (n * width)
+    # Stepped wave with repeated samples (exercises avgpp/maxpp/cross)
+    step = 1 if width == 1 else 1000
+    values = [((i // 3) % 7 - 3) * step for i in range(n)]
+    mask = (1 << (8 * width)) - 1
+    yield b"".join((v & mask).to_bytes(width, sys.byteorder) for v in values)
+
+
+def same(a, b):
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    if isinstance(a, tuple) and isinstance(b, tuple) and len(a) == len(b):
+        return all(same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+class Checker:
+    def __init__(self):
+        self.calls = 0
+        self.failures = []
+
+    def check(self, name, *args):
+        self.calls += 1
+        outcomes = []
+        for module in (audioop, audioop_numpy):
+            try:
+                outcomes.append(("ok", getattr(module, name)(*args)))
+            except Exception as exc:
+                outcomes.append(("error", type(exc).__name__))
+        (kind_c, c), (kind_np, np_) = outcomes
+        # Error classes differ by module, so only compare that both raised
+        if kind_c != kind_np or (kind_c == "ok" and not same(c, np_)):
+            shown = [len(a) if isinstance(a, (bytes, bytearray)) else a for a in args]
+            self.failures.append({"function": name, "args": repr(shown), "c": repr(c)[:80], "numpy": repr(np_)[:80]})
+
+
+def main():
+    ck = Checker()
+    for width in (1, 2, 3, 4):
+        for n in SIZES:
+            for frag in fragments(n, width):
+                other = os.urandom(len(frag))
+                ck.check("add", frag, other, width)
+                for factor in (0, 0.5, 1.0, 1.7, -1.3, -2.0, 3e9):
+                    ck.check("mul", frag, width, factor)
+                for name in ("reverse", "max", "minmax", "avg", "rms", "avgpp", "maxpp", "cross", "byteswap"):
+                    ck.check(name, frag, width)
+                for lf, rf in ((0.5, 0.5), (1, 1), (1.5, -0.7), (0, 2)):
+                    ck.check("tomono", frag, width, lf, rf)
+                    ck.check("tostereo", frag, width, lf, rf)
+                for newwidth in (1, 2, 3, 4, 5):
+                    ck.check("lin2lin", frag, width, newwidth)
+                for value in (0, 1, -1, 300, -70000, 2 ** 31 - 1, -2 ** 31):
+                    ck.check("bias", frag, width, value)
+                for index in (-1, 0, n - 1, n):
+                    ck.check("getsample", frag, width, index)
+                for channels in (1, 2):
+                    if n % channels:
+                        continue
+                    for inrate, outrate in RATES:
+                        for weights in ((1, 0), (3, 2)):
+                            ck.check("ratecv", frag, width, channels, inrate, outrate, None, *weights)
+                            _, state = audioop.ratecv(other, width, channels, inrate, outrate, None, *weights)
+                            ck.check("ratecv", frag, width, channels, inrate, outrate, state, *weights)
+        ck.check("add", b"\x00" * width * 2, b"\x00" * width * 4, width)
+
+    for n in (0, 1, 2, 10, 500):
+        for frag in fragments(n, 2):
+            for ref in fragments(n, 2):
+                ck.check("findfactor", frag, ref)
+            for length in (0, 1, n // 3, n, n + 1):
+                ck.check("findmax", frag, length)
+                for ref in fragments(length, 2):
+                    ck.check("findfit", frag, ref)
+
+    # Invalid arguments
+    ck.check("mul", b"\x00" * 3, 2, 1.0)
+    ck.check("add", b"a", b"a", 5)
+    ck.check("findfactor", b"\x00" * 3, b"\x00" * 3)
+    ck.check("findfit", b"\x00" * 4, b"\x00" * 6)
+    ck.check("ratecv", b"\x00" * 4, 2, 1, 0, 8000, None)
+    ck.check("ratecv", b"\x00" * 4, 2, 1, 8000, 8000, None, 0, 0)
+
+    write_results({"calls": ck.calls, "failures": ck.failures[:50], "failure_count": len(ck.failures)})
+    sys.exit(1 if ck.failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Shared helpers for the benchmark scripts.
+"""
+
+import os
+import sys
+import json
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def load_cli():
+    """Import `102303235.py` (not importable by name) as a module."""
+    spec = importlib.util.spec_from_file_location("mashup_cli", os.path.join(ROOT, "102303235.py"))
+    module = importlib.util.module_from_spec(spec)  # type: ignore
+    spec.loader.exec_module(module)  # type: ignore
+    return module
+
+
+def write_results(results, path=None):
+    """Print results as JSON and optionally save them to `path`."""
+    text = json.dumps(results, indent=2)
+    print(text)
+    if path:
+        with open(path, "w") as fh:
+            fh.write(text + "\n")
@@ -0,0 +1,285 @@
+"""
+Offline stand-in for the parts of yt-dlp the mashup pipeline uses.
+
+`FakeYouTube` serves local media files as search results and downloads,
+with configurable latency, bandwidth and failure/bot-detection rates, so
+the pipeline can be measured without touching YouTube. Extraction and
+transfer are separate steps, as in yt-dlp: `extract_info(download=False,
+process=False)` resolves a video and `process_ie_result()` downloads it,
+resuming the `.part` file an interrupted transfer left behind. Install it with
+`backend.install(ydl_pool)`, which swaps the module's `yt_dlp` global.
+"""
+
+import os
+import re
+import zlib
+import time
+import random
+import threading
+import subprocess
+from typing import Any, Dict, Iterable, List, Optional
+
+from yt_dlp.utils import DownloadError  # type: ignore
+from ffmpeg_merge import FFMPEG_BINARY
+
+MEDIA_EXTENSIONS = (".m4a", ".mp3", ".webm", ".opus", ".ogg", ".wav")
+
+BOT_ERROR = "Sign in to confirm you're not a bot. This helps protect our community."
+HTTP_ERROR = "HTTP Error 403: Forbidden"
+TRANSFER_ERROR = "unable to download video data: [Errno 104] Connection reset by peer"
+STREAM_URL_TTL = 6 * 3600  # Signed googlevideo URLs are valid for about six hours
+
+
+def find_media(directory: str) -> List[str]:
+    """Return the audio files in `directory`, sorted by name."""
+    return sorted(
+        os.path.join(directory, fname)
+        for fname in os.listdir(directory)
+        if fname.lower().endswith(MEDIA_EXTENSIONS)
+    )
+
+
+def make_media(directory: str, count: int = 4, seconds: int = 180) -> List[str]:
+    """Generate `count` synthetic AAC tracks (tone + noise) in `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"track_{i + 1}.m4a")
+        subprocess.run([
+            FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "lavfi", "-i", f"sine=frequency={220 * (i + 1)}:sample_rate=44100:duration={seconds}",
+            "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.1:sample_rate=44100:duration={seconds}",
+            "-filter_complex", "amix=inputs=2,aformat=channel_layouts=stereo",
+            "-c:a", "aac", "-b:a", "128k", path,
+        ], check=True)
+        paths.append(path)
+    return paths
+
+
+class FakeYouTube:
+    """Simulated YouTube: search results and downloads backed by local files."""
+
+    def __init__(
+        self,
+        media: List[str],
+        latency: float = 0.3,
+        search_latency: float = 1.0,
+        bandwidth_kbps: float = 4000.0,
+        failure_rate: float = 0.0,
+        bot_rate: float = 0.0,
+        transfer_failure_rate: float = 0.0,
+        stall_rate: float = 0.0,
+        stall_seconds: float = 30.0,
+        blocked_clients: Iterable[str] = (),
+        seed: Optional[int] = None,
+    ):
+        if not media:
+            raise ValueError("FakeYouTube needs at least one media file")
+        self.media = media
+        self.latency = latency
+        self.search_latency = search_latency
+        self.bandwidth = bandwidth_kbps * 1000 / 8  # Bytes per second
+        self.failure_rate = failure_rate
+        self.bot_rate = bot_rate
+        self.transfer_failure_rate = transfer_failure_rate  # Transfers cut off part-way
+        self.stall_rate = stall_rate  # Transfers that hang for `stall_seconds` before finishing
+        self.stall_seconds = stall_seconds
+        self.blocked_clients = set(blocked_clients)  # Player clients that always hit bot detection
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._durations: Dict[str, float] = {}
+        self.stats = {"searches": 0, "extractions": 0, "downloads": 0, "bot_blocks": 0, "failures": 0,
+                      "transfer_failures": 0, "stalls": 0, "cancelled": 0, "resumed_bytes": 0, "bytes": 0}
+
+    # Module interface
+
+    def YoutubeDL(self, params: Optional[Dict[str, Any]] = None) -> "FakeYoutubeDL":  # noqa: N802
+        return FakeYoutubeDL(self, params or {})
+
+    def install(self, module):
+        """Point `module.yt_dlp` at this backend; returns the original for restoring."""
+        original = module.yt_dlp
+        module.yt_dlp = self
+        return original
+
+    # Catalogue
+
+    def video_url(self, index: int) -> str:
+        return f"https://www.youtube.com/watch?v=fake{index:07d}"
+
+    def source_for(self, url: str) -> str:
+        video = url.rsplit("=", 1)[-1]
+        if not video.startswith("fake"):
+            raise DownloadError(f"ERROR: [youtube] Unsupported URL: {url}")
+        return self.media[int(video[4:]) % len(self.media)]
+
+    def duration(self, path: str) -> float:
+        if path not in self._durations:
+            # Read the container header via `ffmpeg -i` (ffprobe is not always installed)
+            proc = subprocess.run([FFMPEG_BINARY, "-hide_banner", "-i", path], capture_output=True, text=True)
+            match = re.search(r"Duration: (\d+):(\d+):([\d.]+)", proc.stderr)
+            if not match:
+                raise ValueError(f"Cannot read the duration of {path}")
+            hours, minutes, seconds = match.groups()
+            self._durations[path] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        return self._durations[path]
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _roll(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+
+class FakeYoutubeDL:
+    """Context-manager stand-in for `yt_dlp.YoutubeDL`."""
+
+    def __init__(self, backend: FakeYouTube, params: Dict[str, Any]):
+        self.backend = backend
+        self.params = dict(params)
+        # yt-dlp normalizes the output template into a dict at construction
+        outtmpl = self.params.get("outtmpl", "%(title)s [%(id)s].%(ext)s")
+        self.params["outtmpl"] = outtmpl if isinstance(outtmpl, dict) else {"default": outtmpl}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        pass
+
+    def extract_info(self, url: str, download: bool = True, process: bool = True):
+        if url.startswith("ytsearch"):
+            return self._search(url)
+        info = self._reporting(self._extract, url)
+        if info is None or not (download and process):
+            return info
+        return self.process_ie_result(info, download=True)
+
+    def process_ie_result(self, info: Dict[str, Any], download: bool = True):
+        if not download:
+            return info
+        return self._reporting(self._download, info)
+
+    def _reporting(self, func, *args):
+        try:
+            return func(*args)
+        except DownloadError as exc:
+            if self.params.get("ignoreerrors"):
+                # yt-dlp reports the error to its logger and carries on
+                if self.params.get("logger"):
+                    self.params["logger"].error(str(exc))
+                return None
+            raise
+
+    def _transfer(self, seconds: float, out_path: str):
+        """Wait out a simulated transfer, calling progress hooks like yt-dlp's HTTP downloader."""
+        deadline = time.monotonic() + seconds
+        while True:
+            for hook in self.params.get("progress_hooks", []):
+                try:
+                    hook({"status": "downloading", "filename": out_path})
+                except Exception:
+                    self.backend._count("cancelled")
+                    raise
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(0.1, remaining))
+
+    def _search(self, query: str) -> Dict[str, Any]:
+        backend = self.backend
+        backend._count("searches")
+        time.sleep(backend.search_latency)
+        prefix, _, terms = query.partition(":")
+        count = int(prefix[len("ytsearch"):] or 1)
+        first = zlib.crc32(" ".join(terms.lower().split()).encode()) % 1000000  # Distinct videos per query
+        entries = [
+            {"id": f"fake{first + i:07d}", "url": backend.video_url(first + i), "title": f"{terms} #{i + 1}"}
+            for i in range(count)
+        ]
+        return {"_type": "playlist", "id": terms, "entries": entries}
+
+    def _extract(self, url: str) -> Dict[str, Any]:
+        backend = self.backend
+        backend._count("extractions")
+        source = backend.source_for(url)
+        time.sleep(backend.latency)
+
+        clients = self.params.get("extractor_args", {}).get("youtube", {}).get("player_client", [])
+        roll = backend._roll()
+        if roll < backend.bot_rate or (clients and set(clients) <= backend.blocked_clients):
+            backend._count("bot_blocks")
+            raise DownloadError(f"ERROR: [youtube] {url[-11:]}: {BOT_ERROR}")
+        if roll < backend.bot_rate + backend.failure_rate:
+            backend._count("failures")
+            raise DownloadError(f"ERROR: {HTTP_ERROR}")
+
+        duration = backend.duration(source)
+        ext = os.path.splitext(source)[1][1:]
+        expire = int(time.time()) + STREAM_URL_TTL
+        stream = f"https://rr1---sn-fake.googlevideo.com/videoplayback?expire={expire}&id={url[-11:]}"
+        return {
+            "_type": "video", "id": url[-11:], "webpage_url": url, "duration": duration, "ext": ext,
+            "formats": [{"format_id": "140", "url": stream, "ext": ext, "acodec": "mp4a.40.2", "vcodec": "none"}],
+        }
+
+    def _download(self, info: Dict[str, Any]) -> Dict[str, Any]:
+        backend = self.backend
+        source = backend.source_for(info["webpage_url"])
+        duration = info["duration"]
+        ext = info["ext"]
+        start, end = 0.0, duration
+        ranges = self.params.get("download_ranges")
+        if ranges:
+            section = next(iter(ranges(info, self)), None)
+            if section:
+                start = float(section.get("start_time") or 0.0)
+                end = min(duration, float(section.get("end_time") or duration))
+
+        transcode = any(pp.get("key") == "FFmpegExtractAudio" for pp in self.params.get("postprocessors", []))
+        out_ext = "mp3" if transcode else ext
+        out_path = self.params["outtmpl"]["default"].replace("%(ext)s", out_ext)
+
+        # Only the requested window crosses the (simulated) network
+        size = int(os.path.getsize(source) * (end - start) / duration) if duration else os.path.getsize(source)
+        # Whole-file transfers are plain HTTP and resume from the .part file; sections go through ffmpeg
+        part_path = out_path + ".part"
+        resumable = not ranges and self.params.get("continuedl", True)
+        done = min(size, os.path.getsize(part_path)) if resumable and os.path.exists(part_path) else 0
+        backend._count("resumed_bytes", done)
+        if backend._roll() < backend.transfer_failure_rate:
+            cut = done + int((size - done) * backend._roll())
+            self._transfer((cut - done) / backend.bandwidth, out_path)
+            backend._count("bytes", cut - done)
+            backend._count("transfer_failures")
+            if resumable:
+                with open(source, "rb") as src, open(part_path, "wb") as part:
+                    part.write(src.read(cut))
+            raise DownloadError(f"ERROR: {TRANSFER_ERROR}")
+        seconds = (size - done) / backend.bandwidth
+        if backend._roll() < backend.stall_rate:
+            backend._count("stalls")
+            seconds += backend.stall_seconds
+        self._transfer(seconds, out_path)
+        backend._count("bytes", size - done)
+        backend._count("downloads")
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+        cmd = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin", "-y"]
+        if (start, end) != (0.0, duration):
+            cmd += ["-ss", f"{start:.3f}", "-t", f"{end - start:.3f}"]
+        cmd += ["-i", source, "-vn"]
+        if transcode:
+            cmd += ["-c:a", "libmp3lame", "-b:a", "192k"]
+        elif not (ranges and self.params.get("force_keyframes_at_cuts")):
+            # Like yt-dlp's ffmpeg downloader, forcing keyframes at cuts drops the stream copy
+            cmd += ["-c:a", "copy"]
+        subprocess.run(cmd + [out_path], check=True)
+        return dict(info, requested_downloads=[{"filepath": out_path}])
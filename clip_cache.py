@@ -0,0 +1,169 @@
+"""
+Persistent on-disk clip cache shared by the CLI and the Streamlit app.
+Downloads are keyed by video ID, clip window and format, so a cache hit
+skips yt-dlp entirely. The cache is trimmed to a size budget in
+least-recently-used order and is safe to share between processes.
+"""
+
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+CLIP_CACHE_DIR = os.getenv("CLIP_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "mashup", "clips")
+CLIP_CACHE_MAX_MB = int(os.getenv("CLIP_CACHE_MAX_MB", "1024"))  # 0 disables the cache
+
+LOCK_NAME = ".lock"
+
+
+def video_id(url: str) -> str:
+    """Extract the YouTube video ID from a watch/short/youtu.be URL."""
+    parsed = urlparse(url)
+    if parsed.query:
+        ids = parse_qs(parsed.query).get("v")
+        if ids:
+            return ids[0]
+    if parsed.netloc.endswith("youtu.be") or "/shorts/" in parsed.path:
+        return parsed.path.rstrip("/").rsplit("/", 1)[-1]
+    if not parsed.scheme:
+        return url  # Already a bare video ID
+    return parsed.path.rstrip("/").rsplit("/", 1)[-1] or url
+
+
+def cache_key(url: str, clip_start: float = 0.0, clip_seconds: Optional[float] = None, audio_format: str = "mp3") -> str:
+    """Return the cache key for one video, clip window and download format."""
+    window = "full" if clip_seconds is None else f"{float(clip_start):.3f}+{float(clip_seconds):.3f}"
+    raw = f"{video_id(url)}|{window}|{audio_format}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ClipCache:
+    """Size-bounded LRU cache of downloaded clips on disk."""
+
+    def __init__(self, directory: str = CLIP_CACHE_DIR, max_bytes: int = CLIP_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/store/eviction counters for this process."""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    @contextmanager
+    def _locked(self):
+        """Hold an exclusive lock across threads and processes."""
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            with open(os.path.join(self.directory, LOCK_NAME), "a") as fh:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _find(self, key: str) -> Optional[str]:
+        try:
+            for fname in os.listdir(self.directory):
+                if fname.startswith(key + "."):
+                    return os.path.join(self.directory, fname)
+        except OSError:
+            pass
+        return None
+
+    def fetch(self, key: str, dest_stem: str) -> Optional[str]:
+        """Place the cached clip at `dest_stem.<ext>` and return its path, or None on a miss."""
+        if not self.enabled:
+            return None
+        cached = self._find(key)
+        if cached:
+            dest = dest_stem + os.path.splitext(cached)[1]
+            try:
+                try:
+                    os.link(cached, dest)
+                except OSError:
+                    shutil.copyfile(cached, dest)
+                os.utime(cached)  # Mark as recently used
+                self._count("hits")
+                logger.info("Cache hit for %s", os.path.basename(dest))
+                return dest
+            except FileNotFoundError:
+                pass  # Evicted by another process in the meantime
+        self._count("misses")
+        return None
+
+    def store(self, key: str, path: str):
+        """Atomically copy a downloaded clip into the cache and evict old entries."""
+        if not self.enabled or not os.path.exists(path):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        ext = os.path.splitext(path)[1]
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp_", suffix=ext)
+        try:
+            with os.fdopen(fd, "wb") as out, open(path, "rb") as src:
+                shutil.copyfileobj(src, out)
+            with self._locked():
+                existing = self._find(key)
+                if existing:
+                    os.remove(tmp_path)
+                else:
+                    os.replace(tmp_path, os.path.join(self.directory, key + ext))
+                    self._count("stores")
+                self._evict()
+        except OSError as exc:
+            logger.warning("Could not cache %s: %s", path, exc)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _evict(self):
+        """Remove least-recently-used entries until the cache fits its budget (lock held)."""
+        entries = []
+        total = 0
+        for fname in os.listdir(self.directory):
+            if fname.startswith("."):
+                continue
+            full = os.path.join(self.directory, fname)
+            try:
+                st = os.stat(full)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, full))
+            total += st.st_size
+
+        for _, size, full in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(full)
+                total -= size
+                self._count("evictions")
+            except FileNotFoundError:
+                pass
+
+
+# Process-wide cache instance used by both entry points
+CLIP_CACHE = ClipCache()
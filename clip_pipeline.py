@@ -0,0 +1,184 @@
+"""
+Pipelined trim/merge that overlaps with in-flight downloads.
+Each clip is decoded and trimmed to PCM (from its highlight, see
+highlight.py) as soon as its download finishes, while later downloads are
+still running, and a consumer thread appends the clips to the output in
+search order. With an output file the PCM streams
+straight into an ffmpeg encoder, so the mashup is finished moments after
+the last download instead of after a separate merge pass.
+"""
+
+import os
+import queue
+import logging
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from ffmpeg_merge import CHANNELS, ENCODERS, FFMPEG_BINARY, SAMPLE_RATE
+from highlight import HIGHLIGHT_CLIPS, find_highlight
+from metrics import METRICS
+
+if TYPE_CHECKING:
+    from pydub import AudioSegment
+
+logger = logging.getLogger(__name__)
+
+# "false" waits for every download before merging (MERGE_ENGINE decides how)
+PIPELINE_MERGE = os.getenv("PIPELINE_MERGE", "true").lower() == "true"
+DECODE_WORKERS = 2  # Clips decoded at once; ffmpeg does the work outside the GIL
+
+SAMPLE_WIDTH = 2  # s16le
+BYTES_PER_MS = SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH // 1000
+
+
+def decode_clip(path: str, duration_sec: float, start_sec: float = 0.0) -> bytes:
+    """Decode `duration_sec` of `path` from `start_sec` to PCM in the merge layout."""
+    seek = ["-ss", f"{start_sec:.3f}"] if start_sec else []
+    cmd = [
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin",
+        *seek, "-t", f"{duration_sec:.3f}", "-i", path, "-vn",
+        "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "pipe:1",
+    ]
+    with METRICS.timer("mashup_ffmpeg_seconds", op="decode", engine="pipeline"):
+        result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(result.stderr.decode(errors="replace").strip() or "no audio decoded")
+    return result.stdout
+
+
+class ClipPipeline:
+    """Decodes clips as downloads finish and appends them to one output in order.
+
+    Wrap the download function with `decoding()` so finished downloads start
+    decoding immediately, then call `append()` for each clip to keep, in
+    order, and `close()` once downloads are done. Without `output_file` the
+    PCM is kept for `segment()`.
+    """
+
+    def __init__(self, duration_sec: float, output_file: Optional[str] = None, fmt: str = "mp3"):
+        self.duration_sec = duration_sec
+        self.output_file = output_file
+        self.used: List[str] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._decodes: Dict[int, Future] = {}
+        self._decoder = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+        self._queue: "queue.Queue[Optional[Tuple[int, str]]]" = queue.Queue()
+        self._chunks: List[bytes] = []
+        self._error: Optional[Exception] = None
+        self._encoder: Optional[subprocess.Popen] = None
+        if output_file:
+            cmd = [
+                FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+                "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "-i", "pipe:0",
+            ] + ENCODERS[fmt] + [output_file]
+            self._encoder = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        self._consumer = threading.Thread(target=self._consume, name="clip-pipeline", daemon=True)
+        self._consumer.start()
+
+    def decoding(self, download_fn: Callable[[str, int], Optional[str]]) -> Callable[[str, int], Optional[str]]:
+        """Wrap `download_fn(url, index)` so each finished download starts decoding."""
+
+        def run(url: str, index: int) -> Optional[str]:
+            path = download_fn(url, index)
+            if path:
+                self._start_decode(index, path)
+            return path
+
+        return run
+
+    def _start_decode(self, index: int, path: str) -> Optional[Future]:
+        with self._lock:
+            if index not in self._decodes and not self._closed:
+                self._decodes[index] = self._decoder.submit(self._decode, path)
+            return self._decodes.get(index)
+
+    def _decode(self, path: str) -> bytes:
+        start = find_highlight(path, self.duration_sec) if HIGHLIGHT_CLIPS else 0.0
+        return decode_clip(path, self.duration_sec, start)
+
+    def append(self, index: int, path: str):
+        """Queue clip `index` (downloaded to `path`) for the output after earlier appends."""
+        self._start_decode(index, path)  # No-op when the download worker already started it
+        self._queue.put((index, path))
+
+    def _consume(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            index, path = item
+            with self._lock:
+                future = self._decodes.pop(index, None)  # Written clips are not kept around
+            if future is None:
+                continue  # Aborted
+            try:
+                pcm = future.result()
+            except Exception as exc:
+                logger.warning("Skipping %s: %s", path, exc)
+                continue
+            try:
+                if self._encoder:
+                    self._encoder.stdin.write(memoryview(pcm))  # type: ignore
+                else:
+                    self._chunks.append(pcm)
+            except OSError as exc:
+                self._error = exc
+                return
+            self.used.append(path)
+            logger.info("Added %d ms from %s", len(pcm) // BYTES_PER_MS, os.path.basename(path))
+
+    def close(self) -> List[str]:
+        """Wait for the appended clips, finish the output and return the clips used.
+
+        Raises RuntimeError if no clip could be decoded or the encoder failed.
+        """
+        self._queue.put(None)
+        self._consumer.join()
+        with self._lock:
+            self._closed = True
+        self._decoder.shutdown(wait=True, cancel_futures=True)
+        if self._encoder:
+            with METRICS.timer("mashup_ffmpeg_seconds", op="encode", engine="pipeline"):
+                try:
+                    self._encoder.stdin.close()  # type: ignore
+                except OSError as exc:  # Encoder already exited; its stderr says why
+                    self._error = self._error or exc
+                stderr = self._encoder.stderr.read()  # type: ignore
+                code = self._encoder.wait()
+            if self._error or code != 0 or not self.used:
+                self._remove_output()
+                detail = stderr.decode(errors="replace").strip() or self._error or "no usable clips"
+                raise RuntimeError(f"Pipelined merge failed: {detail}")
+        elif not self.used:
+            raise RuntimeError("Pipelined merge failed: no usable clips")
+        return self.used
+
+    def segment(self) -> "AudioSegment":
+        """Return the merged clips as an AudioSegment (in-memory mode, after `close()`)."""
+        from pydub import AudioSegment
+
+        return AudioSegment(
+            data=b"".join(self._chunks), sample_width=SAMPLE_WIDTH, frame_rate=SAMPLE_RATE, channels=CHANNELS
+        )
+
+    def abort(self):
+        """Stop without producing output (no-op after `close()`)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._decodes.clear()
+        self._queue.put(None)
+        self._consumer.join()
+        self._decoder.shutdown(wait=False, cancel_futures=True)
+        if self._encoder:
+            self._encoder.kill()
+            self._encoder.wait()
+            self._remove_output()
+
+    def _remove_output(self):
+        if self.output_file and os.path.exists(self.output_file):
+            os.remove(self.output_file)
@@ -0,0 +1,366 @@
+"""
+Bounded download worker pool shared by the CLI and the Streamlit app.
+Runs `download_audio` for several URLs at once while capping how many
+requests hit the same host, and hands results back in submission order.
+`download_hedged` stops at a success quota instead: it keeps a few
+candidates in flight, adds spares when one stalls or fails, and cancels
+the rest (including their yt-dlp/ffmpeg children) once the quota is met.
+"""
+
+import os
+import time
+import signal
+import threading
+import logging
+import statistics
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, Future, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration (overridable from .env)
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "4"))
+DOWNLOAD_PER_HOST = int(os.getenv("DOWNLOAD_PER_HOST", "2"))
+DOWNLOAD_HOST_INTERVAL = float(os.getenv("DOWNLOAD_HOST_INTERVAL", "1.0"))
+# "false" downloads every candidate in order with `download_many`
+DOWNLOAD_HEDGE = os.getenv("DOWNLOAD_HEDGE", "true").lower() == "true"
+HEDGE_STALL_SECONDS = float(os.getenv("HEDGE_STALL_SECONDS", "20"))  # Running this long counts as stalled
+HEDGE_SPARES = int(os.getenv("HEDGE_SPARES", "2"))  # Extra candidates allowed while others are stalled
+
+STALL_FACTOR = 3.0  # Also stalled once this many times slower than the median successful download
+CANCEL_GRACE_SECONDS = 5.0  # How long a hedged run waits for cancelled downloads to clean up
+
+
+class HostLimiter:
+    """Caps concurrent requests per host and spaces out their start times."""
+
+    def __init__(self, per_host: int = DOWNLOAD_PER_HOST, min_interval: float = DOWNLOAD_HOST_INTERVAL):
+        self.per_host = max(1, per_host)
+        self.min_interval = max(0.0, min_interval)
+        self._lock = threading.Lock()
+        self._slots: Dict[str, threading.Semaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    def _slot(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.Semaphore(self.per_host)
+            return self._slots[host]
+
+    def acquire(self, host: str, hold_slot: bool = True):
+        """Block until `host` has a free slot and its start interval has passed.
+
+        With `hold_slot=False` only the start interval is enforced (hedged
+        spares started while other downloads on the host are stalled).
+        """
+        if hold_slot:
+            self._slot(host).acquire()
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+            METRICS.inc("mashup_sleep_seconds_total", start - now, reason="host_interval")
+
+    def release(self, host: str):
+        self._slot(host).release()
+
+
+def host_of(url: str) -> str:
+    """Return the host part of a URL (bare video IDs count as one host)."""
+    return urlparse(url).netloc.lower() or "youtube"
+
+
+class HostSlot:
+    """A worker's claim on its URL's host, taken only when it goes to the network."""
+
+    def __init__(self, limiter: HostLimiter, host: str, hold_slot: bool = True, on_acquire: Optional[Callable] = None):
+        self.limiter = limiter
+        self.host = host
+        self.hold_slot = hold_slot
+        self.on_acquire = on_acquire
+        self.held = False
+
+    def acquire(self):
+        if not self.held:
+            self.limiter.acquire(self.host, hold_slot=self.hold_slot)
+            self.held = True
+            if self.on_acquire:
+                self.on_acquire()
+
+    def release(self):
+        if self.held and self.hold_slot:
+            self.limiter.release(self.host)
+        self.held = False
+
+
+_local = threading.local()
+
+
+@contextmanager
+def _worker(slot: HostSlot, token: Optional["CancelToken"] = None):
+    _local.slot, _local.token = slot, token
+    try:
+        yield
+    finally:
+        _local.slot = _local.token = None
+        slot.release()
+
+
+def claim_host():
+    """Wait for the current download's host slot and start interval.
+
+    `download_fn` passed to the pools must call this before touching the
+    network; `download_audio` does so after a clip cache miss, so cache
+    hits never queue behind (or space out) real downloads.
+    """
+    slot = getattr(_local, "slot", None)
+    if slot:
+        slot.acquire()
+
+
+def download_many(
+    download_fn: Callable[[str, int], Optional[str]],
+    urls: Iterable[str],
+    max_workers: int = DOWNLOAD_CONCURRENCY,
+    limiter: Optional[HostLimiter] = None,
+    start: int = 1,
+) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """Run `download_fn(url, index)` concurrently and yield results in order.
+
+    Yields `(index, url, path)` tuples in the same order as `urls`, so callers
+    keep deterministic clip ordering. Closing the generator early (e.g. a
+    `break` once enough tracks are downloaded) cancels downloads that have
+    not started yet. `download_fn` takes its host slot with `claim_host()`.
+    """
+    limiter = limiter or HostLimiter()
+
+    def run(url: str, index: int) -> Optional[str]:
+        with _worker(HostSlot(limiter, host_of(url))):
+            try:
+                return download_fn(url, index)
+            except Exception as exc:
+                logger.warning("Download worker failed for %s: %s", url, exc)
+                return None
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="download")
+    try:
+        futures: List[Tuple[int, str, Future]] = [
+            (index, url, executor.submit(run, url, index))
+            for index, url in enumerate(urls, start=start)
+        ]
+        for index, url, future in futures:
+            yield index, url, future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+class CancelToken:
+    """Cancellation flag for one download, checked by `download_audio`."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._markers: List[str] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def watch(self, marker: str):
+        """Kill child processes whose command line contains `marker` on cancel."""
+        self._markers.append(marker)
+        if self.cancelled:
+            _kill_children(self._markers)
+
+    def cancel(self):
+        self._event.set()
+        if self._markers:
+            _kill_children(self._markers)
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep up to `seconds`; returns True (early) if cancelled."""
+        return self._event.wait(max(0.0, seconds))
+
+
+def current_token() -> Optional[CancelToken]:
+    """Cancel token of the download running on this thread, if any."""
+    return getattr(_local, "token", None)
+
+
+def is_cancelled() -> bool:
+    token = current_token()
+    return bool(token and token.cancelled)
+
+
+def sleep_unless_cancelled(seconds: float):
+    """`time.sleep` that wakes up when the current download is cancelled."""
+    token = current_token()
+    if token:
+        token.wait(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def watch_children(marker: str):
+    """Have a cancel of the current download kill children mentioning `marker`."""
+    token = current_token()
+    if token:
+        token.watch(marker)
+
+
+def cancel_hook(status: Dict):
+    """yt-dlp progress hook that aborts the transfer of a cancelled download."""
+    if is_cancelled():
+        from yt_dlp.utils import DownloadCancelled  # type: ignore
+
+        raise DownloadCancelled("Download cancelled: quota met")
+
+
+def discard_partials(directory: str, prefix: str):
+    """Remove every file in `directory` starting with `prefix` (a cancelled download's leftovers)."""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(prefix):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def _kill_children(markers: List[str]):
+    """SIGKILL this process's children (ffmpeg, ...) whose command line contains a marker."""
+    try:
+        pids = [pid for pid in os.listdir("/proc") if pid.isdigit()]
+    except OSError:
+        return  # No procfs: cancelled downloads stop at their next progress hook instead
+    me = str(os.getpid())
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as fh:
+                parent = fh.read().rsplit(")", 1)[1].split()[1]
+            if parent != me:
+                continue
+            with open(f"/proc/{pid}/cmdline", "rb") as fh:
+                cmdline = fh.read().decode(errors="replace")
+            if any(marker in cmdline for marker in markers):
+                os.kill(int(pid), signal.SIGKILL)
+        except (OSError, IndexError):
+            continue
+
+
+_CANCELLED = object()
+
+
+def download_hedged(
+    download_fn: Callable[[str, int], Optional[str]],
+    urls: Iterable[str],
+    quota: int,
+    parallel: int = DOWNLOAD_CONCURRENCY,
+    limiter: Optional[HostLimiter] = None,
+    start: int = 1,
+    stall_seconds: float = HEDGE_STALL_SECONDS,
+    spares: int = HEDGE_SPARES,
+) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """Run `download_fn(url, index)` until `quota` downloads succeed.
+
+    Keeps `parallel` candidates running; a failed one is replaced by the
+    next URL, and a stalled one gets up to `spares` extra candidates
+    alongside it. Once the quota is met, running downloads are cancelled
+    and later URLs are never started. Yields `(index, url, path)` for every
+    finished candidate in `urls` order; cancelled ones are not yielded.
+    """
+    limiter = limiter or HostLimiter()
+    candidates = list(enumerate(urls, start=start))
+    parallel = max(1, parallel)
+    executor = ThreadPoolExecutor(max_workers=parallel + max(0, spares), thread_name_prefix="download")
+    tokens: Dict[int, CancelToken] = {}
+    started: Dict[int, float] = {}
+    running: Dict[Future, int] = {}
+    cancelled: List[Future] = []
+    results: Dict[int, object] = {}
+    durations: List[float] = []
+    launched = 0
+    successes = 0
+
+    def run(url: str, index: int, token: CancelToken, spare: bool) -> Optional[str]:
+        slot = HostSlot(limiter, host_of(url), hold_slot=not spare,
+                        on_acquire=lambda: started.setdefault(index, time.monotonic()))
+        with _worker(slot, token):
+            try:
+                if token.cancelled:
+                    return None
+                return download_fn(url, index)
+            except Exception as exc:
+                logger.warning("Download worker failed for %s: %s", url, exc)
+                return None
+
+    def launch(spare: bool):
+        nonlocal launched
+        index, url = candidates[launched]
+        launched += 1
+        tokens[index] = CancelToken()
+        running[executor.submit(run, url, index, tokens[index], spare)] = index
+        METRICS.inc("mashup_hedge_total", event="spare" if spare else "launch")
+
+    def stalled(index: int, now: float) -> bool:
+        if index not in started:
+            return False  # Still waiting for a host slot
+        limit = stall_seconds
+        if durations:
+            limit = min(limit, max(1.0, STALL_FACTOR * statistics.median(durations)))
+        return now - started[index] > limit
+
+    def cancel_running():
+        for future, index in running.items():
+            future.cancel()
+            tokens[index].cancel()
+            cancelled.append(future)
+            results[index] = _CANCELLED
+            METRICS.inc("mashup_hedge_total", event="cancel")
+        running.clear()
+
+    emitted = 0
+    try:
+        while True:
+            if successes < quota:
+                now = time.monotonic()
+                active = sum(1 for index in running.values() if not stalled(index, now))
+                while launched < len(candidates) and active < parallel and len(running) < parallel + spares:
+                    launch(spare=len(running) >= parallel)
+                    active += 1
+            # Hand back finished candidates in search order
+            while emitted < launched and candidates[emitted][0] in results:
+                index, url = candidates[emitted]
+                emitted += 1
+                if results[index] is not _CANCELLED:
+                    yield index, url, results[index]  # type: ignore
+            if not running:
+                break
+            done, _ = wait(list(running), timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                path = future.result()
+                results[index] = path
+                if path:
+                    successes += 1
+                    if index in started:  # Clip cache hits never reach the network
+                        durations.append(time.monotonic() - started[index])
+            if successes >= quota and running:
+                logger.info("Download quota of %d met, cancelling %d running downloads", quota, len(running))
+                cancel_running()
+    finally:
+        cancel_running()
+        executor.shutdown(wait=False, cancel_futures=True)
+        # Cancelled workers exit at their next checkpoint after removing their partial files;
+        # wait (briefly) so the caller never deletes the download directory under them
+        _, pending = wait(cancelled, timeout=CANCEL_GRACE_SECONDS)
+        if pending:
+            logger.warning("%d cancelled downloads still running after %.0fs", len(pending), CANCEL_GRACE_SECONDS)
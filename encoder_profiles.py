@@ -0,0 +1,95 @@
+"""
+Output encoder profiles.
+Every mashup used to be a 192k CBR MP3, which is neither the smallest
+attachment nor the cheapest encode. A profile names one ffmpeg encoder
+setup together with its file extension, nominal bitrate and encode speed,
+so the output can trade quality for size and encode time. The profile
+name is the `fmt` every merge engine and exporter takes
+(`ffmpeg_merge.ENCODERS` is built from PROFILES).
+"""
+
+import os
+from typing import Dict, List
+
+
+class EncoderProfile:
+    """One selectable output encoding.
+
+    `bitrate_kbps` is the nominal average bitrate (VBR profiles land near
+    it on music) and `speed` the encode speed in multiples of real time on
+    one core, both measured with benchmarks/bench_encoder_profiles.py.
+    """
+
+    def __init__(
+        self, name: str, label: str, extension: str, codec: str, args: List[str],
+        bitrate_kbps: int, speed: float, vbr: bool = False,
+    ):
+        self.name = name
+        self.label = label
+        self.extension = extension
+        self.codec = codec
+        self.args = args
+        self.bitrate_kbps = bitrate_kbps
+        self.speed = speed
+        self.vbr = vbr
+
+    @property
+    def splittable(self) -> bool:
+        """Whether parallel_encode can encode this profile in segments (CBR MP3 only)."""
+        return self.codec == "mp3" and not self.vbr
+
+    def describe(self) -> str:
+        """Short human-readable summary, e.g. for a format picker."""
+        return f"{self.label} (~{self.bitrate_kbps} kbps, {self.speed:.0f}x real time)"
+
+
+def _profiles(*profiles: EncoderProfile) -> Dict[str, EncoderProfile]:
+    return {profile.name: profile for profile in profiles}
+
+
+# The first profile for an extension is the default for output files with it
+PROFILES = _profiles(
+    EncoderProfile("mp3", "MP3 192k CBR", ".mp3", "mp3",
+                   ["-c:a", "libmp3lame", "-b:a", "192k", "-f", "mp3"], 192, 28),
+    EncoderProfile("mp3-320", "MP3 320k CBR", ".mp3", "mp3",
+                   ["-c:a", "libmp3lame", "-b:a", "320k", "-f", "mp3"], 320, 28),
+    EncoderProfile("mp3-128", "MP3 128k CBR", ".mp3", "mp3",
+                   ["-c:a", "libmp3lame", "-b:a", "128k", "-f", "mp3"], 128, 32),
+    EncoderProfile("mp3-v2", "MP3 VBR V2", ".mp3", "mp3",
+                   ["-c:a", "libmp3lame", "-q:a", "2", "-f", "mp3"], 190, 41, vbr=True),
+    EncoderProfile("mp3-v5", "MP3 VBR V5", ".mp3", "mp3",
+                   ["-c:a", "libmp3lame", "-q:a", "5", "-f", "mp3"], 130, 43, vbr=True),
+    EncoderProfile("opus-96", "Opus 96k", ".opus", "opus",
+                   ["-c:a", "libopus", "-b:a", "96k", "-f", "ogg"], 96, 17, vbr=True),
+    EncoderProfile("opus-64", "Opus 64k", ".opus", "opus",
+                   ["-c:a", "libopus", "-b:a", "64k", "-f", "ogg"], 64, 20, vbr=True),
+    EncoderProfile("aac-128", "AAC 128k", ".aac", "aac",
+                   ["-c:a", "aac", "-b:a", "128k", "-f", "adts"], 128, 28),
+)
+
+# Profile for new mashups; the CLI uses it when it matches the output file's extension
+OUTPUT_PROFILE = os.getenv("OUTPUT_PROFILE", "mp3").lower()
+
+EXTENSIONS = sorted({profile.extension for profile in PROFILES.values()})
+
+
+def get_profile(name: str) -> EncoderProfile:
+    """Return the profile called `name`; raises ValueError for unknown names."""
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown output profile {name!r}; choose one of {', '.join(PROFILES)}") from None
+
+
+def profile_for(filename: str, preferred: str = OUTPUT_PROFILE) -> EncoderProfile:
+    """Pick the profile for an output file: `preferred` if its extension matches, else that extension's default.
+
+    Raises ValueError if no profile writes files with that extension.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if preferred in PROFILES and PROFILES[preferred].extension == extension:
+        return PROFILES[preferred]
+    for profile in PROFILES.values():
+        if profile.extension == extension:
+            return profile
+    raise ValueError(f"output file must end with one of {', '.join(EXTENSIONS)}")
@@ -0,0 +1,124 @@
+"""
+Single-pass ffmpeg merge engine.
+Builds one ffmpeg invocation that trims every input, concatenates the clips
+and encodes the result, so full tracks are never decoded into memory and
+the output is never copied clip by clip.
+"""
+
+import os
+import shutil
+import logging
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+from metrics import METRICS
+from encoder_profiles import PROFILES
+
+logger = logging.getLogger(__name__)
+
+# "ffmpeg" uses this module, "pydub" keeps the AudioSegment-based merge
+MERGE_ENGINE = os.getenv("MERGE_ENGINE", "ffmpeg").lower()
+
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "") or shutil.which("ffmpeg") or "ffmpeg"
+
+# Common layout every clip is converted to before concatenation
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+# ffmpeg encoder options per output format: every output profile, plus WAV for in-process PCM
+ENCODERS = {name: profile.args for name, profile in PROFILES.items()}
+ENCODERS["wav"] = ["-c:a", "pcm_s16le", "-f", "wav"]
+
+
+def build_command(
+    audio_paths: List[str],
+    duration_sec: float,
+    output: str,
+    fmt: str = "mp3",
+    starts: Optional[Dict[str, float]] = None,
+) -> List[str]:
+    """Return the ffmpeg argv that trims, concatenates and encodes `audio_paths`.
+
+    `starts` maps a path to where its clip begins (seconds); others start at 0.
+    """
+    if fmt not in ENCODERS:
+        raise ValueError(f"Unsupported output format: {fmt}")
+
+    cmd = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin", "-y"]
+    for path in audio_paths:
+        # Input-side seek/limit so ffmpeg only demuxes the clip window
+        start_sec = (starts or {}).get(path, 0.0)
+        if start_sec:
+            cmd += ["-ss", f"{start_sec:.3f}"]
+        cmd += ["-t", f"{duration_sec:.3f}", "-i", path]
+
+    layout = "stereo" if CHANNELS == 2 else "mono"
+    chains = [
+        f"[{i}:a:0]aresample={SAMPLE_RATE},"
+        f"aformat=sample_fmts=s16:channel_layouts={layout}[a{i}]"
+        for i in range(len(audio_paths))
+    ]
+    labels = "".join(f"[a{i}]" for i in range(len(audio_paths)))
+    graph = ";".join(chains + [f"{labels}concat=n={len(audio_paths)}:v=0:a=1[out]"])
+
+    cmd += ["-filter_complex", graph, "-map", "[out]", "-vn"]
+    cmd += ENCODERS[fmt]
+    cmd.append(output)
+    return cmd
+
+
+def is_decodable(path: str) -> bool:
+    """Check that ffmpeg can decode the start of `path`."""
+    result = subprocess.run(
+        [FFMPEG_BINARY, "-v", "error", "-nostdin", "-t", "0.5", "-i", path, "-vn", "-f", "null", "-"],
+        capture_output=True,
+    )
+    return result.returncode == 0
+
+
+def _run(
+    audio_paths: List[str], duration_sec: float, output: str, fmt: str, starts: Optional[Dict[str, float]]
+) -> Tuple[int, bytes, bytes]:
+    cmd = build_command(audio_paths, duration_sec, output, fmt, starts)
+    with METRICS.timer("mashup_ffmpeg_seconds", op="merge", engine="ffmpeg") as fields:
+        result = subprocess.run(cmd, capture_output=True)
+        fields.update(inputs=len(audio_paths), returncode=result.returncode)
+    return result.returncode, result.stdout, result.stderr
+
+
+def merge(
+    audio_paths: List[str],
+    duration_sec: float,
+    output_file: Optional[str] = None,
+    fmt: str = "mp3",
+    starts: Optional[Dict[str, float]] = None,
+) -> Tuple[List[str], Optional[bytes]]:
+    """Trim and concatenate `audio_paths` in one ffmpeg pass.
+
+    Each clip begins at its `starts` entry (default 0, see `build_command`).
+    Writes to `output_file` when given, otherwise returns the encoded bytes.
+    Unreadable inputs are skipped like the pydub engine does. Returns the
+    list of clips actually used and the encoded data (None when written to
+    a file). Raises RuntimeError if no clip could be processed.
+    """
+    paths = [p for p in audio_paths if os.path.exists(p)]
+    target = output_file or "pipe:1"
+
+    code, out, err = _run(paths, duration_sec, target, fmt, starts) if paths else (1, b"", b"")
+    if code != 0 and paths:
+        # One bad input fails the whole graph; drop the broken ones and retry
+        good = []
+        for path in paths:
+            if is_decodable(path):
+                good.append(path)
+            else:
+                logger.warning("Skipping %s: ffmpeg could not decode it", path)
+        paths = good
+        code, out, err = _run(paths, duration_sec, target, fmt, starts) if paths else (1, b"", b"")
+
+    if code != 0 or not paths:
+        raise RuntimeError(f"ffmpeg merge failed: {err.decode(errors='replace').strip() or 'no usable clips'}")
+
+    for path in paths:
+        logger.info("Added up to %d ms from %s", int(duration_sec * 1000), os.path.basename(path))
+    return paths, (None if output_file else out)
@@ -0,0 +1,146 @@
+"""
+Two-phase downloads: resolve a video's formats once, then transfer.
+`extract_info(url, download=True)` repeats YouTube's player extraction on
+every attempt, even when an earlier attempt already resolved the formats and
+only the transfer failed. `FormatCache` keeps each video's extracted info
+until its signed stream URLs expire and hands it straight to the downloader.
+Entries are kept per player client, since signed URLs are bound to the client
+(and PO token) that resolved them. Whole-file transfers are fetched in HTTP
+range chunks and resume any `.part` file a failed attempt left behind;
+partial (section) downloads go through ffmpeg and always start over.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from clip_cache import video_id
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# "false" runs the full extraction on every download attempt
+TWO_PHASE_DOWNLOAD = os.getenv("TWO_PHASE_DOWNLOAD", "true").lower() == "true"
+FORMAT_CACHE_TTL = int(os.getenv("FORMAT_CACHE_TTL", "3600"))  # Seconds, when a stream URL has no expire=
+HTTP_CHUNK_SIZE = int(os.getenv("HTTP_CHUNK_MB", "10")) * 1024 * 1024  # Bytes per range request
+
+EXPIRY_MARGIN = 120  # Drop resolved URLs this many seconds before YouTube stops honouring them
+MAX_ENTRIES = 256
+
+# Transfer errors that mean the signed URLs are no longer valid and need resolving again
+EXPIRED_MARKERS = ("http error 403", "http error 410", "forbidden", "expired")
+
+
+def stream_expiry(info: Dict[str, Any], now: Optional[float] = None) -> float:
+    """Return when the earliest signed stream URL in `info` expires."""
+    now = time.time() if now is None else now
+    urls = [info.get("url")] + [fmt.get("url") for fmt in info.get("formats") or []]
+    expiries = []
+    for url in urls:
+        if not url:
+            continue
+        values = parse_qs(urlparse(url).query).get("expire")
+        if values and values[0].isdigit():
+            expiries.append(float(values[0]))
+    return min(expiries) if expiries else now + FORMAT_CACHE_TTL
+
+
+def cache_key(ydl, video: str) -> Tuple[str, Tuple[str, ...]]:
+    """Key resolved formats by video and the session's player clients."""
+    youtube_args = (ydl.params.get("extractor_args") or {}).get("youtube") or {}
+    return video, tuple(youtube_args.get("player_client") or ())
+
+
+def _fresh_copy(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy `info` deep enough that yt-dlp's in-place processing leaves the cached one intact."""
+    return {
+        key: [dict(item) if isinstance(item, dict) else item for item in value] if isinstance(value, list) else value
+        for key, value in info.items()
+    }
+
+
+class FormatCache:
+    """Extracted (unprocessed) yt-dlp info per video and player client, kept until its URLs expire."""
+
+    def __init__(self, enabled: bool = TWO_PHASE_DOWNLOAD, max_entries: int = MAX_ENTRIES):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "invalidated": 0}
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            info, expires = entry
+            if time.time() >= expires - EXPIRY_MARGIN:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return info
+
+    def put(self, key: Hashable, info: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = (info, stream_expiry(info))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.stats["invalidated"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def download(self, ydl, url: str, attempt_log) -> Optional[Dict[str, Any]]:
+        """Download `url` with session `ydl`, resolving its formats only when needed.
+
+        `attempt_log` is the session's logger; with `ignoreerrors` yt-dlp
+        reports transfer errors only there, so it is checked to drop URLs
+        YouTube has stopped accepting.
+        """
+        if not self.enabled:
+            return ydl.extract_info(url, download=True)
+
+        key = cache_key(ydl, video_id(url))
+        info = self.get(key)
+        METRICS.inc("mashup_format_cache_total", result="miss" if info is None else "hit")
+        if info is None:
+            info = ydl.extract_info(url, download=False, process=False)
+            if not info:
+                return None  # Extraction failed; the error is in attempt_log
+            if info.get("_type", "video") != "video":
+                return ydl.process_ie_result(info, download=True)
+            self.put(key, info)
+        else:
+            logger.debug("Reusing resolved formats for %s", key)
+
+        errors_before = len(attempt_log.errors)
+        try:
+            return ydl.process_ie_result(_fresh_copy(info), download=True)
+        except Exception as exc:
+            self._check_expired(key, [str(exc)])
+            raise
+        finally:
+            self._check_expired(key, attempt_log.errors[errors_before:])
+
+    def _check_expired(self, key: Hashable, errors):
+        if any(marker in msg.lower() for msg in errors for marker in EXPIRED_MARKERS):
+            logger.debug("Stream URLs for %s were rejected; resolving again next attempt", key)
+            self.invalidate(key)
+
+
+# Process-wide cache shared by every download thread
+FORMAT_CACHE = FormatCache()
@@ -0,0 +1,114 @@
+"""
+Highlight selection: pick the most energetic window of each track.
+Taking the first N seconds often lands on a silent or spoken intro. Each
+track is decoded once at a low rate (8 kHz mono) and its short-time energy
+and onset strength are scored with NumPy; the window of the requested
+length with the highest score is kept, and only that window is decoded at
+full quality by the merge engines.
+"""
+
+import os
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from ffmpeg_merge import FFMPEG_BINARY
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# "false" always keeps the first N seconds of each track
+HIGHLIGHT_CLIPS = os.getenv("HIGHLIGHT_CLIPS", "true").lower() == "true"
+# How far past the usual 0:00 cut a clip may start: each track's first
+# clip length + this many seconds are scanned (and downloaded with PARTIAL_DOWNLOAD)
+HIGHLIGHT_SCAN_SECONDS = int(os.getenv("HIGHLIGHT_SCAN_SECONDS", "30"))
+
+ANALYSIS_RATE = 8000  # Hz, mono
+FRAME_SECONDS = 0.05  # Energy/onset resolution
+ONSET_WEIGHT = 0.5  # Onset strength relative to loudness in the frame score
+MIN_GAIN = 0.10  # A later window must beat the opening one by this much to be chosen
+ANALYZE_WORKERS = 4  # Tracks analysed at once; ffmpeg does the decoding outside the GIL
+
+
+def scan_seconds_for(duration_sec: float) -> float:
+    """Return how much of a track to scan for a `duration_sec` highlight."""
+    return float(duration_sec + HIGHLIGHT_SCAN_SECONDS)
+
+
+def decode_preview(path: str, scan_sec: float) -> bytes:
+    """Decode the first `scan_sec` of `path` as 8 kHz mono s16le PCM."""
+    cmd = [
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-t", f"{scan_sec:.3f}", "-i", path, "-vn",
+        "-f", "s16le", "-ac", "1", "-ar", str(ANALYSIS_RATE), "pipe:1",
+    ]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors="replace").strip() or "preview decode failed")
+    return result.stdout
+
+
+def frame_scores(pcm: bytes):
+    """Score each FRAME_SECONDS frame of `pcm` by loudness plus onset strength."""
+    import numpy as np
+
+    frame = int(ANALYSIS_RATE * FRAME_SECONDS)
+    samples = np.frombuffer(pcm, dtype="<i2")
+    count = len(samples) // frame
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[: count * frame].reshape(count, frame).astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    level = np.log10(rms + 1e-4)
+    onsets = np.maximum(np.diff(level, prepend=level[0]), 0.0)  # Rises in level: beats, note attacks
+    peak = rms.max()
+    loudness = rms / peak if peak > 0 else rms
+    onset_peak = onsets.max()
+    if onset_peak > 0:
+        onsets = onsets / onset_peak
+    return loudness + ONSET_WEIGHT * onsets
+
+
+def best_window(scores, duration_sec: float) -> float:
+    """Return the start (seconds) of the highest-scoring `duration_sec` window in `scores`."""
+    import numpy as np
+
+    width = int(round(duration_sec / FRAME_SECONDS))
+    if width <= 0 or len(scores) <= width:
+        return 0.0
+    totals = np.cumsum(np.concatenate(([0.0], scores)))
+    windows = totals[width:] - totals[:-width]
+    best = int(np.argmax(windows))
+    if windows[best] <= windows[0] * (1.0 + MIN_GAIN):
+        return 0.0  # The opening is as good as anything later; keep the usual cut
+    return best * FRAME_SECONDS
+
+
+def find_highlight(path: str, duration_sec: float, scan_sec: Optional[float] = None) -> float:
+    """Return where the `duration_sec` highlight of `path` starts (0.0 if it cannot be analysed).
+
+    Scans the first `scan_sec` seconds (default: `scan_seconds_for(duration_sec)`).
+    """
+    try:
+        import numpy  # noqa: F401  # Optional dependency; without it clips start at 0
+    except ImportError:
+        return 0.0
+    try:
+        with METRICS.timer("mashup_ffmpeg_seconds", op="analyze", engine="highlight"):
+            pcm = decode_preview(path, scan_sec or scan_seconds_for(duration_sec))
+            start = best_window(frame_scores(pcm), duration_sec)
+    except Exception as exc:
+        logger.warning("Highlight analysis failed for %s (%s), using the start", os.path.basename(path), exc)
+        return 0.0
+    if start:
+        logger.info("Highlight of %s starts at %.1fs", os.path.basename(path), start)
+    return start
+
+
+def find_highlights(paths: List[str], duration_sec: float) -> Dict[str, float]:
+    """Run `find_highlight` over `paths` in parallel; returns {path: start seconds}."""
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(ANALYZE_WORKERS, len(paths)), thread_name_prefix="highlight") as pool:
+        return dict(zip(paths, pool.map(lambda p: find_highlight(p, duration_sec), paths)))
@@ -0,0 +1,283 @@
+"""
+Background job subsystem for the Streamlit app.
+Mashup pipelines run in a process pool instead of inside the Streamlit
+script run. Job state lives in an on-disk store shared by the UI and the
+workers, so jobs survive reruns and page reloads and the UI just polls.
+Jobs left queued or running by a server that has exited are marked failed
+when the next JobManager starts.
+Jobs are handed to the pool only when the admission controller (see
+admission.py) has room for them.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import tempfile
+import importlib
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from admission import SPILL, AdmissionController, Cost
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # Windows: updates are only serialised within one process
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.getenv("JOBS_DIR") or os.path.join(tempfile.gettempdir(), "mashup_jobs")
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "86400"))  # Seconds to keep finished jobs
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+FINISHED = (DONE, FAILED)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Exists but belongs to another user
+    return True
+
+
+class JobStore:
+    """File-backed job state shared between the UI process and workers."""
+
+    def __init__(self, directory: str = JOBS_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.directory, job_id)
+
+    def result_path(self, job_id: str) -> str:
+        return os.path.join(self.job_dir(job_id), "result.zip")
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.job_dir(job_id), "state.json")
+
+    def create(self, params: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        now = time.time()
+        self.write(job_id, {
+            "id": job_id,
+            "status": QUEUED,
+            "progress": 0,
+            "message": "Waiting for a free worker…",
+            "notes": [],
+            "params": params,
+            "error": None,
+            "owner": os.getpid(),  # Process that queued the job and hands it to a worker
+            "created": now,
+            "updated": now,
+        })
+        return job_id
+
+    def read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._state_path(job_id)) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, job_id: str, state: Dict[str, Any]):
+        """Atomically replace a job's state file."""
+        state["updated"] = time.time()
+        fd, tmp_path = tempfile.mkstemp(dir=self.job_dir(job_id), prefix=".state_", suffix=".json")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(state, fh)
+        os.replace(tmp_path, self._state_path(job_id))
+
+    @contextmanager
+    def _locked(self, job_id: str) -> Iterator[None]:
+        """Serialise read-modify-write of one job's state across threads and processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            try:
+                lock_file = open(os.path.join(self.job_dir(job_id), ".lock"), "a")
+            except OSError:
+                yield  # Job directory purged
+                return
+            with lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def update(self, job_id: str, **fields):
+        with self._locked(job_id):
+            state = self.read(job_id)
+            if state is None:
+                return
+            notes = fields.pop("notes", None)
+            state.update(fields)
+            if notes:
+                state["notes"] = state.get("notes", []) + notes
+            self.write(job_id, state)
+
+    def recover(self):
+        """Mark queued or running jobs whose owning server process has exited as failed."""
+        for job_id in os.listdir(self.directory):
+            state = self.read(job_id)
+            if not state or state["status"] in FINISHED or (state.get("owner") and _alive(state["owner"])):
+                continue
+            with self._locked(job_id):
+                state = self.read(job_id)
+                if state and state["status"] not in FINISHED:
+                    state.update(status=FAILED, error="The server restarted before this job finished. Please try again.")
+                    self.write(job_id, state)
+                    logger.warning("Job %s was orphaned by a server restart", job_id)
+
+    def purge(self, max_age: float = JOB_RETENTION):
+        """Delete finished jobs older than `max_age` seconds."""
+        cutoff = time.time() - max_age
+        for job_id in os.listdir(self.directory):
+            state = self.read(job_id)
+            if state and state["status"] in FINISHED and state["updated"] < cutoff:
+                shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+
+class JobContext:
+    """Handle a pipeline uses to report progress instead of calling Streamlit."""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def progress(self, pct: int, message: str):
+        self.store.update(self.job_id, progress=pct, message=message)
+
+    def status(self, message: str):
+        self.store.update(self.job_id, message=message)
+
+    def note(self, level: str, message: str):
+        """Record a message for the UI (`level` is info/warning/error/success)."""
+        self.store.update(self.job_id, notes=[{"level": level, "message": message}])
+
+    def record(self, **fields):
+        """Attach extra fields (e.g. an email message ID) to the job state."""
+        self.store.update(self.job_id, **fields)
+
+    def fail(self, message: str):
+        self.store.update(self.job_id, status=FAILED, error=message)
+
+    @property
+    def result_path(self) -> str:
+        return self.store.result_path(self.job_id)
+
+
+def _execute(target: str, job_id: str, directory: str, params: Dict[str, Any]):
+    """Worker entry point: import `module:function` and run it with a JobContext."""
+    store = JobStore(directory)
+    ctx = JobContext(store, job_id)
+    store.update(job_id, status=RUNNING, message="Starting…")
+    try:
+        module_name, func_name = target.split(":")
+        func = getattr(importlib.import_module(module_name), func_name)
+        func(ctx, **params)
+    except Exception as exc:
+        logger.error("Job %s failed: %s", job_id, exc)
+        ctx.fail(f"An unexpected error occurred: {exc}")
+        return
+    state = store.read(job_id)
+    if state and state["status"] == RUNNING:
+        store.update(job_id, status=DONE, progress=100)
+
+
+class JobManager:
+    """Submits jobs to a bounded process pool and tracks them in a JobStore.
+
+    Jobs wait in the manager until `admission` starts them, so the pool
+    never holds more jobs than it has workers.
+    """
+
+    def __init__(self, max_workers: int = JOB_CONCURRENCY, directory: str = JOBS_DIR):
+        self.store = JobStore(directory)
+        self.max_workers = max(1, max_workers)
+        self.admission = AdmissionController(self.max_workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self.store.recover()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Spawn keeps workers independent of the server's threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def submit(self, target: str, params: Dict[str, Any], cost: Optional[Cost] = None) -> str:
+        """Queue `module:function` with `params` and return the new job ID.
+
+        `cost` is the job's estimate for admission control (none reserves
+        only a worker). Raises AdmissionRejected when the job is turned
+        away; a job admitted in spill mode gets `spill=True` in its params.
+        """
+        self.store.purge()
+        job_id = self.store.create(params)
+        with self._lock:
+            self._pending[job_id] = (target, params)
+        try:
+            ready = self.admission.admit(job_id, cost or Cost(0, 0, 0.0))
+        except Exception as exc:
+            with self._lock:
+                self._pending.pop(job_id, None)
+            self.store.update(job_id, status=FAILED, error=str(exc))
+            raise
+        self._start(ready)
+        return job_id
+
+    def _start(self, ready: List[Tuple[str, str]]):
+        for job_id, mode in ready:
+            with self._lock:
+                target, params = self._pending.pop(job_id)
+            if mode == SPILL:
+                params = dict(params, spill=True)
+            self._run(job_id, target, params)
+
+    def _run(self, job_id: str, target: str, params: Dict[str, Any]):
+        try:
+            future = self._pool().submit(_execute, target, job_id, self.store.directory, params)
+        except Exception as exc:
+            self.store.update(job_id, status=FAILED, error=f"Could not start job: {exc}")
+            self._start(self.admission.release(job_id))
+            return
+
+        def on_done(fut: Future):
+            exc = fut.exception()
+            if exc is not None:
+                # Worker process died before it could record the failure itself
+                self.store.update(job_id, status=FAILED, error=f"Worker crashed: {exc}")
+                with self._lock:
+                    self._executor = None
+            self._start(self.admission.release(job_id))
+
+        future.add_done_callback(on_done)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.read(job_id)
+
+    def active(self) -> List[Dict[str, Any]]:
+        """Return queued and running jobs."""
+        jobs = [self.store.read(job_id) for job_id in os.listdir(self.store.directory)]
+        return [job for job in jobs if job and job["status"] not in FINISHED]
+
+
+# Process-wide manager; module state survives Streamlit reruns
+JOB_MANAGER = JobManager()
@@ -0,0 +1,322 @@
+"""
+Pipeline metrics shared by the CLI and the Streamlit app.
+Counters and latency histograms are kept per process, optionally logged as
+structured JSON records, and flushed to METRICS_DIR so the CLI, the web app
+and its job workers all show up in one Prometheus-style text snapshot.
+Totals of processes that have exited are folded into one cumulative file
+when the snapshot is collected, so the directory does not grow per run.
+
+Print the snapshot with `python metrics.py`, or serve it over HTTP with
+`python metrics.py --serve <port>` (the web app does this when METRICS_PORT
+is set).
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # Windows: exited processes' files are kept rather than folded
+    fcntl = None  # type: ignore
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv("METRICS_DIR") or os.path.join(tempfile.gettempdir(), "mashup_metrics")
+METRICS_LOG = os.getenv("METRICS_LOG", "false").lower() == "true"  # One JSON log line per event
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 disables the HTTP endpoint
+
+# Histogram buckets in seconds, from a cache hit up to a fully backed-off download
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+HELP = {
+    "mashup_stage_seconds": "Wall time of each pipeline stage.",
+    "mashup_download_attempts_total": "download_audio attempts per client strategy and outcome.",
+    "mashup_download_seconds": "Time spent in yt-dlp per strategy attempt (network + postprocessing).",
+    "mashup_format_cache_total": "Download attempts that reused resolved formats (hit) or extracted them (miss).",
+    "mashup_download_bytes_total": "Bytes of audio downloaded from YouTube.",
+    "mashup_hedge_total": "Hedged download candidates launched, started as spares, and cancelled.",
+    "mashup_sleep_seconds_total": "Deliberate sleeps (anti-bot delays, host spacing).",
+    "mashup_ffmpeg_seconds": "Time spent decoding, merging and encoding audio.",
+    "mashup_output_bytes_total": "Bytes of finished mashup output.",
+    "mashup_outputs_total": "Finished mashups.",
+    "mashup_fallback_total": "Runs that fell back to the default mashup.",
+}
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+CUMULATIVE = "cumulative"  # File stem holding the folded totals of exited processes
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_labels(labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _alive(token: str) -> bool:
+    """Whether the process that flushed under `token` (`pid-ms`) may still be running."""
+    try:
+        os.kill(int(token.split("-")[0]), 0)
+    except ValueError:
+        return True  # Not a flush token; leave the file alone
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Exists but belongs to another user
+    return True
+
+
+def _merge(
+    snapshots: List[Optional[Dict[str, Any]]],
+    counters: Optional[Dict[Key, float]] = None,
+    histograms: Optional[Dict[Key, List[float]]] = None,
+) -> Tuple[Dict[Key, float], Dict[Key, List[float]]]:
+    """Sum flushed snapshots (None entries are skipped) into counter and histogram totals."""
+    counters = {} if counters is None else counters
+    histograms = {} if histograms is None else histograms
+    for data in snapshots:
+        if not data:
+            continue
+        for name, labels, value in data["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, hist in data["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [0.0] * len(hist))
+            for i, value in enumerate(hist):
+                merged[i] += value
+    return counters, histograms
+
+
+class Metrics:
+    """Process-local counters and histograms with JSON event logging."""
+
+    def __init__(self, directory: str = METRICS_DIR, log_events: bool = METRICS_LOG):
+        self.directory = directory
+        self.log_events = log_events
+        self._lock = threading.Lock()
+        self._counters: Dict[Key, float] = {}
+        self._histograms: Dict[Key, List[float]] = {}  # Bucket counts + [sum, count]
+        self._server: Optional["ThreadingHTTPServer"] = None
+        self._events = logging.getLogger("mashup.metrics")
+        # Unique per process lifetime, so a reused PID never overwrites old totals
+        self._token = f"{os.getpid()}-{int(time.time() * 1000)}"
+
+    # Recording
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            hist = self._histograms.setdefault(key, [0.0] * (len(BUCKETS) + 2))
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+
+    def event(self, name: str, **fields):
+        """Emit a structured JSON log record (when METRICS_LOG is enabled)."""
+        if self.log_events:
+            self._events.info(json.dumps({"event": name, "ts": round(time.time(), 3), **fields}, default=str))
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[Dict[str, Any]]:
+        """Time a block into histogram `name`; the yielded dict adds log fields."""
+        fields: Dict[str, Any] = {}
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(name, elapsed, **labels)
+            self.event(name, seconds=round(elapsed, 4), **labels, **fields)
+
+    # Snapshot
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": [[n, list(map(list, l)), v] for (n, l), v in self._counters.items()],
+                "histograms": [[n, list(map(list, l)), list(h)] for (n, l), h in self._histograms.items()],
+            }
+
+    def flush(self):
+        """Write this process's totals to METRICS_DIR for `collect()`."""
+        snapshot = self.snapshot()
+        if not snapshot["counters"] and not snapshot["histograms"]:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._write(self._token, snapshot)
+        except OSError as exc:
+            logger.debug("Could not flush metrics: %s", exc)
+
+    def _write(self, token: str, data: Dict[str, Any]):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".metrics_", suffix=".json")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(data, fh)
+        os.replace(tmp_path, os.path.join(self.directory, f"{token}.json"))
+
+    def _files(self) -> List[str]:
+        try:
+            return [f[:-5] for f in os.listdir(self.directory) if f.endswith(".json") and not f.startswith(".")]
+        except OSError:
+            return []
+
+    def _read(self, token: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.directory, f"{token}.json")) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the directory's compaction lock (a no-op without fcntl or a directory)."""
+        try:
+            lock_file = open(os.path.join(self.directory, ".compact.lock"), "a") if fcntl else None
+        except OSError:
+            lock_file = None
+        if lock_file is None:
+            yield
+            return
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _compact(self):
+        """Fold the files of processes that have exited into the cumulative file (lock held)."""
+        if fcntl is None:
+            return
+        tokens = [t for t in self._files() if t not in (CUMULATIVE, self._token) and not _alive(t)]
+        if not tokens:
+            return
+        cumulative = self._read(CUMULATIVE) or {"counters": [], "histograms": []}
+        # Tokens folded by a compaction that stopped before deleting their files
+        folded = set(cumulative.get("folded", []))
+        counters, histograms = _merge([cumulative] + [self._read(t) for t in tokens if t not in folded])
+        try:
+            self._write(CUMULATIVE, {
+                "counters": [[n, list(map(list, l)), v] for (n, l), v in counters.items()],
+                "histograms": [[n, list(map(list, l)), h] for (n, l), h in histograms.items()],
+                "folded": tokens,
+            })
+            for token in tokens:
+                os.remove(os.path.join(self.directory, f"{token}.json"))
+        except OSError as exc:
+            logger.debug("Could not compact metrics: %s", exc)
+
+    def collect(self) -> Tuple[Dict[Key, float], Dict[Key, List[float]]]:
+        """Merge the flushed totals of every process (including this one)."""
+        self.flush()
+        with self._locked():
+            self._compact()
+            cumulative = self._read(CUMULATIVE)
+            folded = set(cumulative.get("folded", [])) if cumulative else set()
+            snapshots = [self._read(t) for t in self._files() if t != CUMULATIVE and t not in folded]
+        return _merge([cumulative] + snapshots)
+
+    def render(self) -> str:
+        """Return all processes' metrics in the Prometheus text format."""
+        counters, histograms = self.collect()
+        lines: List[str] = []
+        seen = set()
+
+        def header(name: str, kind: str):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {_number(value)}")
+        for (name, labels), hist in sorted(histograms.items()):
+            header(name, "histogram")
+            for bound, count in zip(BUCKETS, hist):
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {_number(count)}")
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {_number(hist[-1])}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist[-2]:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {_number(hist[-1])}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = METRICS_PORT, host: str = "0.0.0.0"):
+        """Serve `render()` at http://host:port/metrics (idempotent)."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        with self._lock:
+            if self._server is not None or not port:
+                return
+            metrics = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = metrics.render().encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            try:
+                self._server = ThreadingHTTPServer((host, port), Handler)
+            except OSError as exc:
+                logger.warning("Metrics endpoint not started on port %d: %s", port, exc)
+                return
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info("Serving metrics on http://%s:%d/metrics", host, port)
+
+
+# Process-wide registry
+METRICS = Metrics()
+
+
+def record_download(strategy: str, result: str, path: Optional[str] = None):
+    """Count one `download_audio` attempt and, for fresh downloads, its bytes."""
+    METRICS.inc("mashup_download_attempts_total", strategy=strategy, result=result)
+    if path and strategy != "cache":
+        try:
+            METRICS.inc("mashup_download_bytes_total", os.path.getsize(path))
+        except OSError:
+            pass
+    METRICS.event("download_attempt", strategy=strategy, result=result)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--serve":
+        METRICS.serve(int(sys.argv[2]))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+    else:
+        sys.stdout.write(METRICS.render())
@@ -0,0 +1,184 @@
+"""
+NumPy mixing engine: loudness-matched clips joined with crossfades.
+Clips from different uploads vary widely in loudness and hard joins click.
+Each clip is decoded (from its start, see highlight.py) to PCM, then one
+pass over a preallocated output buffer adds every clip with its
+normalisation gain and equal-power fade edges, and a look-ahead limiter
+keeps the sum under the ceiling. Every output sample is written a constant
+number of times, so the cost is linear in the mashup length; pydub's
+`append(crossfade=...)` copies the whole mix at every join instead.
+"""
+
+import os
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from ffmpeg_merge import CHANNELS, ENCODERS, FFMPEG_BINARY, SAMPLE_RATE
+from clip_pipeline import DECODE_WORKERS, SAMPLE_WIDTH, decode_clip
+from metrics import METRICS
+import parallel_encode
+
+logger = logging.getLogger(__name__)
+
+MIX_CROSSFADE_MS = int(os.getenv("MIX_CROSSFADE_MS", "1500"))  # 0 butts clips together
+MIX_TARGET_DBFS = float(os.getenv("MIX_TARGET_DBFS", "-16"))  # RMS level every clip is brought to
+MIX_CEILING_DBFS = float(os.getenv("MIX_CEILING_DBFS", "-1"))  # Limiter output peak
+
+MAX_GAIN_DB = 12.0  # Quiet clips are boosted at most this much (keeps noise floors down)
+LIMITER_BLOCK_MS = 10  # Limiter gain resolution; gain ramps across neighbouring blocks
+LIMITER_CHUNK = 1 << 18  # Frames of gain envelope built at a time (bounds the temporaries)
+
+
+def _db_to_linear(db: float) -> float:
+    return 10.0 ** (db / 20.0)
+
+
+def normalisation_gains(clips) -> List[float]:
+    """Gain that brings each clip's RMS to MIX_TARGET_DBFS (boost capped at MAX_GAIN_DB)."""
+    import numpy as np
+
+    target = _db_to_linear(MIX_TARGET_DBFS)
+    gains = []
+    for clip in clips:
+        rms = float(np.sqrt(np.mean(np.square(clip, dtype=np.float64)))) if clip.size else 0.0
+        gains.append(min(target / rms, _db_to_linear(MAX_GAIN_DB)) if rms > 0 else 1.0)
+    return gains
+
+
+def limit(mix, ceiling_dbfs: float = MIX_CEILING_DBFS):
+    """Scale `mix` (float frames x channels, in place) so no peak exceeds the ceiling.
+
+    Gain is computed per LIMITER_BLOCK_MS block, widened to the neighbouring
+    blocks (look-ahead and hold) and interpolated per sample, so it dips
+    smoothly before a peak instead of clipping it.
+    """
+    import numpy as np
+
+    ceiling = _db_to_linear(ceiling_dbfs)
+    block = max(1, SAMPLE_RATE * LIMITER_BLOCK_MS // 1000)
+    count = -(-len(mix) // block)
+    if count == 0:
+        return mix
+    full = len(mix) // block
+    peaks = np.empty(count, dtype=np.float64)
+    if full:
+        blocks = mix[: full * block].reshape(full, block * mix.shape[1])  # A view of the mix, not a copy
+        np.maximum(blocks.max(axis=1), -blocks.min(axis=1), out=peaks[:full])
+    if count > full:
+        peaks[full] = np.abs(mix[full * block:]).max()
+    gains = np.minimum(1.0, ceiling / np.maximum(peaks, 1e-9))
+    if gains.min() >= 1.0:
+        return mix
+    held = gains.copy()
+    held[1:] = np.minimum(held[1:], gains[:-1])
+    held[:-1] = np.minimum(held[:-1], gains[1:])
+    centers = np.arange(count) * block + block / 2.0
+    for start in range(0, len(mix), LIMITER_CHUNK):
+        end = min(len(mix), start + LIMITER_CHUNK)
+        envelope = np.interp(np.arange(start, end), centers, held).astype(mix.dtype)
+        mix[start:end] *= envelope[:, None]
+    np.clip(mix, -ceiling, ceiling, out=mix)  # Interpolation can undershoot a block edge slightly
+    return mix
+
+
+def mix_clips(clips, crossfade_ms: int = MIX_CROSSFADE_MS):
+    """Normalise, crossfade and limit float clips (frames x channels) into one int16 array."""
+    import numpy as np
+
+    clips = [clip for clip in clips if len(clip)]
+    if not clips:
+        return np.zeros((0, CHANNELS), dtype=np.int16)
+    gains = normalisation_gains(clips)
+    fade = SAMPLE_RATE * max(0, crossfade_ms) // 1000
+    if len(clips) > 1:
+        fade = min(fade, min(len(clip) for clip in clips) // 2)
+    else:
+        fade = 0
+    total = sum(len(clip) for clip in clips) - fade * (len(clips) - 1)
+
+    mix = np.zeros((total, CHANNELS), dtype=np.float32)
+    ramp = np.linspace(0.0, np.pi / 2, fade, dtype=np.float32)
+    fade_in, fade_out = np.sin(ramp)[:, None], np.cos(ramp)[:, None]  # Equal power
+    offset = 0
+    for i, (clip, gain) in enumerate(zip(clips, gains)):
+        scaled = clip * np.float32(gain)
+        if fade and i > 0:
+            scaled[:fade] *= fade_in
+        if fade and i < len(clips) - 1:
+            scaled[-fade:] *= fade_out
+        mix[offset:offset + len(clip)] += scaled
+        offset += len(clip) - fade
+
+    limit(mix)
+    mix *= 32767.0  # In place: a long mix is the largest buffer a job holds
+    return np.round(mix, out=mix).astype(np.int16)
+
+
+def _decode(path: str, duration_sec: float, start_sec: float):
+    import numpy as np
+
+    pcm = decode_clip(path, duration_sec, start_sec)
+    clip = np.frombuffer(pcm, dtype="<i2").reshape(-1, CHANNELS).astype(np.float32)
+    clip /= 32768.0
+    return clip
+
+
+def mix(
+    audio_paths: List[str], duration_sec: float, starts: Optional[Dict[str, float]] = None
+) -> Tuple[List[str], bytes]:
+    """Decode `duration_sec` of each path (from its `starts` entry) and mix them.
+
+    Returns the clips used and s16le PCM in the merge layout. Unreadable
+    inputs are skipped; raises RuntimeError if none could be decoded or
+    NumPy is unavailable.
+    """
+    try:
+        import numpy  # noqa: F401
+    except ImportError as exc:
+        raise RuntimeError("the numpy engine needs NumPy installed") from exc
+
+    starts = starts or {}
+    paths = [p for p in audio_paths if os.path.exists(p)]
+    with ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="mix-decode") as pool:
+        futures = [pool.submit(_decode, path, duration_sec, starts.get(path, 0.0)) for path in paths]
+    used, clips = [], []
+    for path, future in zip(paths, futures):
+        try:
+            clips.append(future.result())
+            used.append(path)
+        except Exception as exc:
+            logger.warning("Skipping %s: %s", path, exc)
+    if not clips:
+        raise RuntimeError("numpy mix failed: no usable clips")
+
+    with METRICS.timer("mashup_ffmpeg_seconds", op="mix", engine="numpy") as fields:
+        pcm = mix_clips(clips).tobytes()
+        fields.update(inputs=len(clips))
+    for path, clip in zip(used, clips):
+        logger.info("Added %d ms from %s", len(clip) * 1000 // SAMPLE_RATE, os.path.basename(path))
+    return used, pcm
+
+
+def encode(pcm: bytes, output_file: str, fmt: str = "mp3"):
+    """Encode s16le PCM in the merge layout to `output_file` with ffmpeg.
+
+    `fmt` is an output profile (see encoder_profiles.py). Long CBR MP3s
+    are encoded in parallel segments; crossfaded joins are no
+    better place to cut than anywhere else, so the cuts are evenly spaced.
+    """
+    seconds = len(pcm) / (SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH)
+    if parallel_encode.should_split(seconds, SAMPLE_RATE, fmt=fmt):
+        with open(output_file, "wb") as fh:
+            parallel_encode.encode(pcm, fh, fmt=fmt)
+        return
+
+    cmd = [
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+        "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "-i", "pipe:0",
+    ] + ENCODERS[fmt] + [output_file]
+    with METRICS.timer("mashup_ffmpeg_seconds", op="encode", engine="numpy"):
+        result = subprocess.run(cmd, input=pcm, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg encode failed: {result.stderr.decode(errors='replace').strip()}")
@@ -0,0 +1,247 @@
+"""
+Persistent email outbox with a background sender.
+Messages are written to disk and delivered by one sender thread that keeps
+a single SMTP connection open across messages, retrying failures with
+exponential backoff. Callers get a message ID back immediately and can look
+up its delivery status later.
+"""
+
+import os
+import json
+import time
+import uuid
+import smtplib
+import logging
+import tempfile
+import threading
+from email.message import Message
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # Windows: senders in other processes are not excluded
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_DIR = os.getenv("OUTBOX_DIR") or os.path.join(tempfile.gettempdir(), "mashup_outbox")
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SSL = os.getenv("SMTP_SSL", "true").lower() == "true"
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_BACKOFF = float(os.getenv("OUTBOX_BACKOFF", "5"))  # Seconds, doubled per failed attempt
+
+IDLE_TIMEOUT = 60.0  # Close the SMTP connection after this long without mail
+POLL_INTERVAL = 0.5
+
+QUEUED, SENT, FAILED = "queued", "sent", "failed"
+
+
+class Outbox:
+    """Disk-backed mail queue delivered over one reused SMTP connection."""
+
+    def __init__(
+        self,
+        directory: str = OUTBOX_DIR,
+        host: str = SMTP_HOST,
+        port: int = SMTP_PORT,
+        use_ssl: bool = SMTP_SSL,
+        username: str = "",
+        password: str = "",
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        backoff: float = OUTBOX_BACKOFF,
+    ):
+        self.directory = directory
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username
+        self.password = password
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # Storage
+
+    def _path(self, msg_id: str, ext: str) -> str:
+        return os.path.join(self.directory, f"{msg_id}.{ext}")
+
+    def _write_state(self, state: Dict[str, Any]):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".state_", suffix=".json")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(state, fh)
+        os.replace(tmp_path, self._path(state["id"], "json"))
+
+    def status(self, msg_id: str) -> Optional[Dict[str, Any]]:
+        """Return the delivery state of a queued message, or None if unknown."""
+        try:
+            with open(self._path(msg_id, "json")) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def enqueue(self, message: Message) -> str:
+        """Persist `message` for delivery and return its message ID."""
+        msg_id = uuid.uuid4().hex[:12]
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".msg_", suffix=".eml")
+        with os.fdopen(fd, "wb") as fh:
+            # SMTP requires CRLF line endings; sendmail() only fixes them for str
+            fh.write(message.as_bytes().replace(b"\r\n", b"\n").replace(b"\n", b"\r\n"))
+        os.replace(tmp_path, self._path(msg_id, "eml"))
+        self._write_state({
+            "id": msg_id,
+            "from": message["From"],
+            "to": message["To"],
+            "status": QUEUED,
+            "attempts": 0,
+            "next_attempt": 0.0,
+            "error": None,
+            "created": time.time(),
+        })
+        self._wakeup.set()
+        return msg_id
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Return queued messages, oldest first."""
+        states = []
+        for fname in os.listdir(self.directory):
+            if fname.endswith(".json") and not fname.startswith("."):
+                state = self.status(fname[:-5])
+                if state and state["status"] == QUEUED:
+                    states.append(state)
+        return sorted(states, key=lambda s: s["created"])
+
+    # SMTP connection
+
+    def _connection(self) -> smtplib.SMTP:
+        """Return the open SMTP connection, reconnecting if it went away."""
+        if self._smtp is not None:
+            try:
+                if time.monotonic() - self._last_used > 10:
+                    self._smtp.noop()
+                return self._smtp
+            except smtplib.SMTPException:
+                self._close()
+
+        if self.use_ssl:
+            smtp: smtplib.SMTP = smtplib.SMTP_SSL(self.host, self.port, timeout=30)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.password:
+            smtp.login(self.username, self.password)
+        self._smtp = smtp
+        return smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    # Delivery
+
+    def _deliver(self, state: Dict[str, Any]):
+        with open(self._path(state["id"], "eml"), "rb") as fh:
+            data = fh.read()
+        state["attempts"] += 1
+        try:
+            try:
+                self._connection().sendmail(state["from"], [state["to"]], data)
+            except smtplib.SMTPServerDisconnected:
+                # Reused connection was dropped by the server; reconnect once
+                self._close()
+                self._connection().sendmail(state["from"], [state["to"]], data)
+            self._last_used = time.monotonic()
+            state.update(status=SENT, error=None, sent=time.time())
+            os.remove(self._path(state["id"], "eml"))
+            logger.info("Email %s delivered to %s", state["id"], state["to"])
+        except (smtplib.SMTPException, OSError) as exc:
+            self._close()
+            state["error"] = str(exc)
+            if state["attempts"] >= self.max_attempts:
+                state["status"] = FAILED
+                logger.error("Email %s failed permanently: %s", state["id"], exc)
+            else:
+                state["next_attempt"] = time.time() + self.backoff * 2 ** (state["attempts"] - 1)
+                logger.warning("Email %s failed (attempt %d): %s", state["id"], state["attempts"], exc)
+        self._write_state(state)
+
+    def process_once(self) -> int:
+        """Deliver every message that is due and return how many were attempted."""
+        now = time.time()
+        due = [state for state in self.pending() if state["next_attempt"] <= now]
+        for state in due:
+            if self._stop.is_set():
+                break
+            self._deliver(state)
+        return len(due)
+
+    def _run(self):
+        lock_file = open(self._path(".sender", "lock"), "a")
+        try:
+            if fcntl:
+                # Only one sender per outbox directory across processes
+                while not self._stop.is_set():
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except OSError:
+                        self._stop.wait(5)
+            while not self._stop.is_set():
+                if not self.process_once():
+                    if self._smtp is not None and time.monotonic() - self._last_used > IDLE_TIMEOUT:
+                        self._close()
+                    self._wakeup.wait(POLL_INTERVAL)
+                    self._wakeup.clear()
+        finally:
+            self._close()
+            lock_file.close()
+
+    def start(self):
+        """Start the background sender thread (idempotent)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="outbox-sender", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def flush(self, timeout: float = 60.0) -> bool:
+        """Wait until nothing is due for delivery; returns False on timeout."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not any(state["next_attempt"] <= time.time() for state in self.pending()):
+                return True
+            self._wakeup.set()
+            time.sleep(POLL_INTERVAL / 5)
+        return False
+
+
+_OUTBOXES: Dict[Tuple[str, str, str], Outbox] = {}
+_OUTBOXES_LOCK = threading.Lock()
+
+
+def get_outbox(username: str = "", password: str = "", directory: str = OUTBOX_DIR) -> Outbox:
+    """Return this process's outbox for `directory` and these credentials, creating it once.
+
+    Streamlit re-executes the app script on every rerun, so the outbox (and
+    its sender thread) must live here rather than in the script's globals.
+    """
+    key = (directory, username, password)
+    with _OUTBOXES_LOCK:
+        if key not in _OUTBOXES:
+            _OUTBOXES[key] = Outbox(directory=directory, username=username, password=password)
+        return _OUTBOXES[key]
@@ -0,0 +1,201 @@
+"""
+Parallel MP3 export: encode segments of the mashup on several cores.
+LAME is single-threaded, so a long mashup's final encode runs on one core.
+The PCM is cut at MP3 frame boundaries (at clip joins where known), each
+segment is encoded by its own ffmpeg process with a few frames of overlap
+on either side, and the overlap frames are dropped so the kept frames line
+up exactly with a single-pass encode. Segments are encoded without the bit
+reservoir, so every kept frame is self-contained and the frames concatenate
+gap-free. A Xing/LAME "Info" frame carrying the combined frame count, size,
+seek table and encoder delay/padding is written in front.
+"""
+
+import os
+import struct
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, List, Optional, Sequence, Tuple
+
+from ffmpeg_merge import CHANNELS, ENCODERS, FFMPEG_BINARY, SAMPLE_RATE
+from encoder_profiles import PROFILES
+from metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Parallel encoder processes for the final MP3; 0 uses every available core, 1 disables
+ENCODE_WORKERS = int(os.getenv("ENCODE_WORKERS", "0"))
+MIN_SEGMENT_SECONDS = 15  # Shorter segments are not worth an extra encoder process
+
+SAMPLES_PER_FRAME = 1152  # MPEG-1 Layer III
+ENCODER_DELAY = 576  # Samples LAME puts in front of the audio
+OVERLAP_FRAMES = 4  # Frames encoded past each cut to settle the filterbank and psychoacoustics
+SAMPLE_WIDTH = 2  # s16le
+
+BITRATES = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)  # kbit/s, MPEG-1 Layer III
+SAMPLE_RATES = (44100, 48000, 32000)  # MPEG-1
+
+# Segment output: bare frames, no reservoir back-references, no tags
+SEGMENT_OPTIONS = ["-reservoir", "0", "-write_xing", "0", "-id3v2_version", "0"]
+
+
+def available_workers() -> int:
+    """Encoder processes to use when ENCODE_WORKERS is 0."""
+    try:
+        return len(os.sched_getaffinity(0))  # type: ignore
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def should_split(
+    seconds: float, sample_rate: int, sample_width: int = SAMPLE_WIDTH, workers: int = ENCODE_WORKERS,
+    fmt: str = "mp3",
+) -> bool:
+    """Whether `encode` would use more than one encoder for audio of this length, layout and profile."""
+    workers = workers or available_workers()
+    return (
+        workers > 1 and fmt in PROFILES and PROFILES[fmt].splittable
+        and sample_width == SAMPLE_WIDTH and sample_rate in SAMPLE_RATES
+        and seconds >= 2 * MIN_SEGMENT_SECONDS
+    )
+
+
+def plan_segments(
+    total: int, workers: int, boundaries: Optional[Sequence[int]] = None, sample_rate: int = SAMPLE_RATE
+) -> List[Tuple[int, int]]:
+    """Split `total` sample frames into up to `workers` frame-aligned (start, end) ranges.
+
+    Cuts go to the clip join in `boundaries` (sample offsets) nearest to an
+    even split, where a splice is least audible, then snap to a frame.
+    """
+    frames = -(-total // SAMPLES_PER_FRAME)
+    count = max(1, min(workers, total // (MIN_SEGMENT_SECONDS * sample_rate)))
+    cuts = []
+    for i in range(1, count):
+        ideal = total * i // count
+        if boundaries:
+            ideal = min(boundaries, key=lambda b: abs(b - ideal))
+        frame = round(ideal / SAMPLES_PER_FRAME)
+        if 0 < frame < frames and (not cuts or frame > cuts[-1]):
+            cuts.append(frame)
+    edges = [0] + [c * SAMPLES_PER_FRAME for c in cuts] + [total]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def frame_offsets(data: bytes) -> List[int]:
+    """Byte offset of every MPEG-1 Layer III frame in `data`, plus the end offset."""
+    offsets, pos = [], 0
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF or data[pos + 1] & 0xFE != 0xFA:
+            raise ValueError(f"not an MPEG-1 Layer III frame at byte {pos}")
+        bitrate = BITRATES[data[pos + 2] >> 4]
+        rate = SAMPLE_RATES[(data[pos + 2] >> 2) & 3]
+        offsets.append(pos)
+        pos += 144 * bitrate * 1000 // rate + ((data[pos + 2] >> 1) & 1)
+    offsets.append(pos)
+    return offsets
+
+
+def crc16(data: bytes, crc: int = 0) -> int:
+    """CRC-16 (polynomial 0x8005, reflected) as used by the LAME tag."""
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def info_frame(first_header: bytes, frame_count: int, audio_bytes: int, toc: bytes, samples: int, channels: int) -> bytes:
+    """Build a Xing "Info" frame with a LAME tag for a CBR stream of `frame_count` frames."""
+    header = bytes([0xFF, 0xFB, first_header[2] & 0xFD, first_header[3]])  # Same rate and mode, no padding
+    bitrate = BITRATES[header[2] >> 4]
+    rate = SAMPLE_RATES[(header[2] >> 2) & 3]
+    size = 144 * bitrate * 1000 // rate
+    side_info = 17 if channels == 1 else 32
+    total = size + audio_bytes
+    padding = frame_count * SAMPLES_PER_FRAME - ENCODER_DELAY - samples
+
+    frame = bytearray(size)
+    frame[:4] = header
+    xing = 4 + side_info
+    frame[xing:xing + 16] = b"Info" + struct.pack(">III", 0x0F, frame_count, total)
+    frame[xing + 16:xing + 116] = toc
+    lame = xing + 120
+    frame[lame:lame + 9] = b"LAME3.100"
+    frame[lame + 21:lame + 24] = ((ENCODER_DELAY << 12) | max(0, min(padding, 4095))).to_bytes(3, "big")
+    frame[lame + 28:lame + 32] = struct.pack(">I", total)
+    # Music CRC (lame + 32) stays 0: decoders do not check it
+    frame[lame + 34:lame + 36] = struct.pack(">H", crc16(bytes(frame[:lame + 34])))
+    return bytes(frame)
+
+
+def _encode_segment(cmd: List[str], pcm: memoryview) -> bytes:
+    result = subprocess.run(cmd, input=pcm, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg segment encode failed: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def encode(
+    pcm: bytes,
+    out: IO[bytes],
+    sample_rate: int = SAMPLE_RATE,
+    channels: int = CHANNELS,
+    boundaries: Optional[Sequence[int]] = None,
+    workers: int = ENCODE_WORKERS,
+    fmt: str = "mp3",
+) -> int:
+    """Encode s16le `pcm` to MP3 in `out` with parallel segment encoders; returns bytes written.
+
+    `boundaries` are clip joins (sample offsets) to prefer as cuts and `fmt`
+    a CBR MP3 profile. Falls back to one encoder process when the audio is
+    too short to split.
+    """
+    if sample_rate not in SAMPLE_RATES:
+        raise ValueError(f"Unsupported sample rate for segment encoding: {sample_rate}")
+    if not PROFILES[fmt].splittable:
+        raise ValueError(f"Profile {fmt} cannot be encoded in segments")
+    frame_bytes = channels * SAMPLE_WIDTH
+    total = len(pcm) // frame_bytes
+    segments = plan_segments(total, workers or available_workers(), boundaries, sample_rate)
+    base = [
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+    ] + ENCODERS[fmt] + SEGMENT_OPTIONS + ["pipe:1"]
+    view = memoryview(pcm)
+    overlap = OVERLAP_FRAMES * SAMPLES_PER_FRAME
+
+    jobs = []
+    for start, end in segments:
+        lead = min(overlap, start)
+        tail_end = end if end == total else min(total, end + overlap)
+        keep = (lead // SAMPLES_PER_FRAME, None if end == total else (end - start) // SAMPLES_PER_FRAME)
+        jobs.append((view[(start - lead) * frame_bytes:tail_end * frame_bytes], keep))
+
+    with METRICS.timer("mashup_ffmpeg_seconds", op="encode", engine="segments") as fields:
+        with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="encode") as pool:
+            outputs = list(pool.map(lambda job: _encode_segment(base, job[0]), jobs))
+
+        kept, sizes = [], []
+        for data, (first, count) in zip(outputs, (keep for _, keep in jobs)):
+            offsets = frame_offsets(data)
+            last = len(offsets) - 1 if count is None else first + count
+            if last > len(offsets) - 1:
+                raise RuntimeError("ffmpeg segment encode returned fewer frames than expected")
+            kept.append(memoryview(data)[offsets[first]:offsets[last]])
+            sizes += [offsets[i + 1] - offsets[i] for i in range(first, last)]
+
+        audio_bytes = sum(len(chunk) for chunk in kept)
+        starts = [0]
+        for size in sizes:
+            starts.append(starts[-1] + size)
+        first_header = bytes(kept[0][:4])
+        tag_size = 144 * BITRATES[first_header[2] >> 4] * 1000 // sample_rate
+        toc = bytes(
+            min(255, (tag_size + starts[len(sizes) * i // 100]) * 256 // (tag_size + audio_bytes)) for i in range(100)
+        )
+        out.write(info_frame(first_header, len(sizes), audio_bytes, toc, total, channels))
+        for chunk in kept:
+            out.write(chunk)
+        fields.update(segments=len(jobs), bytes=tag_size + audio_bytes, profile=fmt)
+    return tag_size + audio_bytes
@@ -0,0 +1,40 @@
+"""
+Partial-range download options for yt-dlp.
+Lets `download_audio` fetch only the time window that `cut_and_merge`
+keeps instead of pulling and transcoding the whole track (with highlight
+selection, the stretch the highlight is chosen from).
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+from highlight import HIGHLIGHT_CLIPS, scan_seconds_for
+
+# Fetch only the clip window by default; set PARTIAL_DOWNLOAD=false for full tracks
+PARTIAL_DOWNLOAD = os.getenv("PARTIAL_DOWNLOAD", "true").lower() == "true"
+
+# Extra audio kept past the window: sections are stream-copied, so cuts land on
+# packet boundaries rather than exact timestamps and must never leave a short clip
+CLIP_PADDING_SEC = 1.0
+
+
+def clip_seconds_for(duration_sec: int) -> Optional[float]:
+    """Return the window length to download, or None for a full download."""
+    if not PARTIAL_DOWNLOAD:
+        return None
+    if HIGHLIGHT_CLIPS:
+        return scan_seconds_for(duration_sec)  # Enough to find the highlight in
+    return float(duration_sec)
+
+
+def range_options(start_sec: float = 0.0, clip_sec: Optional[float] = None) -> Dict[str, Any]:
+    """Build yt-dlp options that restrict the download to one time window."""
+    if clip_sec is None:
+        return {}
+
+    from yt_dlp.utils import download_range_func
+
+    start = max(0.0, float(start_sec))
+    end = start + float(clip_sec) + CLIP_PADDING_SEC
+    # No force_keyframes_at_cuts: it makes yt-dlp re-encode the section instead of copying it
+    return {"download_ranges": download_range_func(None, [(start, end)])}
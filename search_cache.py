@@ -0,0 +1,115 @@
+"""
+TTL cache for YouTube search results.
+Sits under `search_videos` / `search_youtube` so repeated searches for the
+same singer (from the CLI or any Streamlit session) skip the `ytsearchN:`
+extraction. A cached search for M results also answers requests for N <= M.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))  # Seconds, 0 disables the cache
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "256"))
+SEARCH_CACHE_DIR = os.getenv("SEARCH_CACHE_DIR", "")  # Optional on-disk layer
+
+
+def normalize_query(query: str) -> str:
+    """Collapse case and whitespace so equivalent searches share an entry."""
+    return " ".join(query.lower().split())
+
+
+class SearchCache:
+    """In-process LRU of search results with an optional on-disk layer."""
+
+    def __init__(
+        self,
+        ttl: float = SEARCH_CACHE_TTL,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        directory: str = SEARCH_CACHE_DIR,
+    ):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _fresh(self, entry: Optional[Dict[str, Any]]) -> bool:
+        return bool(entry) and time.time() - entry["time"] < self.ttl  # type: ignore
+
+    def _load_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._disk_path(key)) as fh:
+                entry = json.load(fh)
+            return entry if entry.get("query") == key else None
+        except (OSError, ValueError):
+            return None
+
+    def _save_disk(self, key: str, entry: Dict[str, Any]):
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp_", suffix=".json")
+            with os.fdopen(fd, "w") as fh:
+                json.dump(entry, fh)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as exc:
+            logger.debug("Could not persist search cache entry: %s", exc)
+
+    def get(self, query: str, num_results: int) -> Optional[List[str]]:
+        """Return up to `num_results` cached URLs, or None if no entry covers the request."""
+        if self.ttl <= 0:
+            return None
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if not self._fresh(entry):
+                entry = self._load_disk(key)
+                if not self._fresh(entry):
+                    return None
+                self._remember(key, entry)  # type: ignore
+            self._entries.move_to_end(key)
+
+        # An entry fetched for M >= N results also answers a request for N
+        if entry["requested"] >= num_results:  # type: ignore
+            logger.info("Search cache hit for '%s'", query)
+            return list(entry["urls"][:num_results])  # type: ignore
+        return None
+
+    def put(self, query: str, num_results: int, urls: List[str]):
+        """Cache the URLs returned by a search for `num_results` results."""
+        if self.ttl <= 0 or not urls:
+            return
+        key = normalize_query(query)
+        entry = {"query": key, "time": time.time(), "requested": num_results, "urls": list(urls)}
+        with self._lock:
+            current = self._entries.get(key)
+            if self._fresh(current) and current["requested"] > num_results:  # type: ignore
+                return  # Keep the larger result set
+            self._remember(key, entry)
+        self._save_disk(key, entry)
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        """Insert into the in-process LRU (lock held)."""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# Process-wide cache shared by every search in this process
+SEARCH_CACHE = SearchCache()
@@ -0,0 +1,252 @@
+"""
+Adaptive ordering of the yt-dlp client strategies used by `download_audio`.
+Tracks success rate and latency per strategy in a small JSON file shared by
+the CLI, the web app and its workers, tries the strategy with the lowest
+expected time-to-success first, and scales the wait between strategies to
+how often YouTube has recently been flagging us as a bot.
+
+Print per-strategy statistics with `python strategy_scheduler.py`.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_STATS_PATH = os.getenv("STRATEGY_STATS_PATH") or os.path.join(
+    os.path.expanduser("~"), ".cache", "mashup", "strategies.json"
+)
+# "false" restores the fixed order and fixed sleep multipliers
+STRATEGY_ADAPTIVE = os.getenv("STRATEGY_ADAPTIVE", "true").lower() == "true"
+STRATEGY_BASE_DELAY = float(os.getenv("STRATEGY_BASE_DELAY", "3"))  # Seconds, doubled per bot block
+STRATEGY_MAX_DELAY = float(os.getenv("STRATEGY_MAX_DELAY", "30"))
+
+# Prioritize iOS and Android clients (less likely to be blocked)
+CLIENT_STRATEGIES: List[Dict[str, Any]] = [
+    {"name": "ios", "clients": ["ios"], "format": "bestaudio/best"},
+    {"name": "android", "clients": ["android"], "format": "bestaudio/best"},
+    {"name": "android_music", "clients": ["android_music"], "format": "bestaudio"},
+    {"name": "ios_music", "clients": ["ios_music"], "format": "bestaudio"},
+    {"name": "multi", "clients": ["android", "ios", "web"], "format": "worstaudio/worst"},
+]
+
+SUCCESS, BOT, FORMAT, ERROR = "success", "bot", "format", "error"
+
+DECAY = 0.95  # Weight kept by older attempts on every new one, so stats follow YouTube's changes
+PRIOR_LATENCY = 5.0  # Assumed seconds per attempt for a strategy with no successes yet
+JITTER = 1.0  # Random extra wait so parallel downloads do not move in lockstep
+
+
+def classify(message: str) -> str:
+    """Map a yt-dlp error message to an attempt outcome."""
+    text = message.lower()
+    if "bot" in text or "sign in" in text:
+        return BOT
+    if "format" in text:
+        return FORMAT
+    return ERROR
+
+
+class AttemptLog:
+    """yt-dlp `logger` that keeps the errors `ignoreerrors` would otherwise hide."""
+
+    def __init__(self):
+        self.errors: List[str] = []
+
+    def debug(self, msg: str):
+        pass
+
+    def info(self, msg: str):
+        pass
+
+    def warning(self, msg: str):
+        pass
+
+    def error(self, msg: str):
+        self.errors.append(msg)
+
+    def outcome(self) -> str:
+        """Outcome of an attempt that produced no file."""
+        for msg in self.errors:
+            if classify(msg) == BOT:
+                return BOT
+        return classify(self.errors[-1]) if self.errors else ERROR
+
+
+class StrategyScheduler:
+    """Orders client strategies by observed success rate and latency."""
+
+    def __init__(
+        self,
+        path: str = STRATEGY_STATS_PATH,
+        strategies: List[Dict[str, Any]] = CLIENT_STRATEGIES,
+        adaptive: bool = STRATEGY_ADAPTIVE,
+        base_delay: float = STRATEGY_BASE_DELAY,
+        max_delay: float = STRATEGY_MAX_DELAY,
+    ):
+        self.path = path
+        self.strategies = strategies
+        self.adaptive = adaptive
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._state: Dict[str, Any] = {"strategies": {}, "bot_pressure": 0.0}
+        self._mtime = 0.0
+
+    # Persistence
+
+    @contextmanager
+    def _locked(self):
+        """Hold an exclusive lock across threads and processes."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            with open(self.path + ".lock", "a") as fh:
+                if fcntl:
+                    fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Reload the shared stats file if another process updated it."""
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime != self._mtime:
+                with open(self.path) as fh:
+                    self._state = json.load(fh)
+                self._mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+    def _save(self):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", prefix=".strategies_", suffix=".json")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(self._state, fh, indent=1)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    # Scheduling
+
+    @property
+    def bot_pressure(self) -> float:
+        """Decayed fraction of recent attempts that hit bot detection."""
+        with self._lock:
+            return self._state.get("bot_pressure", 0.0)
+
+    def _stats(self, name: str) -> Dict[str, Any]:
+        return self._state["strategies"].get(name, {})
+
+    def success_rate(self, name: str) -> float:
+        """Decayed success rate with a uniform prior (0.5 for untried strategies)."""
+        stats = self._stats(name)
+        return (stats.get("weighted_successes", 0.0) + 1) / (stats.get("weighted_attempts", 0.0) + 2)
+
+    def expected_cost(self, name: str) -> float:
+        """Expected seconds until this strategy yields a file."""
+        return self._stats(name).get("latency", PRIOR_LATENCY) / self.success_rate(name)
+
+    def order(self) -> List[Dict[str, Any]]:
+        """Return the strategies to try, best first."""
+        if not self.adaptive:
+            return list(self.strategies)
+        with self._lock:
+            self._refresh()
+            # sorted() is stable, so ties keep the hand-tuned default order
+            return sorted(self.strategies, key=lambda s: self.expected_cost(s["name"]))
+
+    def backoff(self, attempt: int, bot_blocks: int) -> float:
+        """Seconds to wait before trying strategy number `attempt` (0-based) of one download.
+
+        Waits grow exponentially with the bot blocks this download has hit,
+        weighted by how often recent attempts were blocked; other failures
+        only get a short jitter before the next client is tried.
+        """
+        if not self.adaptive:
+            return random.uniform(3, 8) * (attempt + 1)
+        delay = 0.0
+        if bot_blocks:
+            delay = self.base_delay * 2 ** (bot_blocks - 1) * (0.5 + self.bot_pressure)
+        return min(self.max_delay, delay) + random.uniform(0, JITTER)
+
+    def record(self, name: str, outcome: str, seconds: float):
+        """Record one attempt of strategy `name` and persist the stats."""
+        try:
+            with self._locked():
+                self._refresh()
+                stats = self._state["strategies"].setdefault(name, {})
+                for field in ("attempts", "successes", "bot_blocks", "errors"):
+                    stats.setdefault(field, 0)
+                stats["attempts"] += 1
+                stats["weighted_attempts"] = stats.get("weighted_attempts", 0.0) * DECAY + 1
+                stats["weighted_successes"] = stats.get("weighted_successes", 0.0) * DECAY
+                if outcome == SUCCESS:
+                    stats["successes"] += 1
+                    stats["weighted_successes"] += 1
+                    # Exponential moving average of successful attempt latency
+                    previous = stats.get("latency")
+                    stats["latency"] = seconds if previous is None else previous * 0.8 + seconds * 0.2
+                elif outcome == BOT:
+                    stats["bot_blocks"] += 1
+                else:
+                    stats["errors"] += 1
+                stats["last_outcome"] = outcome
+                stats["last_used"] = time.time()
+                bot = 1.0 if outcome == BOT else 0.0
+                self._state["bot_pressure"] = self._state.get("bot_pressure", 0.0) * 0.9 + bot * 0.1
+                self._save()
+        except OSError as exc:
+            logger.warning("Could not save strategy stats: %s", exc)
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Per-strategy statistics in the order they would be tried."""
+        rows = []
+        for strategy in self.order():
+            name = strategy["name"]
+            stats = self._stats(name)
+            rows.append({
+                "strategy": name,
+                "attempts": stats.get("attempts", 0),
+                "successes": stats.get("successes", 0),
+                "bot_blocks": stats.get("bot_blocks", 0),
+                "errors": stats.get("errors", 0),
+                "success_rate": round(self.success_rate(name), 3),
+                "latency": round(stats["latency"], 2) if "latency" in stats else None,
+                "expected_cost": round(self.expected_cost(name), 2),
+                "last_outcome": stats.get("last_outcome"),
+            })
+        return rows
+
+
+# Process-wide scheduler shared by every download thread
+STRATEGY_SCHEDULER = StrategyScheduler()
+
+
+if __name__ == "__main__":
+    rows = STRATEGY_SCHEDULER.report()
+    if "--json" in sys.argv:
+        print(json.dumps({"bot_pressure": STRATEGY_SCHEDULER.bot_pressure, "strategies": rows}, indent=2))
+    else:
+        print(f"{'strategy':<14} {'tries':>6} {'ok':>5} {'bot':>5} {'err':>5} {'rate':>6} {'latency':>8} {'cost':>7}  last")
+        for row in rows:
+            latency = "-" if row["latency"] is None else f"{row['latency']:.2f}s"
+            print(
+                f"{row['strategy']:<14} {row['attempts']:>6} {row['successes']:>5} {row['bot_blocks']:>5} "
+                f"{row['errors']:>5} {row['success_rate']:>6.2f} {latency:>8} {row['expected_cost']:>6.1f}s  "
+                f"{row['last_outcome'] or '-'}"
+            )
+        print(f"bot pressure: {STRATEGY_SCHEDULER.bot_pressure:.2f}")
@@ -0,0 +1,143 @@
+"""
+Pool of long-lived `yt_dlp.YoutubeDL` sessions.
+Building a YoutubeDL loads extractors, parses the cookie file and sets up
+HTTP handlers. The pool keeps pre-configured sessions per key (one key per
+client strategy and format, plus search) and leases each one to a single
+worker at a time. Options that differ per call, such as the output template
+and the rotated request headers, are applied at lease time and reset when
+the session comes back.
+"""
+
+import os
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+YDL_POOL = os.getenv("YDL_POOL", "true").lower() == "true"  # "false" builds a session per call
+YDL_POOL_SIZE = int(os.getenv("YDL_POOL_SIZE", "4"))  # Idle sessions kept per key
+
+# Options yt-dlp reads at call time, so a pooled session can take new values per lease
+PER_CALL_OPTIONS = ("outtmpl", "logger", "download_ranges")
+# Base options applied per lease as well, so callers can rotate them on a pooled session
+PER_LEASE_OPTIONS = ("http_headers",)
+
+_MISSING = object()
+
+yt_dlp: Any = None  # Imported on first use: it is the slowest import of any entry point
+
+
+def load_yt_dlp():
+    """Return the `yt_dlp` module, importing it on first call."""
+    global yt_dlp
+    if yt_dlp is None:
+        import yt_dlp as module
+
+        yt_dlp = module
+    return yt_dlp
+
+
+class SessionPool:
+    """Leases reusable YoutubeDL sessions keyed by their base options."""
+
+    def __init__(self, enabled: bool = YDL_POOL, max_idle: int = YDL_POOL_SIZE):
+        self.enabled = enabled
+        self.max_idle = max(0, max_idle)
+        self._lock = threading.Lock()
+        self._idle: Dict[Hashable, List[Any]] = {}
+        self.stats = {"created": 0, "reused": 0, "discarded": 0}
+
+    def _take(self, key: Hashable, base_opts: Dict[str, Any]):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.stats["reused"] += 1
+                return idle.pop()
+            self.stats["created"] += 1
+        opts = {k: v for k, v in base_opts.items() if k not in PER_CALL_OPTIONS + PER_LEASE_OPTIONS}
+        return load_yt_dlp().YoutubeDL(opts)  # type: ignore
+
+    def _give_back(self, key: Hashable, ydl):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(ydl)
+                return
+            self.stats["discarded"] += 1
+        ydl.close()
+
+    @staticmethod
+    def _apply(ydl, call_opts: Dict[str, Any]) -> Dict[str, Any]:
+        """Set per-call options on a session and return what to restore."""
+        saved: Dict[str, Any] = {}
+        for name, value in call_opts.items():
+            if name == "outtmpl":
+                # Parsed into a dict at construction; only the default template changes
+                saved[name] = ydl.params["outtmpl"].get("default")
+                ydl.params["outtmpl"]["default"] = value
+            elif name == "http_headers":
+                # Merged over yt-dlp's standard headers at construction; every request copies them
+                current = ydl.params.get(name, _MISSING)
+                saved[name] = current
+                ydl.params[name] = dict(value) if current is _MISSING else type(current)(current, value)
+            else:
+                saved[name] = ydl.params.get(name, _MISSING)
+                ydl.params[name] = value
+        return saved
+
+    @staticmethod
+    def _restore(ydl, saved: Dict[str, Any]):
+        for name, value in saved.items():
+            if name == "outtmpl":
+                ydl.params["outtmpl"]["default"] = value
+            elif value is _MISSING:
+                ydl.params.pop(name, None)
+            else:
+                ydl.params[name] = value
+
+    @contextmanager
+    def lease(self, key: Hashable, base_opts: Dict[str, Any], **call_opts) -> Iterator[Any]:
+        """Yield a YoutubeDL built from `base_opts` with `call_opts` applied.
+
+        Sessions under one `key` must share the same `base_opts`, apart from
+        PER_LEASE_OPTIONS (the request headers), which are set on the session
+        for this lease only. A session whose call raised is closed rather than
+        returned to the pool.
+        """
+        unknown = set(call_opts) - set(PER_CALL_OPTIONS)
+        if unknown:
+            raise ValueError(f"Not per-call options: {sorted(unknown)}")
+        if not self.enabled:
+            with load_yt_dlp().YoutubeDL({**base_opts, **call_opts}) as ydl:  # type: ignore
+                yield ydl
+            return
+
+        ydl = self._take(key, base_opts)
+        lease_opts = {k: base_opts[k] for k in PER_LEASE_OPTIONS if k in base_opts}
+        saved = self._apply(ydl, {**lease_opts, **call_opts})
+        try:
+            yield ydl
+        except BaseException:
+            ydl.close()
+            raise
+        self._restore(ydl, saved)
+        self._give_back(key, ydl)
+
+    def close(self):
+        """Close every idle session."""
+        with self._lock:
+            sessions = [ydl for idle in self._idle.values() for ydl in idle]
+            self._idle.clear()
+        for ydl in sessions:
+            try:
+                ydl.close()
+            except Exception as exc:
+                logger.debug("Error closing YoutubeDL session: %s", exc)
+
+
+# Process-wide pool shared by every download thread
+SESSION_POOL = SessionPool()
+atexit.register(SESSION_POOL.close)  # Closing a session also saves its cookie file
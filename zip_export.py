@@ -0,0 +1,177 @@
+"""
+Streaming audio + ZIP packaging.
+Encodes the mashup's PCM with ffmpeg (any output profile, see
+encoder_profiles.py) into a STORED ZIP entry, spooling the archive to a
+temp file once it grows past a threshold. Opus and AAC output is piped
+straight into the entry. MP3 goes through a temp file first, because
+ffmpeg writes the Xing/LAME info frame (length, seek table, gapless delay
+and padding) by seeking back once the encode is done. Avoids the extra
+in-memory copies of `BytesIO` round-trips and the wasted DEFLATE pass
+over already-compressed audio.
+"""
+
+import os
+import shutil
+import zipfile
+import tempfile
+import threading
+import subprocess
+from typing import IO, List, Optional, Sequence
+
+from ffmpeg_merge import ENCODERS, FFMPEG_BINARY
+from encoder_profiles import PROFILES
+from metrics import METRICS
+import parallel_encode
+
+# Archives larger than this are spooled to disk instead of kept in memory
+ZIP_SPOOL_THRESHOLD = int(os.getenv("ZIP_SPOOL_THRESHOLD_MB", "16")) * 1024 * 1024
+
+CHUNK_SIZE = 64 * 1024
+
+# ffmpeg raw PCM formats for pydub sample widths (8-bit WAV data is unsigned)
+PCM_FORMATS = {1: "u8", 2: "s16le", 3: "s24le", 4: "s32le"}
+
+
+def _command(audio_segment, fmt: str, target: str) -> List[str]:
+    return [
+        FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+        "-f", PCM_FORMATS[audio_segment.sample_width],
+        "-ar", str(audio_segment.frame_rate),
+        "-ac", str(audio_segment.channels),
+        "-i", "pipe:0",
+    ] + ENCODERS[fmt] + [target]
+
+
+def _split(audio_segment, fmt: str) -> bool:
+    seconds = len(audio_segment.raw_data) / (audio_segment.frame_width * audio_segment.frame_rate)
+    return parallel_encode.should_split(seconds, audio_segment.frame_rate, audio_segment.sample_width, fmt=fmt)
+
+
+def _needs_seek(fmt: str) -> bool:
+    """Whether ffmpeg rewrites the start of a `fmt` file after encoding (MP3 info frames)."""
+    return fmt in PROFILES and PROFILES[fmt].codec == "mp3"
+
+
+def encode_to(audio_segment, out: IO[bytes], fmt: str = "mp3", boundaries: Optional[Sequence[int]] = None):
+    """Encode an AudioSegment with ffmpeg, streaming the output into `out`.
+
+    `fmt` is an output profile name. Long CBR MP3s are encoded in parallel
+    segments, cut at the `boundaries` sample offsets where possible (see
+    parallel_encode.py); other MP3s go through a temp file (see `save`).
+    """
+    if _split(audio_segment, fmt):
+        parallel_encode.encode(
+            audio_segment.raw_data, out, audio_segment.frame_rate, audio_segment.channels, boundaries, fmt=fmt
+        )
+        return
+    if _needs_seek(fmt):
+        fd, path = tempfile.mkstemp(prefix="mashup_", suffix=PROFILES[fmt].extension)
+        os.close(fd)
+        try:
+            save(audio_segment, path, fmt, boundaries)
+            with open(path, "rb") as fh:
+                shutil.copyfileobj(fh, out, CHUNK_SIZE)
+        finally:
+            os.remove(path)
+        return
+
+    with METRICS.timer("mashup_ffmpeg_seconds", op="encode", engine="ffmpeg") as fields:
+        fields["bytes"] = _encode(_command(audio_segment, fmt, "pipe:1"), audio_segment.raw_data, out)
+        fields["profile"] = fmt
+
+
+def save(audio_segment, path: str, fmt: str = "mp3", boundaries: Optional[Sequence[int]] = None):
+    """Encode an AudioSegment to the file `path` (see `encode_to`).
+
+    Single-pass encodes write the file directly, so ffmpeg can go back and
+    fill in headers (such as the MP3 Xing tag) that a pipe cannot carry.
+    """
+    if _split(audio_segment, fmt):
+        with open(path, "wb") as fh:
+            encode_to(audio_segment, fh, fmt, boundaries)
+        return
+
+    with METRICS.timer("mashup_ffmpeg_seconds", op="encode", engine="ffmpeg") as fields:
+        result = subprocess.run(
+            _command(audio_segment, fmt, path), input=memoryview(audio_segment.raw_data), capture_output=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg encode failed: {result.stderr.decode(errors='replace').strip()}")
+        fields["bytes"] = os.path.getsize(path)
+        fields["profile"] = fmt
+
+
+def _encode(cmd, raw_data: bytes, out: IO[bytes]) -> int:
+    """Run the encoder `cmd` on `raw_data` and return the bytes written to `out`."""
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def feed():
+        try:
+            # memoryview avoids copying the PCM buffer while writing it out
+            proc.stdin.write(memoryview(raw_data))  # type: ignore
+        except BrokenPipeError:
+            pass
+        finally:
+            proc.stdin.close()  # type: ignore
+
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    written = 0
+    while True:
+        chunk = proc.stdout.read(CHUNK_SIZE)  # type: ignore
+        if not chunk:
+            break
+        out.write(chunk)
+        written += len(chunk)
+    writer.join()
+    stderr = proc.stderr.read()  # type: ignore
+    if proc.wait() != 0:
+        raise RuntimeError(f"ffmpeg encode failed: {stderr.decode(errors='replace').strip()}")
+    return written
+
+
+def write_zip(
+    audio_segment,
+    filename: str = "mashup.mp3",
+    dest: Optional[str] = None,
+    spool_threshold: int = ZIP_SPOOL_THRESHOLD,
+    fmt: str = "mp3",
+) -> IO[bytes]:
+    """Encode `audio_segment` with the `fmt` profile into a ZIP and return a readable handle at offset 0.
+
+    With `dest` the archive is written to that path; otherwise it lives in a
+    SpooledTemporaryFile that moves to disk above `spool_threshold` bytes.
+    The caller owns (and should close) the returned handle.
+    """
+
+    def fill(zf: zipfile.ZipFile):
+        with zf.open(filename, "w") as entry:
+            encode_to(audio_segment, entry, fmt)
+
+    return _archive(fill, dest, spool_threshold)
+
+
+def write_zip_file(
+    path: str,
+    filename: str = "mashup.mp3",
+    dest: Optional[str] = None,
+    spool_threshold: int = ZIP_SPOOL_THRESHOLD,
+) -> IO[bytes]:
+    """Store the already-encoded audio file `path` in a ZIP (see `write_zip`)."""
+    return _archive(lambda zf: zf.write(path, filename), dest, spool_threshold)
+
+
+def _archive(fill, dest: Optional[str], spool_threshold: int) -> IO[bytes]:
+    if dest:
+        handle: IO[bytes] = open(dest, "w+b")
+    else:
+        handle = tempfile.SpooledTemporaryFile(max_size=spool_threshold, mode="w+b")  # type: ignore
+    try:
+        with zipfile.ZipFile(handle, "w", zipfile.ZIP_STORED) as zf:
+            fill(zf)
+        handle.seek(0)
+        return handle
+    except Exception:
+        handle.close()
+        raise
+